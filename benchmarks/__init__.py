@@ -0,0 +1,48 @@
+"""
+Benchmarks for Pyte.
+
+Run every suite with ``python -m benchmarks``; see ``python -m benchmarks --help``.
+"""
+import timeit
+
+import pyte
+
+
+def measure(func, repeat: int = 3, min_time: float = 0.05) -> float:
+    """
+    Times a function.
+
+    :param func: The function to time. It is called with no arguments.
+    :param repeat: How many times to repeat the measurement. The best one is kept.
+    :param min_time: How long each measurement should take, at least.
+    :return: The best time for a single call, in seconds.
+    """
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    best = min([elapsed] + timer.repeat(repeat=repeat - 1, number=number))
+    return best / number
+
+
+def make_code(size: int, end: bool = True):
+    """
+    Makes the straight-line fixture most suites use: ``size`` instructions of alternating
+    LOAD_CONST and STORE_FAST.
+
+    :param size: The number of instructions, not counting the end.
+    :param end: Add an END_FUNCTION, so the code can be compiled into a function?
+    :return: A tuple of (the instructions, the consts, the varnames).
+    """
+    consts = pyte.create_consts(1)
+    varnames = pyte.create_varnames("x")
+    code = []
+    for i in range(size // 2):
+        code.append(pyte.ops.LOAD_CONST(consts[0]))
+        code.append(pyte.ops.STORE_FAST(varnames[0]))
+    if end:
+        code.append(pyte.ops.END_FUNCTION(consts[0]))
+    return code, consts, varnames
@@ -0,0 +1,109 @@
+"""
+Runs the benchmark suites, writes the results as JSON and compares them against a baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+
+from benchmarks import (assembler, call_throughput, compile_latency, ir_size, op_emit, profiles,
+                        safety_overhead)
+
+SUITES = {
+    "assemble": assembler,
+    "compile": compile_latency,
+    "profiles": profiles,
+    "emit": op_emit,
+    "call": call_throughput,
+    "safety": safety_overhead,
+    "ir": ir_size,
+}
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def _format(name: str, value: float) -> str:
+    # Every result is a time in seconds, except for memory measurements.
+    if "bytes" in name:
+        return "{:14.1f} B".format(value)
+    return "{:14.3f} us".format(value * 1e6)
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Finds the benchmarks that got slower than the baseline.
+
+    :param results: The current results.
+    :param baseline: The baseline results.
+    :param threshold: How much slower a benchmark can get before it is flagged, as a fraction.
+    :return: A list of (name, baseline time, current time) tuples.
+    """
+    regressions = []
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is not None and current > previous * (1 + threshold):
+            regressions.append((name, previous, current))
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    parser.add_argument("suites", nargs="*", metavar="suite",
+                        help="The suites to run, out of {}. Defaults to all of them."
+                        .format(", ".join(sorted(SUITES))))
+    parser.add_argument("-o", "--output", default="bench_results.json",
+                        help="Where to write the results.")
+    parser.add_argument("-b", "--baseline", default=DEFAULT_BASELINE,
+                        help="The baseline to compare against.")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store these results as the new baseline.")
+    parser.add_argument("-t", "--threshold", type=float, default=0.25,
+                        help="Flag benchmarks more than this fraction slower than the baseline.")
+    parser.add_argument("-q", "--quick", action="store_true", help="Skip the largest sizes.")
+    args = parser.parse_args(argv)
+    for name in args.suites:
+        if name not in SUITES:
+            parser.error("unknown suite `{}`".format(name))
+
+    results = {}
+    for name in args.suites or sorted(SUITES):
+        print("Running {}...".format(name), file=sys.stderr)
+        results.update(SUITES[name].run(quick=args.quick))
+
+    for name, value in sorted(results.items()):
+        print("{:40} {}".format(name, _format(name, value)))
+
+    document = {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+
+    status = 0
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("python") != document["python"]:
+            print("Baseline was recorded on Python {}, comparing anyway."
+                  .format(baseline.get("python")), file=sys.stderr)
+        regressions = compare(results, baseline["results"], args.threshold)
+        for name, previous, current in regressions:
+            print("REGRESSION {}: {} -> {} ({:+.0%})"
+                  .format(name, _format(name, previous), _format(name, current),
+                          current / previous - 1))
+        if regressions:
+            status = 1
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+        print("Saved baseline to {}".format(args.baseline), file=sys.stderr)
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,30 @@
+"""
+Measures the scaling of `pyte.compiler.compile_bytecode`, against the old assembler.
+"""
+from pyte.compiler import compile_bytecode
+
+from benchmarks import make_code, measure
+
+SIZES = (100, 1000, 10000, 100000)
+
+# The old assembler re-copied the whole prefix for every op, so only time it on the smaller sizes.
+LEGACY_MAX = 10000
+
+
+def _compile_legacy(code: list) -> bytes:
+    # Reference implementation of the old `bc += op.to_bytes(bc)` loop.
+    bc = b""
+    for op in code:
+        bc += op.to_bytes(bc)
+    return bc
+
+
+def run(quick: bool = False) -> dict:
+    results = {}
+    sizes = SIZES[:-1] if quick else SIZES
+    for size in sizes:
+        code, _, _ = make_code(size, end=False)
+        results["assemble/{}".format(size)] = measure(lambda: compile_bytecode(code))
+        if size <= LEGACY_MAX and not (quick and size == LEGACY_MAX):
+            results["assemble/legacy/{}".format(size)] = measure(lambda: _compile_legacy(code))
+    return results
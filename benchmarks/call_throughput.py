@@ -0,0 +1,58 @@
+"""
+Measures calls to generated functions, against the same functions made with `compile()`.
+"""
+import pyte
+
+from benchmarks import measure
+
+
+def _helper(x):
+    return x
+
+
+def _pyte_functions(**options) -> dict:
+    varnames = pyte.create_varnames("a", "b")
+    add = pyte.compile([varnames[0] + varnames[1], pyte.tokens.RETURN_VALUE], [], [], varnames,
+                       arg_count=2, use_safety_wrapper=False, profile="release", **options)
+
+    consts = pyte.create_consts(1)
+    names = pyte.create_names("_helper")
+    call = pyte.compile([pyte.ops.CALL_FUNCTION(names[0], consts[0]), pyte.tokens.RETURN_VALUE],
+                        consts, names, [], use_safety_wrapper=False, profile="release", **options)
+
+    consts = pyte.create_consts(1)
+    call_kw = pyte.compile([pyte.ops.CALL_FUNCTION(names[0], kwargs={"x": consts[0]}),
+                            pyte.tokens.RETURN_VALUE],
+                           consts, names, [], use_safety_wrapper=False, profile="release",
+                           **options)
+
+    consts = pyte.create_consts(1, 2, 3)
+    build = pyte.compile([pyte.ops.LIST(consts[0], consts[1], consts[2]),
+                          pyte.tokens.RETURN_VALUE],
+                         consts, [], [], use_safety_wrapper=False, profile="release", **options)
+    return {"add": add, "call": call, "call_kw": call_kw, "build_list": build}
+
+
+def _builtin_functions() -> dict:
+    namespace = {"_helper": _helper}
+    source = "def add(a, b):\n    return a + b\n" \
+             "def call():\n    return _helper(1)\n" \
+             "def call_kw():\n    return _helper(x=1)\n" \
+             "def build_list():\n    return [1, 2, 3]\n"
+    exec(compile(source, "<benchmark>", "exec"), namespace)
+    return {name: namespace[name] for name in ("add", "call", "call_kw", "build_list")}
+
+
+ARGS = {"add": (1, 2), "call": (), "call_kw": (), "build_list": ()}
+
+
+def run(quick: bool = False) -> dict:
+    results = {}
+    for kind, functions in (("pyte", _pyte_functions()),
+                            ("pyte_instrumented", _pyte_functions(instrument=True)),
+                            ("pyte_frozen", _pyte_functions(freeze=["_helper"])),
+                            ("builtin", _builtin_functions())):
+        for name, func in functions.items():
+            args = ARGS[name]
+            results["call/{}/{}".format(name, kind)] = measure(lambda: func(*args))
+    return results
@@ -0,0 +1,35 @@
+"""
+Measures `pyte.compile` latency against instruction count.
+"""
+import pyte
+
+from benchmarks import make_code, measure
+
+SIZES = (10, 100, 1000, 10000)
+
+
+def _make_loop(size: int):
+    # The same body, inside a FOR_LOOP.
+    consts = pyte.create_consts(1, (1, 2, 3))
+    varnames = pyte.create_varnames("x", "item")
+    body = []
+    for i in range(size // 2):
+        body.append(pyte.ops.LOAD_CONST(consts[0]))
+        body.append(pyte.ops.STORE_FAST(varnames[0]))
+    code = [pyte.ops.FOR_LOOP(consts[1], body, target=varnames[1]),
+            pyte.ops.END_FUNCTION(consts[0])]
+    return code, consts, varnames
+
+
+def run(quick: bool = False) -> dict:
+    results = {}
+    sizes = SIZES[:-1] if quick else SIZES
+    for name, make in (("compile/{}", make_code), ("compile/for_loop/{}", _make_loop)):
+        for size in sizes:
+            code, consts, varnames = make(size)
+
+            def _compile():
+                pyte.compile(code, consts, [], varnames, profile="release")
+
+            results[name.format(size)] = measure(_compile)
+    return results
@@ -0,0 +1,94 @@
+"""
+Measures the memory and compile time of large programs, held as operator lists and as streams.
+"""
+import time
+import tracemalloc
+
+import pyte
+
+SIZES = (10000, 100000)
+
+
+def _build_list(size: int, consts, varnames) -> list:
+    code = []
+    for i in range(size // 2):
+        code.append(pyte.ops.LOAD_CONST(consts[1]))
+        code.append(pyte.ops.STORE_FAST(varnames[0]))
+    code.append(pyte.ops.END_FUNCTION(consts[0]))
+    return code
+
+
+def _build_stream(size: int, consts, varnames) -> pyte.InstructionStream:
+    stream = pyte.InstructionStream()
+    for i in range(size // 2):
+        stream.emit(pyte.tokens.LOAD_CONST, 1)
+        stream.emit(pyte.tokens.STORE_FAST, 0)
+    stream.append(pyte.ops.END_FUNCTION(consts[0]))
+    return stream
+
+
+def _measure_memory(build, size: int, consts, varnames) -> float:
+    tracemalloc.start()
+    try:
+        code = build(size, consts, varnames)
+        used, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del code
+    return used / size
+
+
+def _generate(size: int, consts, varnames):
+    for i in range(size // 2):
+        yield pyte.ops.LOAD_CONST(consts[1])
+        yield pyte.ops.STORE_FAST(varnames[0])
+    yield pyte.ops.END_FUNCTION(consts[0])
+
+
+def _measure_peak(size: int, consts, varnames) -> dict:
+    """
+    Measures the peak memory of compiling a materialized list against a generator.
+    """
+    results = {}
+    for kind in ("list", "generator"):
+        tracemalloc.start()
+        try:
+            if kind == "list":
+                pyte.compile(_build_list(size, consts, varnames), consts, [], varnames,
+                             use_safety_wrapper=False, profile="release")
+            else:
+                pyte.compile_stream(_generate(size, consts, varnames), consts, [], varnames,
+                                    use_safety_wrapper=False, profile="release")
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        results["ir/peak_bytes_per_instruction/{}".format(kind)] = peak / size
+    return results
+
+
+def _measure_compile(code, consts, varnames) -> float:
+    # Large programs are slow to compile, so take the best of a few single runs.
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        pyte.compile(code, consts, [], varnames, use_safety_wrapper=False, profile="release")
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(quick: bool = False) -> dict:
+    consts = pyte.create_consts(None, 1)
+    varnames = pyte.create_varnames("x")
+
+    results = {}
+    sizes = SIZES[:-1] if quick else SIZES
+    for kind, build in (("list", _build_list), ("stream", _build_stream)):
+        results["ir/bytes_per_instruction/{}".format(kind)] = _measure_memory(
+            build, sizes[-1], consts, varnames)
+        for size in sizes:
+            code = build(size, consts, varnames)
+            results["ir/compile/{}/{}".format(kind, size)] = _measure_compile(code, consts,
+                                                                              varnames)
+    results.update(_measure_peak(sizes[-1], consts, varnames))
+    return results
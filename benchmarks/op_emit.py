@@ -0,0 +1,52 @@
+"""
+Measures the cost of emitting single operators, and of creating and emitting them.
+
+Creating an op matters for self-hosted ops such as SET, which used to compile themselves.
+"""
+import pyte
+from pyte.emitter import Emitter
+from pyte.exc import CompileError
+
+from benchmarks import measure
+
+consts = pyte.create_consts(1, 2, 3)
+names = pyte.create_names("len", "append")
+varnames = pyte.create_varnames("x", "y")
+
+OPS = {
+    "LOAD_CONST": lambda: pyte.ops.LOAD_CONST(consts[0]),
+    "LOAD_FAST": lambda: pyte.ops.LOAD_FAST(varnames[0]),
+    "LOAD_GLOBAL": lambda: pyte.ops.LOAD_GLOBAL(names[0]),
+    "LOAD_ATTR_CHAIN": lambda: pyte.ops.LOAD_FAST(varnames[0]).attr(names[1]),
+    "CALL_FUNCTION": lambda: pyte.ops.CALL_FUNCTION(names[0], consts[0], varnames[1],
+                                                    store_return=varnames[0]),
+    "LIST": lambda: pyte.ops.LIST(consts[0], consts[1], consts[2]),
+    "TUPLE": lambda: pyte.ops.TUPLE(consts[0], consts[1], consts[2]),
+    "SET": lambda: pyte.ops.SET(consts[0], consts[1], consts[2]),
+    "IF": lambda: pyte.ops.IF(conditions=[consts[0] < consts[1]],
+                              body=[[pyte.ops.LOAD_CONST(consts[2]), pyte.tokens.POP_TOP]]),
+    "FOR_LOOP": lambda: pyte.ops.FOR_LOOP(iterator=pyte.ops.LIST(consts[0], consts[1]),
+                                          body=[pyte.ops.STORE_FAST(varnames[1])]),
+}
+
+
+def run(quick: bool = False) -> dict:
+    results = {}
+    for name, factory in OPS.items():
+        op = factory()
+
+        def _emit():
+            op.emit(Emitter())
+
+        try:
+            _emit()
+        except CompileError:
+            # Not supported on this interpreter.
+            continue
+        results["emit/{}".format(name)] = measure(_emit)
+
+        def _build(factory=factory):
+            factory().emit(Emitter())
+
+        results["build/{}".format(name)] = measure(_build)
+    return results
@@ -0,0 +1,26 @@
+"""
+Measures `pyte.compile` latency under each compile profile.
+"""
+import contextlib
+import io
+
+import pyte
+from pyte.compiler import PROFILES
+
+from benchmarks import make_code, measure
+
+SIZES = (10, 100, 1000)
+
+
+def run(quick: bool = False) -> dict:
+    results = {}
+    for size in SIZES:
+        code, consts, varnames = make_code(2 * size)
+        for name in PROFILES:
+            def _compile(name=name):
+                pyte.compile(code, consts, [], varnames, profile=name)
+
+            # The debug profile prints the disassembly, which should not end up in the output.
+            with contextlib.redirect_stdout(io.StringIO()):
+                results["profile/{}/{}".format(name, size)] = measure(_compile)
+    return results
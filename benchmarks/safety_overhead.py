@@ -0,0 +1,26 @@
+"""
+Measures the call overhead of the safety modes of `pyte.compile`.
+"""
+import pyte
+
+from benchmarks import measure
+
+MODES = (False, True, "hook")
+
+
+def _make_function(mode):
+    varnames = pyte.create_varnames("a", "b")
+    instructions = [
+        varnames[0] + varnames[1],
+        pyte.tokens.RETURN_VALUE
+    ]
+    return pyte.compile(instructions, [], [], varnames, arg_count=2, use_safety_wrapper=mode,
+                        profile="release")
+
+
+def run(quick: bool = False) -> dict:
+    results = {}
+    for mode in MODES:
+        func = _make_function(mode)
+        results["safety/{}".format(str(mode).lower())] = measure(lambda: func(1, 2))
+    return results
@@ -3,23 +3,20 @@ Pyte - The Python bytecode utility.
 """
 import sys
 
-if sys.version_info[0] == 3:
-    if sys.version_info[1] == 3:
-        from . import tokens_33 as tokens
-    elif sys.version_info[1] == 4:
-        from . import tokens_34 as tokens
-    elif sys.version_info[1] == 5:
-        from . import tokens_35 as tokens
-    elif sys.version_info[1] == 6:
-        from . import tokens_36 as tokens
-    else:
-        raise SystemError("This version of Python 3 is not supported")
-else:
-    raise SystemError("This version of Python ({}) is not supported".format(sys.version_info[0]))
-
-from .compiler import compile
+# The code object layout and the opcodes Pyte emits are only handled for 3.3 to 3.6. Newer
+# versions changed both, and would otherwise fail later with an unhelpful error.
+if not (3, 3) <= sys.version_info[0:2] <= (3, 6):
+    raise SystemError("This version of Python ({}.{}) is not supported"
+                      .format(*sys.version_info[0:2]))
+
+from . import tokens
+from .compiler import compile, compile_stream, set_default_profile, with_closure
+from .batch import CompileJob, compile_many
 from . import superclasses
-from . import ops
+from .cache import CompileCache, DiskCache
+from .emitter import InstructionStream
+from .pool import Pool
+from . import frozen, metrics, ops, sourcemap
 
 
 # Helper for creating new validated lists.
@@ -52,3 +49,32 @@ def create_varnames(*args) -> superclasses.PyteAugmentedArgList:
     :param args: The args to use.
     """
     return _create_validated(*args, name="varnames")
+
+
+def create_cellvars(*args) -> superclasses.PyteAugmentedArgList:
+    """
+    Creates a new list of cellvars.
+
+    :param args: The args to use.
+    """
+    return _create_validated(*args, name="cellvars")
+
+
+def create_freevars(*args) -> superclasses.PyteAugmentedArgList:
+    """
+    Creates a new list of freevars.
+
+    :param args: The args to use.
+    """
+    return _create_validated(*args, name="freevars")
+
+
+def create_pool(*args, name: str = "consts") -> Pool:
+    """
+    Creates a new :class:`.Pool`, which assigns indexes to values as they are added.
+
+    :param args: Values to start the pool with.
+    :param name: The kind of list; one of ``"consts"``, ``"names"``, ``"varnames"``, \
+        ``"cellvars"`` or ``"freevars"``.
+    """
+    return Pool(args, name=name)
@@ -0,0 +1,346 @@
+"""
+Control flow analysis of assembled bytecode.
+"""
+import collections
+
+from pyte import opcodes, tokens
+from pyte.emitter import Emitter, Label
+from pyte.exc import CompileError
+from pyte.opcodes import EXTENDED_ARG, HASJABS as _HASJABS, HASJREL as _HASJREL, HAVE_ARGUMENT
+from pyte.util import PY36
+
+# Instructions that never fall through to the next instruction.
+_UNCONDITIONAL_JUMPS = frozenset(
+    getattr(tokens, name) for name in ("JUMP_ABSOLUTE", "JUMP_FORWARD", "CONTINUE_LOOP")
+    if hasattr(tokens, name)
+)
+_TERMINATORS = frozenset(
+    getattr(tokens, name) for name in ("RETURN_VALUE", "RAISE_VARARGS", "BREAK_LOOP")
+    if hasattr(tokens, name)
+)
+
+Instruction = collections.namedtuple("Instruction", "offset opcode arg size")
+Instruction.__doc__ = """
+A decoded instruction.
+
+``offset`` is the offset of the first byte of the instruction, including any EXTENDED_ARG
+prefixes, and ``arg`` is the full argument with the prefixes applied (or None). ``size`` is the
+number of bytes the instruction takes up.
+"""
+
+
+def decode(bc: bytes) -> list:
+    """
+    Decodes bytecode into a list of :class:`Instruction`, folding EXTENDED_ARG prefixes.
+
+    :param bc: The bytecode to decode.
+    :return: A list of instructions.
+    """
+    instructions = []
+    extended_arg = 0
+    start = 0
+    i = 0
+    n = len(bc)
+    while i < n:
+        op = bc[i]
+        if PY36:
+            arg = bc[i + 1] | extended_arg if op >= HAVE_ARGUMENT else None
+            i += 2
+        elif op >= HAVE_ARGUMENT:
+            arg = bc[i + 1] | (bc[i + 2] << 8) | extended_arg
+            i += 3
+        else:
+            arg = None
+            i += 1
+
+        if op == EXTENDED_ARG:
+            extended_arg = arg << (8 if PY36 else 16)
+            continue
+
+        instructions.append(Instruction(start, op, arg, i - start))
+        extended_arg = 0
+        start = i
+
+    return instructions
+
+
+def jump_target(instruction: Instruction):
+    """
+    :param instruction: The instruction.
+    :return: The offset the instruction jumps to, or None if it is not a jump.
+    """
+    if instruction.opcode in _HASJREL:
+        return instruction.offset + instruction.size + instruction.arg
+    elif instruction.opcode in _HASJABS:
+        return instruction.arg
+    return None
+
+
+def rewrite(bc: bytes, replace, prologue=None) -> tuple:
+    """
+    Re-emits assembled bytecode, letting a callback replace instructions.
+
+    Jumps are re-resolved, so replacements can be any size. A jump to a replaced instruction
+    lands on the start of its replacement.
+
+    :param bc: The bytecode.
+    :param replace: Called as ``replace(instruction, emitter)`` for every instruction that is not \
+        a jump. It returns True if it emitted a replacement, or False to keep the instruction.
+    :param prologue: Called as ``prologue(emitter)`` to emit code before the first instruction. \
+        Jumps to the first instruction do not run it again.
+    :return: A tuple of (the new bytecode, a dict mapping the offset of every instruction, and \
+        the end of the bytecode, to its new offset).
+    :raises CompileError: If a jump goes into the middle of an instruction.
+    """
+    instructions = decode(bc)
+    labels = {instruction.offset: Label() for instruction in instructions}
+    labels[len(bc)] = Label()
+
+    emitter = Emitter()
+    if prologue is not None:
+        prologue(emitter)
+
+    for instruction in instructions:
+        emitter.mark(labels[instruction.offset])
+        target = jump_target(instruction)
+        if target is not None:
+            try:
+                emitter.emit_jump(instruction.opcode, labels[target])
+            except KeyError:
+                raise CompileError("Instruction at {} jumps to {}, which is not the start of an "
+                                   "instruction".format(instruction.offset, target)) from None
+        elif replace(instruction, emitter):
+            continue
+        elif instruction.opcode >= HAVE_ARGUMENT:
+            emitter.emit(instruction.opcode, instruction.arg)
+        else:
+            emitter.emit(instruction.opcode)
+    emitter.mark(labels[len(bc)])
+
+    rewritten = emitter.assemble()
+    return rewritten, {offset: label.offset for offset, label in labels.items()}
+
+
+def stack_effect(instruction: Instruction) -> int:
+    """
+    :param instruction: The instruction.
+    :return: The stack effect of the instruction when it does not jump.
+    """
+    try:
+        return opcodes.stack_effect(instruction.opcode, instruction.arg)
+    except ValueError as e:
+        raise CompileError("Invalid opcode `{}` when compiling"
+                           .format(instruction.opcode)) from e
+
+
+def _branch_effects(instruction: Instruction, effect: int):
+    """
+    Gets the stack effect of an instruction along its fallthrough and jump edges.
+
+    :func:`.opcodes.stack_effect` reports a single number, which is wrong for some branch
+    instructions.
+    """
+    if instruction.opcode == tokens.FOR_ITER:
+        # Pushes the next value, or pops the exhausted iterator and jumps.
+        return effect, effect - 2
+    elif instruction.opcode in (tokens.JUMP_IF_TRUE_OR_POP, tokens.JUMP_IF_FALSE_OR_POP):
+        # Keeps the value if it jumps, pops it if it does not.
+        return effect - 1, effect
+    return effect, effect
+
+
+class BasicBlock(object):
+    """
+    A run of instructions with a single entry point and a single exit.
+    """
+
+    def __init__(self, index: int, instructions: list):
+        self.index = index
+        self.instructions = instructions
+        #: A list of (block, stack effect of the edge) tuples.
+        self.successors = []
+        #: A list of blocks that can jump or fall through into this block.
+        self.predecessors = []
+        #: The stack depth on entry to this block, or None if it is unreachable.
+        self.entry_depth = None
+        #: The maximum stack depth inside this block, or None if it is unreachable.
+        self.max_depth = None
+
+    @property
+    def start(self) -> int:
+        return self.instructions[0].offset
+
+    @property
+    def end(self) -> int:
+        last = self.instructions[-1]
+        return last.offset + last.size
+
+    @property
+    def reachable(self) -> bool:
+        return self.entry_depth is not None
+
+    def __repr__(self):
+        return "<BasicBlock {} [{}, {})>".format(self.index, self.start, self.end)
+
+
+class ControlFlowGraph(object):
+    """
+    The control flow graph of a piece of bytecode.
+
+    The bytecode is only decoded once; the instructions, blocks and stack depths are kept around
+    for other passes to use.
+    """
+
+    def __init__(self, bc: bytes):
+        self.bytecode = bc
+        self.instructions = decode(bc)
+        self.blocks = []
+        self._block_by_offset = {}
+        self._max_stack = None
+
+        self._build()
+
+    @classmethod
+    def from_instructions(cls, instructions: list) -> "ControlFlowGraph":
+        """
+        Creates a graph from already decoded instructions.
+        """
+        graph = cls.__new__(cls)
+        graph.bytecode = None
+        graph.instructions = instructions
+        graph.blocks = []
+        graph._block_by_offset = {}
+        graph._max_stack = None
+        graph._build()
+        return graph
+
+    def _build(self):
+        instructions = self.instructions
+        if not instructions:
+            return
+
+        # Find the leaders: the first instruction, every jump target and every instruction after
+        # a jump or a terminator.
+        leaders = {instructions[0].offset}
+        for instruction in instructions:
+            target = jump_target(instruction)
+            if target is not None:
+                leaders.add(target)
+                leaders.add(instruction.offset + instruction.size)
+            elif instruction.opcode in _TERMINATORS:
+                leaders.add(instruction.offset + instruction.size)
+
+        current = []
+        for instruction in instructions:
+            if instruction.offset in leaders and current:
+                self._add_block(current)
+                current = []
+            current.append(instruction)
+        self._add_block(current)
+
+        # Link the blocks together.
+        for index, block in enumerate(self.blocks):
+            last = block.instructions[-1]
+            effect = stack_effect(last)
+            fallthrough_effect, jump_effect = _branch_effects(last, effect)
+
+            target = jump_target(last)
+            if target is not None:
+                try:
+                    target_block = self._block_by_offset[target]
+                except KeyError:
+                    raise CompileError("Instruction at {} jumps to {}, which is not the start of "
+                                       "an instruction".format(last.offset, target)) from None
+                self._link(block, target_block, jump_effect)
+
+            if last.opcode in _TERMINATORS or last.opcode in _UNCONDITIONAL_JUMPS:
+                continue
+            if index + 1 < len(self.blocks):
+                self._link(block, self.blocks[index + 1], fallthrough_effect)
+
+    def _add_block(self, instructions: list):
+        block = BasicBlock(len(self.blocks), instructions)
+        self.blocks.append(block)
+        self._block_by_offset[block.start] = block
+
+    @staticmethod
+    def _link(source: BasicBlock, dest: BasicBlock, effect: int):
+        source.successors.append((dest, effect))
+        dest.predecessors.append(source)
+
+    def block_at(self, offset: int) -> BasicBlock:
+        """
+        :param offset: The offset a block starts at.
+        :return: The :class:`BasicBlock` that starts at that offset.
+        """
+        return self._block_by_offset[offset]
+
+    def stack_depth(self) -> int:
+        """
+        Computes the maximum stack depth of the bytecode, following every jump.
+
+        Each block is given the deepest entry depth it can be reached with, using a worklist over
+        the graph. A block is only revisited when its entry depth increases, and each revisit is
+        constant time, so this is linear in the size of the bytecode for well-formed code.
+
+        :return: The maximum stack depth.
+        """
+        if self._max_stack is not None:
+            return self._max_stack
+
+        if not self.blocks:
+            self._max_stack = 0
+            return 0
+
+        # Any well-formed bytecode can never be deeper than all of its pushes together.
+        limit = sum(max(stack_effect(i), 0) for i in self.instructions) + 1
+
+        # The stack effect of each block, without its last instruction. The last instruction is
+        # accounted for on the edges, as it can differ between them.
+        body_effects = [sum(stack_effect(i) for i in block.instructions[:-1])
+                        for block in self.blocks]
+
+        # First, find the deepest entry depth of every reachable block.
+        entry = self.blocks[0]
+        entry.entry_depth = 0
+        worklist = collections.deque([entry])
+        queued = {entry.index}
+
+        while worklist:
+            block = worklist.popleft()
+            queued.discard(block.index)
+
+            depth = block.entry_depth + body_effects[block.index]
+            for successor, effect in block.successors:
+                new_depth = depth + effect
+                if new_depth > limit:
+                    raise CompileError("Stack grows without bound in the loop at offset {}"
+                                       .format(successor.start))
+                if successor.entry_depth is None or new_depth > successor.entry_depth:
+                    successor.entry_depth = new_depth
+                    if successor.index not in queued:
+                        queued.add(successor.index)
+                        worklist.append(successor)
+
+        # Then, walk every reachable block from its entry depth.
+        max_stack = 0
+        for block in self.blocks:
+            if block.entry_depth is None:
+                continue
+
+            depth = block.entry_depth
+            block_max = depth
+            for instruction in block.instructions:
+                depth += stack_effect(instruction)
+                if depth < 0:
+                    raise CompileError("Stack turned negative on instruction: {}"
+                                       .format(opcodes.opname(instruction.opcode)))
+                if depth > block_max:
+                    block_max = depth
+
+            block.max_depth = block_max
+            if block_max > max_stack:
+                max_stack = block_max
+
+        self._max_stack = max_stack
+        return max_stack
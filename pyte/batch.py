@@ -0,0 +1,94 @@
+"""
+Compiles many functions at once, optionally across a pool of worker processes.
+"""
+import collections
+import concurrent.futures
+import marshal
+import sys
+from typing import Any, Union
+
+from pyte import compiler, util
+from pyte.emitter import InstructionStream
+
+CompileJob = collections.namedtuple("CompileJob", "code consts names varnames func_name arg_count "
+                                                  "kwarg_defaults")
+CompileJob.__new__.__defaults__ = ("<unknown, compiled>", 0, ())
+CompileJob.__doc__ = """
+A single function to compile with :func:`compile_many`.
+
+The fields match the arguments of :func:`pyte.compile`.
+"""
+
+
+def _to_job(job: Any) -> CompileJob:
+    if isinstance(job, CompileJob):
+        return job
+    elif isinstance(job, dict):
+        return CompileJob(**job)
+    return CompileJob(*job)
+
+
+def _compile_marshalled(job: CompileJob, filename: str, firstlineno: int,
+                        profile: compiler.CompileProfile) -> bytes:
+    """
+    Compiles a job into a marshalled code object. This is what runs inside the workers.
+    """
+    varnames = tuple(job.varnames)
+    compiler._check_arguments(varnames, job.arg_count, job.kwarg_defaults)
+
+    code = job.code
+    if not isinstance(code, InstructionStream):
+        code = util.flatten(code)
+    obb = compiler._compile_code_object(code, tuple(job.consts), tuple(job.names), varnames,
+                                        job.func_name, job.arg_count, filename, firstlineno,
+                                        profile, profile.optimize)
+    return marshal.dumps(obb)
+
+
+def compile_many(jobs: list, *, max_workers: int = None,
+                 executor: concurrent.futures.Executor = None, chunksize: int = 16,
+                 f_globals: dict = None, use_safety_wrapper: Union[bool, str] = True,
+                 profile: Union[str, compiler.CompileProfile] = "release") -> list:
+    """
+    Compiles many functions.
+
+    The jobs are compiled into code objects in a :class:`concurrent.futures.ProcessPoolExecutor`,
+    which sends them back marshalled. The code objects are then bound to ``f_globals`` in this
+    process, so the globals never have to be sent to the workers. Jobs have to be picklable for
+    this; everything Pyte provides is.
+
+    :param jobs: An iterable of :class:`CompileJob`. Tuples and dicts of the same fields are also \
+        accepted.
+    :param max_workers: The number of worker processes. If this is 1, the jobs are compiled in \
+        this process. Defaults to the number of CPUs.
+    :param executor: An existing executor to compile the jobs in, instead of starting a new pool.
+    :param chunksize: How many jobs to send to a worker at once.
+    :param f_globals: The globals to bind the functions to. Defaults to the caller's globals.
+    :param use_safety_wrapper: Wrap each function with the safety wrapper? See \
+        :func:`pyte.compile`.
+    :param profile: The compile profile to use in the workers. Defaults to ``"release"``, as the \
+        output of the debug profile would be lost.
+    :return: A list of functions, in the same order as the jobs.
+    """
+    jobs = [_to_job(job) for job in jobs]
+    profile = compiler.get_profile(profile)
+
+    frame = sys._getframe(1)
+    if f_globals is None:
+        f_globals = frame.f_globals
+    filename, firstlineno = frame.f_code.co_filename, frame.f_lineno
+
+    n = len(jobs)
+    args = ([filename] * n, [firstlineno] * n, [profile] * n)
+
+    if executor is not None:
+        marshalled = list(executor.map(_compile_marshalled, jobs, *args, chunksize=chunksize))
+    elif max_workers == 1 or n <= 1:
+        marshalled = list(map(_compile_marshalled, jobs, *args))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as pool:
+            marshalled = list(pool.map(_compile_marshalled, jobs, *args, chunksize=chunksize))
+
+    return [compiler._bind_function(marshal.loads(data), f_globals, job.func_name,
+                                    job.kwarg_defaults, use_safety_wrapper)
+            for job, data in zip(jobs, marshalled)]
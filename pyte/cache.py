@@ -0,0 +1,444 @@
+"""
+Caches of compiled code objects, both in-process and on disk.
+"""
+import array
+import collections
+import hashlib
+import marshal
+import mmap
+import os
+import tempfile
+import types
+
+from pyte.emitter import InstructionStream
+from pyte.superclasses import _PyteAugmentedComparator, _PyteAugmentedValidator, _PyteOp
+
+try:
+    from importlib.util import MAGIC_NUMBER
+except ImportError:
+    # Python 3.3
+    import imp
+    MAGIC_NUMBER = imp.get_magic()
+
+CacheInfo = collections.namedtuple("CacheInfo", "hits misses evictions maxsize currsize")
+
+# Scalars that can be keyed directly. Floats and complexes are keyed by their repr, so that
+# 0.0 and -0.0 (and NaNs) do not collide.
+_SCALARS = (type(None), bool, int, str, bytes, type(Ellipsis))
+
+
+def _attributes(obb) -> dict:
+    """
+    Gets the attributes of an object, from both its ``__dict__`` and its ``__slots__``.
+    """
+    attributes = dict(getattr(obb, "__dict__", {}))
+    for klass in type(obb).__mro__:
+        slots = klass.__dict__.get("__slots__", ())
+        if isinstance(slots, str):
+            slots = (slots,)
+        for name in slots:
+            if name in ("__dict__", "__weakref__"):
+                continue
+            try:
+                attributes[name] = getattr(obb, name)
+            except AttributeError:
+                # An unset slot.
+                continue
+    return attributes
+
+
+def _structural_key(obb):
+    """
+    Creates a hashable key that describes the structure of a Pyte object.
+
+    Two objects with the same key generate the same bytecode.
+    """
+    cls = type(obb)
+    if cls in _SCALARS:
+        return cls, obb
+    elif cls in (float, complex):
+        return cls, repr(obb)
+    elif cls in (list, tuple):
+        return cls, tuple(_structural_key(x) for x in obb)
+    elif cls in (set, frozenset):
+        return cls, frozenset(_structural_key(x) for x in obb)
+    elif cls is dict:
+        return cls, frozenset((_structural_key(k), _structural_key(v)) for k, v in obb.items())
+    elif isinstance(obb, _PyteAugmentedValidator):
+        # Only the list and the index matter.
+        return _PyteAugmentedValidator, obb.list_name, obb.index
+    elif cls is array.array:
+        return cls, obb.typecode, obb.tobytes()
+    elif isinstance(obb, (_PyteOp, _PyteAugmentedComparator, InstructionStream)) or (
+            hasattr(obb, "__dict__") and not isinstance(obb, (type, types.FunctionType,
+                                                              types.CodeType))):
+        items = []
+        for name, value in sorted(_attributes(obb).items()):
+            # Skip methods bound onto the object itself.
+            if isinstance(value, types.MethodType) and value.__self__ is obb:
+                continue
+            items.append((name, _structural_key(value)))
+        return cls, tuple(items)
+    else:
+        # Fall back to the object itself. This raises TypeError if it cannot be hashed.
+        hash(obb)
+        return cls, obb
+
+
+def make_key(code: list, consts: tuple, names: tuple, varnames: tuple,
+             func_name: str = "<unknown, compiled>", arg_count: int = 0,
+             optimize: bool = True, cellvars: tuple = (), freevars: tuple = (),
+             profile: str = None, source_map: bool = False, instrument: str = None,
+             freeze: tuple = None) -> tuple:
+    """
+    Creates the cache key for a compilation.
+
+    :param code: The flattened list of instructions, or an :class:`.InstructionStream`.
+    :param consts: The consts of the function.
+    :param names: The names of the function.
+    :param varnames: The varnames of the function.
+    :param func_name: The name of the function.
+    :param arg_count: The number of arguments this function takes.
+    :param optimize: If the bytecode is optimized.
+    :param cellvars: The cellvars of the function.
+    :param freevars: The freevars of the function.
+    :param profile: The name of the compile profile.
+    :param source_map: If the function gets a source map.
+    :param instrument: The name the function is instrumented under, or None.
+    :param freeze: The names of the frozen globals, or None.
+    :return: A hashable key.
+    :raises TypeError: If part of the code or pools could not be hashed.
+    """
+    return (
+        _structural_key(code if isinstance(code, InstructionStream) else list(code)),
+        _structural_key(tuple(consts)),
+        tuple(names),
+        tuple(varnames),
+        func_name,
+        arg_count,
+        optimize,
+        tuple(cellvars),
+        tuple(freevars),
+        profile,
+        source_map,
+        instrument,
+        tuple(freeze) if freeze is not None else None
+    )
+
+
+class CompileCache(object):
+    """
+    A bounded LRU cache mapping compile keys to finished code objects.
+
+    Only the code object is cached; every compile still creates a new function bound to the
+    caller's globals.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        """
+        :param maxsize: The maximum number of code objects to keep.
+        """
+        self._entries = collections.OrderedDict()
+        self._maxsize = maxsize
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, value: int):
+        self._maxsize = value
+        self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key):
+        """
+        Gets a code object from the cache.
+
+        :param key: The key, from :func:`make_key`.
+        :return: The code object, or None if it is not cached.
+        """
+        try:
+            obb = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return obb
+
+    def put(self, key, obb: types.CodeType):
+        """
+        Adds a code object to the cache, evicting the least recently used entry if needed.
+
+        :param key: The key, from :func:`make_key`.
+        :param obb: The code object to store.
+        """
+        self._entries[key] = obb
+        self._entries.move_to_end(key)
+        self._evict()
+
+    def invalidate(self, key=None):
+        """
+        Invalidates entries in the cache.
+
+        :param key: The key to invalidate. If this is None, the entire cache is cleared.
+        """
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def info(self) -> CacheInfo:
+        """
+        :return: The hit, miss and eviction counters of this cache.
+        """
+        return CacheInfo(self.hits, self.misses, self.evictions, self._maxsize,
+                         len(self._entries))
+
+    def reset_stats(self):
+        """
+        Resets the counters of this cache.
+        """
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+# The cache used by `pyte.compile(..., cache=True)`.
+default_cache = CompileCache()
+
+
+# Bumped whenever the layout of the cache files changes.
+_DISK_FORMAT = b"PYTE\x01"
+
+#: The version of the code Pyte generates. This must be bumped whenever the same instructions
+#: are compiled into different bytecode, so disk caches written by older versions are not used.
+CODEGEN_VERSION = 1
+
+_HEADER = _DISK_FORMAT + MAGIC_NUMBER + CODEGEN_VERSION.to_bytes(2, "little")
+
+
+def _stable_repr(key) -> str:
+    """
+    Turns a key from :func:`make_key` into a string that is the same in every process.
+
+    :raises TypeError: If the key contains an object whose repr could differ between processes.
+    """
+    if isinstance(key, tuple):
+        return "(" + ",".join(_stable_repr(k) for k in key) + ")"
+    elif isinstance(key, frozenset):
+        return "{" + ",".join(sorted(_stable_repr(k) for k in key)) + "}"
+    elif isinstance(key, type):
+        return key.__module__ + "." + key.__qualname__
+    elif type(key) in _SCALARS:
+        return repr(key)
+    raise TypeError("`{}` can not be keyed on disk".format(type(key)))
+
+
+def digest(key) -> str:
+    """
+    Hashes a key from :func:`make_key` for the disk cache.
+
+    The hash includes the interpreter's bytecode magic number and :data:`CODEGEN_VERSION`, so
+    caches are never shared between incompatible interpreters or versions of Pyte.
+
+    :param key: The key.
+    :return: A hex digest.
+    :raises TypeError: If the key can not be hashed stably.
+    """
+    h = hashlib.sha256(_HEADER)
+    h.update(_stable_repr(key).encode("utf-8", "surrogatepass"))
+    return h.hexdigest()
+
+
+def _default_directory() -> str:
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pyte")
+
+
+class DiskCache(object):
+    """
+    A persistent cache of marshalled code objects, similar to ``__pycache__``.
+
+    This has the same interface as :class:`CompileCache`, so it can be passed as the ``cache``
+    argument of :func:`pyte.compile`. Entries are read with mmap and written atomically, so
+    several processes can share one directory. Once the directory grows past ``max_bytes``, the
+    least recently used entries are removed.
+    """
+
+    suffix = ".pytec"
+
+    def __init__(self, directory: str = None, max_bytes: int = 64 * 1024 * 1024):
+        """
+        :param directory: The directory to store entries in. Defaults to ``~/.cache/pyte``.
+        :param max_bytes: The maximum total size of the entries.
+        """
+        self.directory = directory or _default_directory()
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+        # An estimate of the size of the directory, filled in on the first write.
+        self._size = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key) -> str:
+        return os.path.join(self.directory, digest(key) + self.suffix)
+
+    def _entries(self):
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.suffix):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield path, st
+
+    def __len__(self):
+        return sum(1 for _ in self._entries())
+
+    def __contains__(self, key):
+        try:
+            return os.path.exists(self._path(key))
+        except TypeError:
+            return False
+
+    def _read(self, path: str):
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm[:len(_HEADER)] != _HEADER:
+                    raise ValueError("Bad cache header")
+                view = memoryview(mm)
+                try:
+                    return marshal.loads(view[len(_HEADER):])
+                finally:
+                    view.release()
+
+    def get(self, key):
+        """
+        Gets a code object from the cache.
+
+        :param key: The key, from :func:`make_key`.
+        :return: The code object, or None if it is not cached.
+        """
+        try:
+            path = self._path(key)
+            obb = self._read(path)
+        except (OSError, TypeError, ValueError, EOFError):
+            # Missing, unkeyable, or a corrupt entry.
+            self.misses += 1
+            return None
+
+        # Record the use, for eviction.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return obb
+
+    def put(self, key, obb: types.CodeType):
+        """
+        Writes a code object to the cache, evicting old entries if the cache is too big.
+
+        Code objects that can't be marshalled, or keys that can't be hashed stably, are silently
+        not cached.
+
+        :param key: The key, from :func:`make_key`.
+        :param obb: The code object to store.
+        """
+        try:
+            path = self._path(key)
+            data = _HEADER + marshal.dumps(obb)
+        except (TypeError, ValueError):
+            return
+
+        # Write to a temporary file, then move it into place, so readers never see half an entry.
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+        if self._size is None:
+            self._size = sum(st.st_size for _, st in self._entries())
+        else:
+            self._size += len(data)
+
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        # Other processes may have changed the directory, so get the real sizes first.
+        entries = sorted(self._entries(), key=lambda entry: entry[1].st_mtime)
+        size = sum(st.st_size for _, st in entries)
+        for path, st in entries:
+            if size <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            size -= st.st_size
+            self.evictions += 1
+        self._size = size
+
+    def invalidate(self, key=None):
+        """
+        Invalidates entries in the cache.
+
+        :param key: The key to invalidate. If this is None, the entire cache is cleared.
+        """
+        if key is None:
+            paths = [path for path, _ in self._entries()]
+        else:
+            try:
+                paths = [self._path(key)]
+            except TypeError:
+                return
+
+        for path in paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        self._size = None
+
+    def info(self) -> CacheInfo:
+        """
+        :return: The hit, miss and eviction counters of this cache. ``maxsize`` is in bytes.
+        """
+        return CacheInfo(self.hits, self.misses, self.evictions, self.max_bytes, len(self))
+
+    def reset_stats(self):
+        """
+        Resets the counters of this cache.
+        """
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
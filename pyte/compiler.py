@@ -1,138 +1,218 @@
 """
 Compiles python bytecode using `types.FunctionType`.
 """
+import bisect
+import collections
 import contextlib
 import dis
-import inspect
 import io
 import sys
 import types
 import warnings
-from typing import Any, Tuple
+from typing import Any, Iterable, Tuple, Union
 
-from pyte import tokens, util
-from pyte.exc import CompileError
-from pyte.superclasses import _PyteAugmentedComparator, _PyteOp
+from pyte import frozen, metrics, opcodes, optimizer, safety, sourcemap, tokens, util
+from pyte.analysis import ControlFlowGraph, rewrite
+from pyte.cache import CompileCache, DiskCache, default_cache, make_key
+from pyte.emitter import Emitter, InstructionStream
+from pyte.exc import CompileError, CompileWarning, ValidationError
 from pyte.util import PY36
 
+#: Describes how much work :func:`compile` does besides assembling the bytecode.
+CompileProfile = collections.namedtuple("CompileProfile",
+                                        "name print_disassembly optimize report_optimizations "
+                                        "fused_validation")
+
+PROFILES = {
+    # Prints the disassembly, and validates with the full `dis` machinery.
+    "debug": CompileProfile("debug", True, True, True, False),
+    # Same checks as debug, without the printing.
+    "checked": CompileProfile("checked", False, True, True, False),
+    # No printing or warnings, and validation reuses the decoded control flow graph.
+    "release": CompileProfile("release", False, True, False, True),
+}
+
+_default_profile = PROFILES["debug"]
+
+
+def get_profile(profile: Union[str, CompileProfile] = None) -> CompileProfile:
+    """
+    Gets a compile profile.
+
+    :param profile: The name of the profile, or a :class:`CompileProfile`. If this is None, the \
+        process-wide default profile is returned.
+    :return: The :class:`CompileProfile`.
+    """
+    if profile is None:
+        return _default_profile
+    if isinstance(profile, CompileProfile):
+        return profile
+    try:
+        return PROFILES[profile]
+    except KeyError:
+        raise CompileError("Unknown compile profile `{}`".format(profile)) from None
+
+
+def set_default_profile(profile: Union[str, CompileProfile]):
+    """
+    Sets the process-wide default compile profile, used when :func:`compile` is not passed one.
+
+    :param profile: The name of the profile, or a :class:`CompileProfile`.
+    """
+    global _default_profile
+    _default_profile = get_profile(profile)
+
 
 def compile_bytecode(code: list) -> bytes:
     """
     Compiles Pyte objects into a bytecode list.
 
-    :param code: A list of objects to compile.
+    :param code: A list of objects to compile, or an :class:`.InstructionStream`.
     :return: The computed bytecode.
+    :raises CompileError: If the code adds constants, such as the keyword names of a call. \
+        Their indexes depend on the consts of the function, so use :func:`compile` instead.
     """
-    bc = b""
+    bc, _, emitter = _assemble(code)
+    if emitter.added_consts:
+        raise CompileError("Code that adds constants ({}) can only be compiled into a function"
+                           .format(", ".join(repr(value) for value in emitter.added_consts)))
+    return bc
+
+
+def _assemble(code, track_positions: bool = False, cell_count: int = 0,
+              const_count: int = None) -> tuple:
+    """
+    Compiles Pyte objects into bytecode.
+
+    :param const_count: The number of consts of the function, or None if they are not known yet.
+    :return: A tuple of (the bytecode, a list of (offset, object, line) as in \
+        :attr:`.Emitter.positions` or None if positions are not tracked, the emitter the code \
+        was compiled with).
+    """
+    if isinstance(code, InstructionStream):
+        code = [code]
+
+    emitter = Emitter(track_positions=track_positions, cell_count=cell_count,
+                      const_count=const_count)
     for i, op in enumerate(code):
         try:
-            # Get the bytecode.
-            if isinstance(op, _PyteOp) or isinstance(op, _PyteAugmentedComparator):
-                bc_op = op.to_bytes(bc)
-            elif isinstance(op, int):
-                bc_op = op.to_bytes(1, byteorder="little")
-            elif isinstance(op, bytes):
-                bc_op = op
-            else:
-                raise CompileError("Could not compile code of type {}".format(type(op)))
-            bc += bc_op
+            # Write the bytecode into the emitter.
+            emitter.emit_obb(op)
         except Exception as e:
             print("Fatal compiliation error on operator {i} ({op}).".format(i=i, op=op))
             raise e
 
-    return bc
+    bc = emitter.assemble()
+    if not track_positions:
+        return bc, None, emitter
+    return bc, [(label.offset, obb, line) for label, obb, line in emitter.positions], emitter
 
 
-# TODO: Backport to <3.3
-def _simulate_stack(code: list) -> int:
+def _number_added_consts(bc: bytes, positions: list, emitter: Emitter,
+                         const_count: int) -> tuple:
     """
-    Simulates the actions of the stack, to check safety.
+    Gives the constants added with :meth:`.Emitter.load_const` their real indexes, once the
+    consts of the function are known.
 
-    This returns the maximum needed stack.
+    :return: A tuple of (the bytecode, the positions).
     """
+    loads = {label.offset: index for label, index in emitter.added_loads}
+    if not loads:
+        return bc, positions
 
-    max_stack = 0
-    curr_stack = 0
+    def replace(instruction, new: Emitter) -> bool:
+        index = loads.get(instruction.offset)
+        if index is None:
+            return False
+        new.emit(tokens.LOAD_CONST, const_count + index)
+        return True
 
-    def _check_stack(ins):
-        if curr_stack < 0:
-            raise CompileError("Stack turned negative on instruction: {}".format(ins))
-        if curr_stack > max_stack:
-            return curr_stack
+    bc, offsets = rewrite(bc, replace)
+    if positions is not None:
+        positions = _remap_positions(positions, offsets)
+    return bc, positions
 
-    # Iterate over the bytecode.
-    for instruction in code:
-        assert isinstance(instruction, dis.Instruction)
-        if instruction.arg is not None:
-            try:
-                effect = dis.stack_effect(instruction.opcode, instruction.arg)
-            except ValueError as e:
-                raise CompileError("Invalid opcode `{}` when compiling"
-                                   .format(instruction.opcode)) from e
-        else:
-            try:
-                effect = dis.stack_effect(instruction.opcode)
-            except ValueError as e:
-                raise CompileError("Invalid opcode `{}` when compiling"
-                                   .format(instruction.opcode)) from e
-        curr_stack += effect
-        # Re-check the stack.
-        _should_new_stack = _check_stack(instruction)
-        if _should_new_stack:
-            max_stack = _should_new_stack
-
-    return max_stack
-
-
-def _optimize_warn_pass(bc: list):
-    # Check for shitty calls
-    previous = None
-    for op in bc:
-        assert isinstance(op, dis.Instruction)
-        if previous is None:
-            previous = op
-            continue
-        if previous.opname == "STORE_FAST":
-            # check for consecutive STORE then LOAD calls
-            if op.opname == "LOAD_FAST" and op.arg == previous.arg:
-                warnings.warn("STORE_FAST call followed by LOAD_FAST call has no effect")
 
+_HASCONST = opcodes.HASCONST
+_HASNAME = opcodes.HASNAME
+_HASLOCAL = opcodes.HASLOCAL
+_HASFREE = opcodes.HASFREE
 
-def compile(code: list, consts: list, names: list, varnames: list,
-            func_name: str = "<unknown, compiled>",
-            arg_count: int = 0, kwarg_defaults: Tuple[Any] = (), use_safety_wrapper: bool = True):
-    """
-    Compiles a set of bytecode instructions into a working function, using Python's bytecode
-    compiler.
 
-    :param code: A list of bytecode instructions.
-    :param consts: A list of constants to compile into the function.
-    :param names: A list of names to compile into the function.
-    :param varnames: A list of ``varnames`` to compile into the function.
-    :param func_name: The name of the function to use.
-    :param arg_count: The number of arguments this function takes. Must be ``<= len(varnames)``.
-    :param kwarg_defaults: A tuple of defaults for kwargs.
-    :param use_safety_wrapper: Use the safety wrapper? This hijacks SystemError to print better \
-        stack traces.
+def _fused_validate(cfg: ControlFlowGraph, consts: tuple, names: tuple, varnames: tuple,
+                    cells: tuple = ()):
     """
-    varnames = tuple(varnames)
-    consts = tuple(consts)
-    names = tuple(names)
-
-    # Flatten the code list.
-    code = util.flatten(code)
+    Validates the pool indexes of every instruction in an already decoded graph.
 
+    This is equivalent to the checks done while building the disassembly, without building it.
+    """
+    for instruction in cfg.instructions:
+        op, arg = instruction.opcode, instruction.arg
+        if op in _HASCONST:
+            if arg >= len(consts):
+                raise ValidationError("Consts value out of range: {}".format(arg))
+        elif op in _HASNAME:
+            if arg >= len(names):
+                raise ValidationError("Names value out of range: {}".format(arg))
+        elif op in _HASLOCAL:
+            if arg >= len(varnames):
+                raise ValidationError("Varnames value out of range: {}".format(arg))
+        elif op in _HASFREE:
+            if arg >= len(cells):
+                raise ValidationError("Cells value out of range: {}".format(arg))
+
+
+def _check_arguments(varnames: tuple, arg_count: int, kwarg_defaults: Tuple[Any]):
     if arg_count > len(varnames):
         raise CompileError("arg_count > len(varnames)")
 
     if len(kwarg_defaults) > len(varnames):
         raise CompileError("len(kwarg_defaults) > len(varnames)")
 
+
+def _compile_code_object(code: list, consts: tuple, names: tuple, varnames: tuple,
+                         func_name: str, arg_count: int, filename: str,
+                         firstlineno: int, profile: CompileProfile,
+                         optimize: bool, source_map: bool = False,
+                         instrument: str = None, freeze: tuple = None, cellvars: tuple = (),
+                         freevars: tuple = ()) -> types.CodeType:
+    """
+    Compiles a flattened list of instructions into a code object.
+    """
     # Compile it.
-    bc = compile_bytecode(code)
+    bc, positions, emitter = _assemble(code, track_positions=source_map,
+                                       cell_count=len(cellvars), const_count=len(consts))
+    consts += tuple(emitter.added_consts)
+    return _build_code_object(bc, consts, names, varnames, func_name, arg_count, filename,
+                              firstlineno, profile, optimize, positions, instrument, freeze,
+                              cellvars, freevars)
+
 
-    dis.dis(bc)
+def _remap_positions(positions: list, offsets: dict) -> list:
+    """
+    Moves positions to where their instructions ended up after the bytecode was rewritten.
+
+    Positions inside an instruction, such as a bare argument byte, move to the next instruction.
+    """
+    starts = sorted(offsets)
+    return [(offsets[starts[bisect.bisect_left(starts, offset)]], obb, line)
+            for offset, obb, line in positions]
 
+
+def _build_code_object(bc: bytes, consts: tuple, names: tuple, varnames: tuple,
+                       func_name: str, arg_count: int, filename: str,
+                       firstlineno: int, profile: CompileProfile,
+                       optimize: bool, positions: list = None,
+                       instrument: str = None, freeze: tuple = None, cellvars: tuple = (),
+                       freevars: tuple = ()) -> types.CodeType:
+    """
+    Optimizes and validates assembled bytecode, and creates a code object from it.
+
+    If ``positions`` is given, the code object gets a line table for them, and a source map.
+    If ``instrument`` is given, the code object counts its calls into the :mod:`pyte.metrics`
+    counters of that name. If ``freeze`` is given, it is a tuple of (the globals, a dict of
+    name -> value from :func:`pyte.frozen.resolve`), and those names are loaded as constants.
+    """
     # Check for a final RETURN_VALUE.
     if PY36:
         # TODO: Add Python 3.6 check
@@ -143,22 +223,57 @@ def compile(code: list, consts: list, names: list, varnames: list,
                 "No default RETURN_VALUE. Add a `pyte.tokens.RETURN_VALUE` to the end of your "
                 "bytecode if you don't need one.")
 
-    # Set default flags
-    flags = 1 | 2 | 64
-
-    frame_data = inspect.stack()[1]
-
-    if sys.version_info[0:2] > (3, 3):
-        # Validate the stack.
-        stack_size = _simulate_stack(dis._get_instructions_bytes(
-            bc, constants=consts, names=names, varnames=varnames)
-        )
-    else:
+    if optimize:
+        bc, report = optimizer.optimize(bc)
+        if profile.report_optimizations and report.changed:
+            warnings.warn("Optimized {}: {}".format(func_name, report), CompileWarning)
+        if positions is not None and report.offsets is not None:
+            positions = _remap_positions(positions, report.offsets)
+
+    frozen_indexes = None
+    if freeze is not None:
+        bc, consts, frozen_indexes, offsets = frozen.freeze(bc, consts, names, freeze[1])
+        if positions is not None:
+            positions = _remap_positions(positions, offsets)
+
+    if instrument is not None:
+        bc, consts, varnames, offsets = metrics.instrument(bc, consts, varnames, instrument)
+        if positions is not None:
+            positions = _remap_positions(positions, offsets)
+
+    if profile.print_disassembly:
+        dis.dis(bc)
+
+    # Set default flags: CO_OPTIMIZED | CO_NEWLOCALS, and CO_NOFREE if there are no cells.
+    flags = 1 | 2
+    if not cellvars and not freevars:
+        flags |= 64
+    cells = cellvars + freevars
+
+    if sys.version_info[0:2] <= (3, 3):
         warnings.warn("Cannot check stack for safety.")
         stack_size = 99
-
-    # Generate optimization warnings.
-    _optimize_warn_pass(dis._get_instructions_bytes(bc, constants=consts, names=names, varnames=varnames))
+    else:
+        cfg = ControlFlowGraph(bc)
+        if profile.fused_validation:
+            # Validate the pools on the instructions the graph already decoded.
+            _fused_validate(cfg, consts, names, varnames, cells)
+        else:
+            # Validate the pools with the full disassembly.
+            for _ in dis._get_instructions_bytes(bc, constants=consts, names=names,
+                                                 varnames=varnames, cells=cells):
+                pass
+        # Validate the stack, following every branch.
+        stack_size = cfg.stack_depth()
+
+    lnotab = b''
+    source_map = None
+    if positions is not None:
+        # Each line is one Pyte object, so the real file and line would be meaningless.
+        source_map = sourcemap.SourceMap(positions)
+        filename = "<pyte:{}>".format(func_name)
+        firstlineno = 1
+        lnotab = source_map.lnotab(firstlineno)
 
     obb = types.CodeType(
         arg_count,  # Varnames - used for arguments.
@@ -170,22 +285,55 @@ def compile(code: list, consts: list, names: list, varnames: list,
         consts,  # co_consts
         names,  # co_names, used for global calls.
         varnames,  # arguments
-        frame_data[1],  # use <unknown, compiled>
+        filename,  # use <unknown, compiled>
         func_name,  # co_name
-        frame_data[2],  # co_firstlineno, ignore this.
-        b'',  # https://svn.python.org/projects/python/trunk/Objects/lnotab_notes.txt
-        (),  # freevars - no idea what this does
-        ()  # cellvars - used for nested functions - we don't use these.
+        firstlineno,  # co_firstlineno, ignore this.
+        lnotab,  # https://svn.python.org/projects/python/trunk/Objects/lnotab_notes.txt
+        freevars,  # freevars - the cells passed in the closure of the function.
+        cellvars  # cellvars - cells made by the function itself, for nested functions.
     )
-    # Update globals
-    f_globals = frame_data[0].f_globals
 
+    if source_map is not None:
+        sourcemap.register(obb, source_map)
+    if frozen_indexes is not None:
+        frozen.register(obb, freeze[0], frozen_indexes)
+    return obb
+
+
+def _make_closure(obb: types.CodeType, closure: Iterable[Any]) -> tuple:
+    """
+    Turns the closure argument of :func:`compile` into a tuple of cells.
+    """
+    if closure is None:
+        if obb.co_freevars:
+            raise CompileError("The function has free variables {}, but no closure was given"
+                               .format(obb.co_freevars))
+        return None
+
+    closure = tuple(value if type(value) is util.CellType else util.make_cell(value)
+                    for value in closure)
+    if len(closure) != len(obb.co_freevars):
+        raise CompileError("The closure has {} cells, but the function has {} free variables"
+                           .format(len(closure), len(obb.co_freevars)))
+    return closure
+
+
+def _bind_function(obb: types.CodeType, f_globals: dict, func_name: str,
+                   kwarg_defaults: Tuple[Any], use_safety_wrapper: Union[bool, str],
+                   closure: Iterable[Any] = None):
+    """
+    Creates a new function from a code object.
+    """
     # Create a function type.
-    f = types.FunctionType(obb, f_globals)
-    f.__name__ = func_name
+    f = types.FunctionType(obb, f_globals, func_name, None, _make_closure(obb, closure))
     f.__defaults__ = kwarg_defaults
 
-    if use_safety_wrapper:
+    if use_safety_wrapper == "hook":
+        # No wrapper; the process-wide hook explains the error if it ever happens.
+        safety.register(obb)
+        safety.install()
+        returned_func = f
+    elif use_safety_wrapper:
         def __safety_wrapper(*args, **kwargs):
             try:
                 return f(*args, **kwargs)
@@ -209,5 +357,186 @@ def compile(code: list, consts: list, names: list, varnames: list,
     else:
         returned_func = f
 
-    # return the func
     return returned_func
+
+
+def _instrument_name(instrument: Union[bool, str], func_name: str) -> str:
+    """
+    :return: The name to register the counters of a function under, or None.
+    """
+    if isinstance(instrument, str):
+        return instrument
+    return func_name if instrument else None
+
+
+def _resolve_frozen(freeze: Iterable[str], f_globals: dict) -> tuple:
+    """
+    :return: The ``freeze`` argument of :func:`_build_code_object`, or None.
+    """
+    if not freeze:
+        return None
+    return f_globals, frozen.resolve(freeze, f_globals)
+
+
+def compile(code: list, consts: list, names: list, varnames: list,
+            func_name: str = "<unknown, compiled>",
+            arg_count: int = 0, kwarg_defaults: Tuple[Any] = (),
+            use_safety_wrapper: Union[bool, str] = True,
+            cache: Union[bool, CompileCache, DiskCache] = False,
+            profile: Union[str, CompileProfile] = None, optimize: bool = None,
+            source_map: bool = False, instrument: Union[bool, str] = False,
+            freeze: Iterable[str] = None, cellvars: list = (), freevars: list = (),
+            closure: Iterable[Any] = None):
+    """
+    Compiles a set of bytecode instructions into a working function, using Python's bytecode
+    compiler.
+
+    :param code: A list of bytecode instructions, or an :class:`.InstructionStream`.
+    :param consts: A list of constants to compile into the function.
+    :param names: A list of names to compile into the function.
+    :param varnames: A list of ``varnames`` to compile into the function.
+    :param func_name: The name of the function to use.
+    :param arg_count: The number of arguments this function takes. Must be ``<= len(varnames)``.
+    :param kwarg_defaults: A tuple of defaults for kwargs.
+    :param use_safety_wrapper: Use the safety wrapper? This hijacks SystemError to print better \
+        stack traces, at the cost of an extra frame on every call. If this is ``"hook"``, the \
+        function is returned unwrapped and a process-wide hook (:mod:`pyte.safety`) prints the \
+        same information for uncaught errors, which costs nothing on the success path.
+    :param cache: The :class:`.CompileCache` or :class:`.DiskCache` to look up and store the code \
+        object in. If this is \
+        True, :data:`pyte.cache.default_cache` is used. The cached code object keeps the filename \
+        and line number of the compile that created it.
+    :param profile: The compile profile to use; one of ``"debug"``, ``"checked"`` or \
+        ``"release"``. Defaults to the profile set with :func:`set_default_profile`, which is \
+        ``"debug"`` unless changed.
+    :param optimize: Run the peephole optimizer (:func:`pyte.optimizer.optimize`) over the \
+        bytecode? Defaults to what the profile says; every built-in profile optimizes.
+    :param source_map: Give the function a line table, with one line per emitted Pyte object, \
+        and a :class:`.SourceMap` (see :func:`pyte.sourcemap.get`)? The filename of the function \
+        becomes ``<pyte:func_name>``. Functions with source maps are not cached.
+    :param instrument: Count the calls to the function, and the time spent in it, in the \
+        bytecode of the function itself? The counters are registered in :mod:`pyte.metrics` \
+        under ``func_name``, or under this, if it is a string. Functions with the same name \
+        share counters. Instrumented functions are not cached. When this is False, nothing \
+        about the compiled function changes.
+    :param freeze: Names to load as constants instead of globals. Their values are looked up \
+        now, in the caller's globals and then the builtins, and the function does not see them \
+        being rebound until :func:`pyte.frozen.refresh` is called on it. Functions with frozen \
+        names are not cached.
+    :param cellvars: A list of cellvars (see :func:`pyte.create_cellvars`); variables that are \
+        kept in cells, so that nested functions can capture them with LOAD_CLOSURE. A cellvar \
+        with the same name as an argument starts out with the argument.
+    :param freevars: A list of freevars (see :func:`pyte.create_freevars`); the variables the \
+        function captures from its closure.
+    :param closure: The closure of the function; one item for each freevar. Items can be cells, \
+        or values, which are put into new cells. Functions that only differ in their closure \
+        share a cached code object; see also :func:`with_closure`.
+    """
+    varnames = tuple(varnames)
+    consts = tuple(consts)
+    names = tuple(names)
+    cellvars = tuple(cellvars)
+    freevars = tuple(freevars)
+
+    # Flatten the code list. Streams are already flat.
+    if not isinstance(code, InstructionStream):
+        code = util.flatten(code)
+
+    _check_arguments(varnames, arg_count, kwarg_defaults)
+
+    profile = get_profile(profile)
+    if optimize is None:
+        optimize = profile.optimize
+    frame = sys._getframe(1)
+
+    if cache is True:
+        cache = default_cache
+    elif cache is False or source_map or instrument or freeze:
+        cache = None
+
+    key = None
+    obb = None
+    if cache is not None:
+        if not isinstance(code, InstructionStream):
+            code = list(code)
+        try:
+            key = make_key(code, consts, names, varnames, func_name, arg_count, optimize,
+                           cellvars, freevars, profile.name, source_map,
+                           _instrument_name(instrument, func_name), freeze)
+        except TypeError:
+            # Something unhashable, so this can't be cached.
+            key = None
+        else:
+            obb = cache.get(key)
+
+    if obb is None:
+        obb = _compile_code_object(code, consts, names, varnames, func_name, arg_count,
+                                   frame.f_code.co_filename, frame.f_lineno, profile, optimize,
+                                   source_map, _instrument_name(instrument, func_name),
+                                   _resolve_frozen(freeze, frame.f_globals), cellvars, freevars)
+        if key is not None:
+            cache.put(key, obb)
+
+    # Bind it to the caller's globals, and return the func
+    return _bind_function(obb, frame.f_globals, func_name, kwarg_defaults, use_safety_wrapper,
+                          closure)
+
+
+def compile_stream(code, consts: list, names: list, varnames: list,
+                   func_name: str = "<unknown, compiled>",
+                   arg_count: int = 0, kwarg_defaults: Tuple[Any] = (),
+                   use_safety_wrapper: Union[bool, str] = True,
+                   profile: Union[str, CompileProfile] = None, optimize: bool = None,
+                   source_map: bool = False, instrument: Union[bool, str] = False,
+                   freeze: Iterable[str] = None, cellvars: list = (), freevars: list = (),
+                   closure: Iterable[Any] = None):
+    """
+    Compiles instructions from an iterable, such as a generator, without keeping them around.
+
+    Each instruction is written into the emitter as soon as it is produced, so only the
+    bytecode is held in memory. The pools are read after the last instruction, so a generator
+    can keep adding to a :class:`.Pool` while it runs.
+
+    Streams can't be cached, as the instructions are gone by the time the key would be made.
+    Otherwise, the arguments are the same as :func:`compile`. A source map keeps every
+    instruction alive, for as long as the function is.
+    """
+    profile = get_profile(profile)
+    if optimize is None:
+        optimize = profile.optimize
+    frame = sys._getframe(1)
+
+    cellvars = tuple(cellvars)
+    bc, positions, emitter = _assemble(util.flatten(code), track_positions=source_map,
+                                       cell_count=len(cellvars))
+    # The pools may have grown while the stream ran, so added consts are numbered now.
+    consts = tuple(consts)
+    bc, positions = _number_added_consts(bc, positions, emitter, len(consts))
+    consts += tuple(emitter.added_consts)
+
+    varnames = tuple(varnames)
+    _check_arguments(varnames, arg_count, kwarg_defaults)
+    obb = _build_code_object(bc, consts, tuple(names), varnames, func_name, arg_count,
+                             frame.f_code.co_filename, frame.f_lineno, profile, optimize,
+                             positions, _instrument_name(instrument, func_name),
+                             _resolve_frozen(freeze, frame.f_globals), cellvars,
+                             tuple(freevars))
+    return _bind_function(obb, frame.f_globals, func_name, kwarg_defaults, use_safety_wrapper,
+                          closure)
+
+
+def with_closure(func, closure: Iterable[Any]):
+    """
+    Creates a copy of a compiled function with a different closure.
+
+    The copy shares the code object of the function, so this is much cheaper than compiling it
+    again. The copy gets the same kind of safety wrapper as the function.
+
+    :param func: A function returned by :func:`compile`.
+    :param closure: The new closure; see :func:`compile`.
+    :return: The new function.
+    """
+    wrapped = getattr(func, "wrapped", None)
+    f = wrapped if wrapped is not None else func
+    return _bind_function(f.__code__, f.__globals__, f.__name__, f.__defaults__,
+                          wrapped is not None, closure)
@@ -0,0 +1,548 @@
+"""
+The bytecode emitter, used to assemble Pyte objects.
+"""
+import array
+import bisect
+
+from pyte import util
+from pyte.exc import CompileError
+from pyte.opcodes import HASJREL as _HASJREL, HAVE_ARGUMENT, OPMAP
+from pyte.util import NO_ARG_ENCODINGS, SMALL_ARG_ENCODINGS, SMALL_ARG_LIMIT
+
+_LOAD_CONST = OPMAP["LOAD_CONST"]
+
+# Instructions that never fall through to the next instruction.
+_NO_FALLTHROUGH = frozenset(
+    OPMAP[name] for name in ("RETURN_VALUE", "RAISE_VARARGS", "BREAK_LOOP", "JUMP_ABSOLUTE",
+                             "JUMP_FORWARD", "CONTINUE_LOOP")
+    if name in OPMAP
+)
+
+
+class Label(object):
+    """
+    A symbolic jump target.
+
+    Jumps to a label can be emitted before the label is marked; the jumps are patched with the
+    real offset when the emitter is assembled.
+    """
+
+    def __init__(self, name: str = None):
+        self.name = name
+        #: The offset this label was marked at, or None if it has not been marked yet.
+        self.offset = None
+
+    def __repr__(self):
+        return "<Label {} at {}>".format(self.name or hex(id(self)), self.offset)
+
+
+class Emitter(object):
+    """
+    A growable bytecode buffer.
+
+    Operators write their bytecode directly into an emitter, instead of being handed a copy of all
+    the bytecode that came before them. This keeps assembly linear in the size of the function.
+    """
+
+    def __init__(self, track_positions: bool = False, cell_count: int = 0,
+                 const_count: int = None):
+        """
+        :param track_positions: Record where each object passed to :meth:`emit_obb` starts? \
+            See :attr:`positions`.
+        :param cell_count: The number of cellvars of the function. See :meth:`emit_deref`.
+        :param const_count: The number of consts of the function, or None if it is not known \
+            yet. See :meth:`load_const`.
+        """
+        #: The number of cellvars of the function; free variables are numbered after them.
+        self.cell_count = cell_count
+
+        #: The number of consts of the function. Constants added with :meth:`load_const` are
+        #: numbered after them.
+        self.const_count = const_count
+        #: The constants added with :meth:`load_const`, in order. These go after the consts of
+        #: the function.
+        self.added_consts = []
+        self._added_indexes = {}
+        #: If :attr:`const_count` is None, a list of (:class:`Label`, index into
+        #: :attr:`added_consts`) for every LOAD_CONST of an added constant. These are emitted
+        #: with the bare index, and have to be renumbered once the consts are known.
+        self.added_loads = []
+        self._buf = bytearray()
+        # The opcode of the last instruction, or None if it is not known (e.g. raw bytes).
+        self._last_opcode = None
+        # (offset, opcode, label) of every jump that still needs patching.
+        self._fixups = []
+        # Every label marked in this emitter, so they can be moved when jumps grow.
+        self._marked = []
+
+        #: The labels at the start of every loop being emitted, innermost last. These are what
+        #: :class:`pyte.ops.CONTINUE` jumps to.
+        self.loops = []
+
+        #: A list of (:class:`Label`, object, line) for every object emitted with
+        #: :meth:`emit_obb`, in order, or None if positions are not tracked. Objects are numbered
+        #: from 1 in the order they are emitted. When an object emits instructions after one of
+        #: its children, such as the jump back at the end of a loop, it gets another entry with
+        #: the same line. The labels hold the final offsets once the emitter is assembled.
+        self.positions = [] if track_positions else None
+        # The (object, line) of every object being emitted, innermost last.
+        self._parents = []
+        self._line_count = 0
+
+    def __len__(self):
+        return len(self._buf)
+
+    @property
+    def offset(self) -> int:
+        """
+        :return: The offset the next instruction will be written at.
+        """
+        return len(self._buf)
+
+    def write(self, data: bytes):
+        """
+        Writes raw bytes into the buffer.
+
+        :param data: The bytes to write.
+        """
+        self._buf += data
+        self._last_opcode = None
+
+    def emit(self, opcode: int, arg: int = None):
+        """
+        Emits a single instruction.
+
+        :param opcode: The opcode to emit.
+        :param arg: The argument to the opcode, if it takes one.
+        """
+        self._last_opcode = opcode
+        if arg is None:
+            self._buf += NO_ARG_ENCODINGS[opcode]
+            return
+        table = SMALL_ARG_ENCODINGS[opcode]
+        if table is not None and 0 <= arg < SMALL_ARG_LIMIT:
+            self._buf += table[arg]
+        else:
+            self._buf += util.encode_instruction(opcode, arg)
+
+    def emit_deref(self, opcode: int, index: int, free: bool = False):
+        """
+        Emits an instruction that uses a cell, such as LOAD_DEREF.
+
+        Cells are numbered with the cellvars first, then the free variables, so the argument of a
+        free variable depends on how many cellvars the function has.
+
+        :param opcode: The opcode to emit.
+        :param index: The index of the cellvar, or of the free variable.
+        :param free: Is this a free variable?
+        """
+        self.emit(opcode, index + self.cell_count if free else index)
+
+    def load_const(self, value):
+        """
+        Emits a LOAD_CONST of a constant that is not in the consts of the function, such as the
+        keyword names of a call. The constant is added to :attr:`added_consts`.
+
+        :param value: The constant. It has to be hashable.
+        """
+        key = (type(value), value)
+        index = self._added_indexes.get(key)
+        if index is None:
+            index = self._added_indexes[key] = len(self.added_consts)
+            self.added_consts.append(value)
+
+        if self.const_count is None:
+            label = Label("added_const")
+            self.mark(label)
+            self.added_loads.append((label, index))
+            self.emit(_LOAD_CONST, index)
+        else:
+            self.emit(_LOAD_CONST, self.const_count + index)
+
+    def mark(self, label: Label):
+        """
+        Marks a label at the current offset.
+
+        :param label: The :class:`Label` to mark.
+        """
+        self._mark(label)
+        # The label can be jumped to, so the code after it is reachable.
+        self._last_opcode = None
+
+    def _mark(self, label: Label):
+        if label.offset is not None:
+            raise CompileError("Label {} was marked twice".format(label))
+        label.offset = len(self._buf)
+        self._marked.append(label)
+
+    def emit_jump(self, opcode: int, label: Label):
+        """
+        Emits a jump to a label. The argument is filled in by :meth:`assemble`.
+
+        :param opcode: The jump opcode. Relative and absolute jumps are both supported.
+        :param label: The :class:`Label` to jump to.
+        """
+        self._fixups.append((len(self._buf), opcode, label))
+        self.emit(opcode, 0)
+
+    def _resolve(self):
+        """
+        Patches every pending jump with the offset of its label.
+
+        Jumps are emitted as a single instruction. A jump whose argument does not fit gets
+        EXTENDED_ARG prefixes, which moves everything after it, so the widths are relaxed until
+        every jump fits. Widths only ever grow, so this always finishes.
+        """
+        fixups = self._fixups
+        if not fixups:
+            return
+
+        for offset, opcode, label in fixups:
+            if label.offset is None:
+                raise CompileError("Jump at {} to a label that was never marked: {}"
+                                   .format(offset, label))
+
+        size = util.INSTRUCTION_SIZE
+        offsets = [offset for offset, _, _ in fixups]
+        # The width of each jump, in instructions.
+        units = [1] * len(fixups)
+
+        while True:
+            # The bytes added before each jump, and in total, by the jumps that grew.
+            shifts = []
+            shift = 0
+            for width in units:
+                shifts.append(shift)
+                shift += (width - 1) * size
+            shifts.append(shift)
+
+            args = []
+            changed = False
+            for i, (offset, opcode, label) in enumerate(fixups):
+                # Jumps that start before the label push it back.
+                target = label.offset + shifts[bisect.bisect_left(offsets, label.offset)]
+                if opcode in _HASJREL:
+                    arg = target - (offset + shifts[i] + units[i] * size)
+                    if arg < 0:
+                        raise CompileError("Relative jump at {} can not jump backwards to {}"
+                                           .format(offset, label))
+                else:
+                    arg = target
+                args.append(arg)
+
+                needed = util.arg_units(arg)
+                if needed > units[i]:
+                    units[i] = needed
+                    changed = True
+
+            if not changed:
+                break
+
+        # Rebuild the buffer with the final jumps.
+        buf = bytearray()
+        previous = 0
+        for (offset, opcode, label), arg, width in zip(fixups, args, units):
+            buf += self._buf[previous:offset]
+            buf += util.encode_instruction(opcode, arg, width)
+            previous = offset + size
+        buf += self._buf[previous:]
+
+        # Move the labels to where they ended up.
+        for label in self._marked:
+            label.offset += shifts[bisect.bisect_left(offsets, label.offset)]
+
+        self._buf = buf
+        self._fixups = []
+
+    def emit_obb(self, obb):
+        """
+        Emits any bytecode-encodable object.
+
+        Pyte objects write themselves into the emitter; ints are emitted as a single byte and
+        bytes are copied verbatim.
+
+        :param obb: The object to emit.
+        """
+        tracked = self.positions is not None
+        if tracked:
+            self._enter(obb)
+
+        emit = getattr(obb, "emit", None)
+        if isinstance(obb, InstructionStream):
+            obb.replay(self)
+        elif emit is not None:
+            emit(self)
+        elif isinstance(obb, int):
+            self._buf.append(obb)
+            self._last_opcode = obb
+        elif isinstance(obb, (bytes, bytearray)):
+            self.write(obb)
+        else:
+            raise CompileError("Could not compile code of type {}".format(type(obb)))
+
+        if tracked:
+            self._leave()
+
+    def _enter(self, obb):
+        """
+        Records the position of an object that is about to be emitted.
+        """
+        self._line_count += 1
+        # Position labels are never jumped to, so they don't change :meth:`falls_through`.
+        position = Label()
+        self._mark(position)
+        self.positions.append((position, obb, self._line_count))
+        self._parents.append((obb, self._line_count))
+
+    def _leave(self):
+        """
+        Finishes an object started with :meth:`_enter`.
+        """
+        parents = self._parents
+        parents.pop()
+        if parents:
+            # Anything the parent emits after this child belongs to the parent again.
+            position = Label()
+            self._mark(position)
+            self.positions.append((position,) + parents[-1])
+
+    def falls_through(self) -> bool:
+        """
+        :return: Can execution run past the last instruction emitted so far? This is True if \
+            the last instruction is not known, such as after raw bytes.
+        """
+        return self._last_opcode not in _NO_FALLTHROUGH
+
+    def getvalue(self) -> bytes:
+        """
+        :return: The bytecode emitted so far. Jumps to labels are not patched yet.
+        """
+        return bytes(self._buf)
+
+    def assemble(self) -> bytes:
+        """
+        Resolves all jumps, and returns the finished bytecode.
+
+        :return: The assembled bytecode.
+        """
+        self._resolve()
+        return bytes(self._buf)
+
+
+# Pseudo-opcode for a chunk of raw bytes in an InstructionStream. Real opcodes fit in a byte.
+_RAW = 0x100
+# Marks an argument too wide for the stream; the real argument is in the side table.
+_WIDE = 0xFFFF
+
+
+class InstructionStream(object):
+    """
+    A compact, flat recording of instructions.
+
+    A stream has the same recording methods as an :class:`Emitter`, so operators can be emitted
+    into it, but it stores each instruction as an opcode/argument pair in an ``array('H')``
+    instead of keeping the operator objects around. Jumps, labels, arguments wider than 16 bits
+    and raw bytes are kept in side tables.
+
+    A stream can be passed to :func:`pyte.compile` in place of a list of instructions, or placed
+    inside one. It is replayed into an emitter every time it is compiled, so one stream can be
+    compiled many times.
+    """
+    __slots__ = ("_code", "_wide", "_jumps", "_marks", "_labels", "_raw", "_free", "_added",
+                 "loops")
+
+    def __init__(self, code=None):
+        """
+        :param code: An optional list of instructions to record.
+        """
+        # Opcode, argument pairs.
+        self._code = array.array("H")
+        # Instruction index -> argument, for arguments that don't fit.
+        self._wide = {}
+        # Instruction index -> label number, for jumps.
+        self._jumps = {}
+        # Instruction index -> label numbers marked just before that instruction.
+        self._marks = {}
+        # Label -> label number.
+        self._labels = {}
+        # Chunks of raw bytes, indexed by the argument of a _RAW instruction.
+        self._raw = []
+        # Indexes of instructions that use a free variable, which is renumbered on replay.
+        self._free = set()
+        # Instruction index -> value, for constants added with load_const.
+        self._added = {}
+        # See Emitter.loops.
+        self.loops = []
+
+        if code is not None:
+            self.extend(code)
+
+    def __len__(self):
+        return len(self._code) // 2
+
+    def _label_number(self, label: Label) -> int:
+        try:
+            return self._labels[label]
+        except KeyError:
+            number = self._labels[label] = len(self._labels)
+            return number
+
+    def emit(self, opcode: int, arg: int = None):
+        """
+        Records a single instruction. See :meth:`Emitter.emit`.
+        """
+        if arg is None:
+            arg = 0
+        elif arg >= _WIDE:
+            self._wide[len(self)] = arg
+            arg = _WIDE
+        self._code.append(opcode)
+        self._code.append(arg)
+
+    def emit_deref(self, opcode: int, index: int, free: bool = False):
+        """
+        Records an instruction that uses a cell. See :meth:`Emitter.emit_deref`.
+
+        Free variables are numbered when the stream is replayed, so one stream can be used with
+        any number of cellvars.
+        """
+        if free:
+            self._free.add(len(self))
+        self.emit(opcode, index)
+
+    def load_const(self, value):
+        """
+        Records a LOAD_CONST of an added constant. See :meth:`Emitter.load_const`.
+
+        The constant is added to the emitter the stream is replayed into.
+        """
+        self._added[len(self)] = value
+        self._code.append(_LOAD_CONST)
+        self._code.append(0)
+
+    def emit_jump(self, opcode: int, label: Label):
+        """
+        Records a jump to a label. See :meth:`Emitter.emit_jump`.
+        """
+        self._jumps[len(self)] = self._label_number(label)
+        self._code.append(opcode)
+        self._code.append(0)
+
+    def mark(self, label: Label):
+        """
+        Marks a label before the next instruction. See :meth:`Emitter.mark`.
+        """
+        self._marks.setdefault(len(self), []).append(self._label_number(label))
+
+    def write(self, data: bytes):
+        """
+        Records raw bytes, which are copied verbatim when the stream is replayed.
+        """
+        self._code.append(_RAW)
+        self._code.append(len(self._raw))
+        self._raw.append(bytes(data))
+
+    def falls_through(self) -> bool:
+        """
+        See :meth:`Emitter.falls_through`.
+        """
+        # A label marked after the last instruction can be jumped to.
+        if not self._code or len(self) in self._marks:
+            return True
+        opcode, arg = self._code[-2], self._code[-1]
+        if opcode == _RAW:
+            # A single raw byte is an opcode emitted as an int.
+            raw = self._raw[arg]
+            if len(raw) != 1:
+                return True
+            opcode = raw[0]
+        return opcode not in _NO_FALLTHROUGH
+
+    def emit_obb(self, obb):
+        """
+        Records any bytecode-encodable object. See :meth:`Emitter.emit_obb`.
+        """
+        if isinstance(obb, InstructionStream):
+            obb.replay(self)
+            return
+        emit = getattr(obb, "emit", None)
+        if emit is not None:
+            emit(self)
+        elif isinstance(obb, int):
+            self.write(bytes((obb,)))
+        elif isinstance(obb, (bytes, bytearray)):
+            self.write(obb)
+        else:
+            raise CompileError("Could not compile code of type {}".format(type(obb)))
+
+    def append(self, obb):
+        """
+        Records an instruction. This is the same as :meth:`emit_obb`.
+        """
+        self.emit_obb(obb)
+
+    def extend(self, code):
+        """
+        Records every instruction in a (possibly nested) list of instructions.
+        """
+        for obb in util.flatten(code):
+            self.emit_obb(obb)
+
+    def replay(self, emitter):
+        """
+        Replays the recorded instructions into an emitter, or another stream.
+
+        Every replay uses fresh labels, so a stream can be replayed any number of times.
+        """
+        labels = [Label() for _ in range(len(self._labels))]
+        code = self._code
+        wide = self._wide
+        jumps = self._jumps
+        marks = self._marks
+        free = self._free
+        added = self._added
+
+        for index in range(len(self)):
+            if index in marks:
+                for number in marks[index]:
+                    emitter.mark(labels[number])
+
+            opcode = code[2 * index]
+            arg = code[2 * index + 1]
+            if opcode == _RAW:
+                emitter.write(self._raw[arg])
+            elif index in jumps:
+                emitter.emit_jump(opcode, labels[jumps[index]])
+            elif index in added:
+                emitter.load_const(added[index])
+            elif opcode < HAVE_ARGUMENT:
+                emitter.emit(opcode)
+            else:
+                if arg == _WIDE:
+                    arg = wide[index]
+                if index in free:
+                    emitter.emit_deref(opcode, arg, free=True)
+                else:
+                    emitter.emit(opcode, arg)
+
+        # Labels marked after the last instruction.
+        for number in marks.get(len(self), ()):
+            emitter.mark(labels[number])
+
+    def getvalue(self) -> bytes:
+        """
+        :return: The bytecode recorded so far. Jumps to labels are not patched yet.
+        """
+        emitter = Emitter()
+        self.replay(emitter)
+        return emitter.getvalue()
+
+    def assemble(self, cell_count: int = 0, const_count: int = None) -> bytes:
+        """
+        :param cell_count: The number of cellvars of the function.
+        :param const_count: The number of consts of the function. See :meth:`Emitter.load_const`.
+        :return: The assembled bytecode of the stream.
+        """
+        emitter = Emitter(cell_count=cell_count, const_count=const_count)
+        self.replay(emitter)
+        return emitter.assemble()
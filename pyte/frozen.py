@@ -0,0 +1,206 @@
+"""
+Frozen globals: names that are loaded as constants.
+
+A function compiled with ``freeze=["helper"]`` looks ``helper`` up once, at compile time, in the
+globals it is bound to (and then in the builtins), and loads it with LOAD_CONST instead of
+LOAD_GLOBAL. This skips two dict lookups every time the name is loaded, but the function no longer
+sees the name being rebound.
+
+The guard API puts that back, on demand: :func:`stale` tells if any frozen name has been rebound
+since, and :func:`refresh` swaps the new values into the function, without recompiling it.
+"""
+import builtins
+import types
+import weakref
+
+from pyte import safety, sourcemap, tokens
+from pyte.analysis import decode, rewrite
+from pyte.exc import CompileError
+
+_MISSING = object()
+
+# Opcodes that change a global. A function can't freeze a name it changes itself.
+_GLOBAL_STORES = frozenset((tokens.STORE_GLOBAL, tokens.DELETE_GLOBAL))
+
+# id(code object) -> (a weak reference to the code object, FrozenNames). Code objects hash their
+# consts, and frozen values don't have to be hashable, so they can't be keys themselves.
+_frozen = {}
+
+
+def _lookup(name: str, f_globals: dict):
+    """
+    Looks up a name the same way LOAD_GLOBAL does, returning a placeholder if it is not bound.
+    """
+    value = f_globals.get(name, _MISSING)
+    if value is not _MISSING:
+        return value
+    f_builtins = f_globals.get("__builtins__", builtins)
+    if isinstance(f_builtins, dict):
+        return f_builtins.get(name, _MISSING)
+    return getattr(f_builtins, name, _MISSING)
+
+
+class FrozenNames(object):
+    """
+    The names frozen into a code object, and where they came from.
+    """
+    __slots__ = ("globals", "indexes")
+
+    def __init__(self, f_globals: dict, indexes: dict):
+        #: The globals the names were looked up in.
+        self.globals = f_globals
+        #: Maps each frozen name to the index of its value in ``co_consts``.
+        self.indexes = indexes
+
+    def current(self, name: str):
+        """
+        :return: The value the name has now, or a placeholder if it is not bound.
+        """
+        return _lookup(name, self.globals)
+
+
+def resolve(names, f_globals: dict) -> dict:
+    """
+    Looks up names the same way LOAD_GLOBAL would.
+
+    :param names: The names to look up.
+    :param f_globals: The globals of the function.
+    :return: A dict of name -> value.
+    :raises CompileError: If a name is not bound.
+    """
+    values = {}
+    for name in names:
+        value = _lookup(name, f_globals)
+        if value is _MISSING:
+            raise CompileError("Can not freeze `{}`, as it is not a global or a builtin"
+                               .format(name))
+        values[name] = value
+    return values
+
+
+def freeze(bc: bytes, consts: tuple, names: tuple, values: dict) -> tuple:
+    """
+    Turns the LOAD_GLOBALs of frozen names into LOAD_CONSTs.
+
+    :param bc: The assembled bytecode.
+    :param consts: The consts of the function. The frozen values are added to the end.
+    :param names: The names of the function.
+    :param values: A dict of name -> value, from :func:`resolve`.
+    :return: A tuple of (the bytecode, the consts, a dict of name -> const index, a dict mapping \
+        the offset of every original instruction to its new offset).
+    """
+    indexes = {}
+    for name, value in values.items():
+        indexes[name] = len(consts)
+        consts = consts + (value,)
+
+    for instruction in decode(bc):
+        if instruction.opcode in _GLOBAL_STORES and names[instruction.arg] in indexes:
+            raise CompileError("Can not freeze `{}`, as the function changes it"
+                               .format(names[instruction.arg]))
+
+    def replace(instruction, emitter) -> bool:
+        if instruction.opcode != tokens.LOAD_GLOBAL:
+            return False
+        index = indexes.get(names[instruction.arg])
+        if index is None:
+            return False
+        emitter.emit(tokens.LOAD_CONST, index)
+        return True
+
+    bc, offsets = rewrite(bc, replace)
+    return bc, consts, indexes, offsets
+
+
+def register(obb: types.CodeType, f_globals: dict, indexes: dict):
+    """
+    Records the names frozen into a code object, for :func:`stale` and :func:`refresh`.
+    """
+    if indexes:
+        _register(obb, FrozenNames(f_globals, indexes))
+
+
+def _register(obb: types.CodeType, frozen: FrozenNames):
+    key = id(obb)
+    _frozen[key] = (weakref.ref(obb, lambda _: _frozen.pop(key, None)), frozen)
+
+
+def _get(obb: types.CodeType) -> FrozenNames:
+    entry = _frozen.get(id(obb))
+    if entry is None or entry[0]() is not obb:
+        return None
+    return entry[1]
+
+
+def _same(value, frozen_value) -> bool:
+    # Strings are interned when the code object is made, so they might not be the same object.
+    return value is frozen_value or (type(value) is str and value == frozen_value)
+
+
+def _function_of(func) -> types.FunctionType:
+    # Look through the safety wrapper.
+    return getattr(func, "wrapped", func)
+
+
+def values(func) -> dict:
+    """
+    :param func: A compiled function.
+    :return: A dict of every name frozen into the function -> its frozen value.
+    """
+    obb = _function_of(func).__code__
+    frozen = _get(obb)
+    if frozen is None:
+        return {}
+    return {name: obb.co_consts[index] for name, index in frozen.indexes.items()}
+
+
+def stale(func) -> list:
+    """
+    Finds the frozen names of a function that have been rebound since it was compiled.
+
+    :param func: A compiled function.
+    :return: A sorted list of names. Names that were deleted are included.
+    """
+    obb = _function_of(func).__code__
+    frozen = _get(obb)
+    if frozen is None:
+        return []
+    return sorted(name for name, index in frozen.indexes.items()
+                  if not _same(frozen.current(name), obb.co_consts[index]))
+
+
+def refresh(func) -> bool:
+    """
+    Freezes the current values of the names frozen into a function, if any have changed.
+
+    The function gets a new code object, with the same bytecode and the new values in its consts,
+    so everything holding the function sees the new values.
+
+    :param func: A compiled function.
+    :return: True if the function changed.
+    :raises CompileError: If a frozen name is no longer bound.
+    """
+    names = stale(func)
+    if not names:
+        return False
+
+    func = _function_of(func)
+    obb = func.__code__
+    frozen = _get(obb)
+    consts = list(obb.co_consts)
+    for name, value in resolve(names, frozen.globals).items():
+        consts[frozen.indexes[name]] = value
+
+    new = types.CodeType(obb.co_argcount, obb.co_kwonlyargcount, obb.co_nlocals,
+                         obb.co_stacksize, obb.co_flags, obb.co_code, tuple(consts), obb.co_names,
+                         obb.co_varnames, obb.co_filename, obb.co_name, obb.co_firstlineno,
+                         obb.co_lnotab, obb.co_freevars, obb.co_cellvars)
+    _register(new, frozen)
+    # Keep the other per-code registrations.
+    source_map = sourcemap.get(obb)
+    if source_map is not None:
+        sourcemap.register(new, source_map)
+    if safety._is_registered(obb):
+        safety.register(new)
+    func.__code__ = new
+    return True
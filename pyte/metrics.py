@@ -0,0 +1,144 @@
+"""
+Call counts and timings for instrumented functions.
+
+Functions compiled with ``instrument=True`` count their calls and time themselves in their own
+bytecode: the start time is read into a hidden local on entry, and the counters are updated just
+before every RETURN_VALUE. The only calls made are to :func:`time.perf_counter`, so there is no
+wrapper frame to skew the numbers.
+
+Counters live in a process-wide registry, keyed by function name, and can be read with
+:func:`snapshot` and cleared with :func:`reset`. Calls that end in an exception are not counted,
+and the counters are updated without a lock, so counts from several threads are approximate.
+"""
+import collections
+import time
+
+from pyte import tokens
+from pyte.analysis import rewrite
+from pyte.emitter import Emitter
+
+#: The name of the local the start time is kept in. It can't clash with a real variable name.
+START_VARNAME = ".pyte_start"
+
+FunctionStats = collections.namedtuple("FunctionStats", "calls total_time")
+FunctionStats.__doc__ = """
+The counters of one instrumented function.
+
+``total_time`` is the cumulative time spent in the function, in seconds.
+"""
+
+
+class _Counters(list):
+    """
+    A ``[calls, total_time]`` list.
+
+    These are compared and hashed by identity, as code objects hash their consts.
+    """
+    __slots__ = ()
+    __eq__ = object.__eq__
+    __ne__ = object.__ne__
+    __hash__ = object.__hash__
+
+
+# Name -> _Counters. Instrumented bytecode holds on to the lists, so they are only
+# ever changed in place.
+_counters = {}
+
+
+def counters(name: str) -> list:
+    """
+    Gets the counter list for a name, creating it if needed.
+
+    :param name: The name the counters are registered under.
+    :return: The ``[calls, total_time]`` list the instrumented bytecode updates.
+    """
+    try:
+        return _counters[name]
+    except KeyError:
+        return _counters.setdefault(name, _Counters((0, 0.0)))
+
+
+def snapshot() -> dict:
+    """
+    Reads every counter in the registry.
+
+    :return: A dict of name -> :class:`FunctionStats`.
+    """
+    return {name: FunctionStats(*values) for name, values in list(_counters.items())}
+
+
+def reset(name: str = None):
+    """
+    Sets counters back to zero. Instrumented functions keep counting into them.
+
+    :param name: The name to reset, or None to reset every counter.
+    """
+    if name is None:
+        values = list(_counters.values())
+    elif name in _counters:
+        values = [_counters[name]]
+    else:
+        values = []
+
+    for value in values:
+        value[:] = [0, 0.0]
+
+
+def _emit_add(emitter: Emitter, counters_index: int, slot_index: int, load_value):
+    """
+    Emits ``counters[slot] += value``, leaving the stack as it was.
+    """
+    emitter.emit(tokens.LOAD_CONST, counters_index)
+    emitter.emit(tokens.LOAD_CONST, slot_index)
+    emitter.emit(tokens.DUP_TOP_TWO)
+    emitter.emit(tokens.BINARY_SUBSCR)
+    load_value()
+    emitter.emit(tokens.INPLACE_ADD)
+    emitter.emit(tokens.ROT_THREE)
+    emitter.emit(tokens.STORE_SUBSCR)
+
+
+def instrument(bc: bytes, consts: tuple, varnames: tuple, name: str) -> tuple:
+    """
+    Adds the counting prologue and epilogues to assembled bytecode.
+
+    :param bc: The bytecode.
+    :param consts: The consts of the function. The counters and timer are added to the end.
+    :param varnames: The varnames of the function. The start time local is added to the end.
+    :param name: The name to register the counters under.
+    :return: A tuple of (the bytecode, the consts, the varnames, a dict mapping the offset of \
+        every original instruction to its new offset).
+    """
+    # The counter list, its two indexes (1 doubles as the call increment) and the timer.
+    counters_index = len(consts)
+    calls_slot, time_slot, timer = counters_index + 1, counters_index + 2, counters_index + 3
+    consts = consts + (counters(name), 0, 1, time.perf_counter)
+    start = len(varnames)
+    varnames = varnames + (START_VARNAME,)
+
+    def prologue(emitter: Emitter):
+        emitter.emit(tokens.LOAD_CONST, timer)
+        emitter.emit(tokens.CALL_FUNCTION, 0)
+        emitter.emit(tokens.STORE_FAST, start)
+
+    def replace(instruction, emitter: Emitter) -> bool:
+        if instruction.opcode != tokens.RETURN_VALUE:
+            return False
+
+        def load_one():
+            emitter.emit(tokens.LOAD_CONST, time_slot)
+
+        def load_elapsed():
+            emitter.emit(tokens.LOAD_CONST, timer)
+            emitter.emit(tokens.CALL_FUNCTION, 0)
+            emitter.emit(tokens.LOAD_FAST, start)
+            emitter.emit(tokens.BINARY_SUBTRACT)
+
+        # Jumps to a RETURN_VALUE land on its epilogue.
+        _emit_add(emitter, counters_index, calls_slot, load_one)
+        _emit_add(emitter, counters_index, time_slot, load_elapsed)
+        emitter.emit(tokens.RETURN_VALUE)
+        return True
+
+    bc, offsets = rewrite(bc, replace, prologue)
+    return bc, consts, varnames, offsets
@@ -0,0 +1,127 @@
+"""
+Opcode metadata for the running interpreter.
+
+Everything here is built once, from the :mod:`opcode` module, when Pyte is imported. The compiler
+reads these tables instead of calling into :mod:`dis` for every instruction.
+"""
+import collections
+import dis
+import opcode as _opcode
+import sys
+
+WORDCODE = sys.version_info[0:2] >= (3, 6)
+
+HAVE_ARGUMENT = _opcode.HAVE_ARGUMENT
+EXTENDED_ARG = _opcode.EXTENDED_ARG
+
+#: Maps opcode names to numbers.
+OPMAP = dict(_opcode.opmap)
+
+HASJREL = frozenset(_opcode.hasjrel)
+HASJABS = frozenset(_opcode.hasjabs)
+HASCONST = frozenset(_opcode.hasconst)
+HASNAME = frozenset(_opcode.hasname)
+HASLOCAL = frozenset(_opcode.haslocal)
+HASFREE = frozenset(_opcode.hasfree)
+HASCOMPARE = frozenset(_opcode.hascompare)
+
+OpcodeInfo = collections.namedtuple("OpcodeInfo", "name opcode has_arg jump stack_effect width")
+OpcodeInfo.__doc__ = """
+Describes a single opcode.
+
+``jump`` is ``"relative"``, ``"absolute"`` or None. ``stack_effect`` is the effect of the opcode
+when it does not jump, or None if it depends on the argument; see :func:`stack_effect`. ``width``
+is the size of the instruction in bytes, without any EXTENDED_ARG prefixes.
+"""
+
+# Opcodes `dis.stack_effect` does not know about on some versions.
+_KNOWN_EFFECTS = {"NOP": 0, "EXTENDED_ARG": 0}
+
+# Arguments used to find out if the stack effect of an opcode depends on its argument. These
+# cover argument counts in the low bits, flag bits and the keyword count in the high byte on 3.5.
+_PROBE_ARGS = (0, 1, 2, 3, 4, 5, 8, 15, 255, 256, 257, 512)
+
+
+def _constant_effect(name: str, op: int, has_arg: bool):
+    """
+    Gets the stack effect of an opcode, if it is the same for every argument.
+    """
+    if name in _KNOWN_EFFECTS:
+        return _KNOWN_EFFECTS[name]
+    if not hasattr(dis, "stack_effect"):
+        # Python 3.3
+        return None
+    try:
+        if not has_arg:
+            return dis.stack_effect(op)
+        effects = {dis.stack_effect(op, arg) for arg in _PROBE_ARGS}
+    except ValueError:
+        return None
+    if len(effects) == 1:
+        return effects.pop()
+    return None
+
+
+def _build_table() -> tuple:
+    table = [None] * 256
+    for name, op in OPMAP.items():
+        has_arg = op >= HAVE_ARGUMENT
+        if op in HASJREL:
+            jump = "relative"
+        elif op in HASJABS:
+            jump = "absolute"
+        else:
+            jump = None
+
+        if WORDCODE:
+            width = 2
+        else:
+            width = 3 if has_arg else 1
+
+        table[op] = OpcodeInfo(name, op, has_arg, jump, _constant_effect(name, op, has_arg),
+                               width)
+    return tuple(table)
+
+
+#: The :class:`OpcodeInfo` of every opcode, indexed by opcode, or None for unused opcodes.
+OPCODES = _build_table()
+
+# (opcode, arg) -> stack effect, for the opcodes whose effect depends on their argument.
+_effect_cache = {}
+
+
+def opname(op: int) -> str:
+    """
+    :param op: The opcode.
+    :return: The name of the opcode, or ``<op>`` if it is unused.
+    """
+    info = OPCODES[op]
+    return info.name if info is not None else "<{}>".format(op)
+
+
+def stack_effect(op: int, arg: int = None) -> int:
+    """
+    Gets the stack effect of an instruction when it does not jump.
+
+    This is a table lookup for most opcodes. Opcodes whose effect depends on the argument are
+    asked of :mod:`dis` once per argument, and then cached.
+
+    :param op: The opcode.
+    :param arg: The argument, if the opcode takes one.
+    :return: The stack effect.
+    :raises ValueError: If the opcode is unused, or the argument is invalid for it.
+    """
+    info = OPCODES[op]
+    if info is None:
+        raise ValueError("invalid opcode or oparg")
+    if info.stack_effect is not None:
+        return info.stack_effect
+
+    key = (op, arg)
+    try:
+        return _effect_cache[key]
+    except KeyError:
+        pass
+    effect = _effect_cache[key] = dis.stack_effect(op) if arg is None else \
+        dis.stack_effect(op, arg)
+    return effect
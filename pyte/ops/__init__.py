@@ -1,11 +1,12 @@
 """
 Basic operations.
 """
-from .call import CALL_FUNCTION, CALL_SIMPLE
-from .store import STORE_FAST
-from .load import LOAD_FAST, LOAD_CONST, LOAD_ATTR, LOAD_GLOBAL
+from .call import CALL_FUNCTION, CALL_METHOD, CALL_SIMPLE
+from .store import STORE_FAST, STORE_DEREF
+from .load import LOAD_FAST, LOAD_CONST, LOAD_ATTR, LOAD_GLOBAL, LOAD_DEREF, LOAD_CLOSURE
 from .if_ import IF
-from .for_ import FOR_LOOP
+from pyte.superclasses import PyteAnd as AND, PyteOr as OR, PyteNot as NOT
+from .for_ import FOR_LOOP, BREAK, CONTINUE
 
 from .builders import LIST, TUPLE, SET
 
@@ -17,8 +18,9 @@ from pyte.superclasses import _PyteOp, _PyteAugmentedValidator
 
 
 class END_FUNCTION(_PyteOp):
-    def to_bytes(self, previous):
-        bc = b""
+    __slots__ = ()
+
+    def emit(self, emitter):
         # Check the consts
         try:
             none_const = self.args[0]
@@ -34,8 +36,7 @@ class END_FUNCTION(_PyteOp):
         none_const.validate()
 
         if none_const.list_name == "consts":
-            bc += util.generate_load_const(none_const.index)
+            emitter.emit(tokens.LOAD_CONST, none_const.index)
         elif none_const.list_name == "varnames":
-            bc += util.generate_load_fast(none_const.index)
-        bc += tokens.RETURN_VALUE.to_bytes(1, byteorder="little")
-        return bc
+            emitter.emit(tokens.LOAD_FAST, none_const.index)
+        emitter.emit(tokens.RETURN_VALUE)
@@ -2,25 +2,169 @@
 File for CALL_FUNCTION.
 
 This does a bit of optimizing out, and makes it nicer to run than manually LOAD_ing the calls.
+
+The cheapest call opcode for the arguments is picked when the call is emitted: a plain
+CALL_FUNCTION for positional arguments, CALL_FUNCTION_KW with a constant tuple of names for
+keywords, and CALL_FUNCTION_EX (or the CALL_FUNCTION_VAR family on 3.5 and below) only when
+there are star arguments.
 """
-from pyte.exc import ValidationError
+from pyte.exc import CompileError, ValidationError
 from pyte.superclasses import _PyteOp, _PyteAugmentedValidator
 from pyte import util, tokens
 from pyte.util import PY36
 
 
+def _load_arg(emitter, arg):
+    """
+    Emits the load of a call argument.
+    """
+    if not isinstance(arg, _PyteAugmentedValidator):
+        raise ValidationError("CALL_FUNCTION args must be validated")
+    # Validate the arg.
+    arg.validate()
+    # Check the list name.
+    if arg.list_name == "consts":
+        # Generate a LOAD_CONST call.
+        emitter.emit(tokens.LOAD_CONST, arg.index)
+    elif arg.list_name == "varnames":
+        # Generate a LOAD_FAST call.
+        emitter.emit(tokens.LOAD_FAST, arg.index)
+    elif arg.list_name in ("cellvars", "freevars"):
+        # Generate a LOAD_DEREF call.
+        arg.emit(emitter)
+    else:
+        raise ValidationError("Could not determine call to use with list type {}"
+                              .format(arg.list_name))
+
+
+def _normalize_kwargs(kwargs) -> tuple:
+    """
+    Turns a dict or an iterable of (name, value) pairs into a tuple of pairs.
+    """
+    if not kwargs:
+        return ()
+    if isinstance(kwargs, dict):
+        kwargs = kwargs.items()
+    kwargs = tuple((name, value) for name, value in kwargs)
+    names = [name for name, _ in kwargs]
+    for name in names:
+        if not isinstance(name, str):
+            raise ValidationError("Keyword argument names must be strings, not {}"
+                                  .format(type(name).__name__))
+    if len(set(names)) != len(names):
+        raise ValidationError("Keyword argument repeated in call")
+    return kwargs
+
+
+def _emit_call(emitter, args, kwargs: tuple, star_args, star_kwargs):
+    """
+    Emits the loads of the arguments and the call, with the function already on the stack.
+    """
+    args = list(util.flatten(args))
+    if PY36:
+        _emit_call_36(emitter, args, kwargs, star_args, star_kwargs)
+    else:
+        _emit_call_35(emitter, args, kwargs, star_args, star_kwargs)
+
+
+def _emit_call_36(emitter, args: list, kwargs: tuple, star_args, star_kwargs):
+    if star_args is None and star_kwargs is None:
+        for arg in args:
+            _load_arg(emitter, arg)
+        if not kwargs:
+            emitter.emit(tokens.CALL_FUNCTION, len(args))
+            return
+        for _, value in kwargs:
+            _load_arg(emitter, value)
+        # The names go in one constant tuple, after the values.
+        emitter.load_const(tuple(name for name, _ in kwargs))
+        emitter.emit(tokens.CALL_FUNCTION_KW, len(args) + len(kwargs))
+        return
+
+    # Star arguments go through CALL_FUNCTION_EX, which takes a tuple and an optional dict.
+    for arg in args:
+        _load_arg(emitter, arg)
+    if star_args is None:
+        emitter.emit(tokens.BUILD_TUPLE, len(args))
+    else:
+        if args:
+            emitter.emit(tokens.BUILD_TUPLE, len(args))
+        _load_arg(emitter, star_args)
+        # Also turns a lone iterable into a tuple.
+        emitter.emit(tokens.BUILD_TUPLE_UNPACK_WITH_CALL, 2 if args else 1)
+
+    flags = 0
+    if kwargs or star_kwargs is not None:
+        flags = 1
+        maps = 0
+        if kwargs:
+            for _, value in kwargs:
+                _load_arg(emitter, value)
+            emitter.load_const(tuple(name for name, _ in kwargs))
+            emitter.emit(tokens.BUILD_CONST_KEY_MAP, len(kwargs))
+            maps += 1
+        if star_kwargs is not None:
+            _load_arg(emitter, star_kwargs)
+            maps += 1
+        # Merges the maps, and checks for repeated keywords.
+        emitter.emit(tokens.BUILD_MAP_UNPACK_WITH_CALL, maps)
+    emitter.emit(tokens.CALL_FUNCTION_EX, flags)
+
+
+def _emit_call_35(emitter, args: list, kwargs: tuple, star_args, star_kwargs):
+    # The low byte is the positional count, the high byte the keyword count.
+    if len(args) > 255 or len(kwargs) > 255:
+        raise ValidationError("Cannot call a function with more than 255 arguments")
+
+    for arg in args:
+        _load_arg(emitter, arg)
+    # Keywords are pushed as name, value pairs.
+    for name, value in kwargs:
+        emitter.load_const(name)
+        _load_arg(emitter, value)
+
+    if star_args is not None:
+        _load_arg(emitter, star_args)
+    if star_kwargs is not None:
+        _load_arg(emitter, star_kwargs)
+
+    if star_args is not None and star_kwargs is not None:
+        opcode = tokens.CALL_FUNCTION_VAR_KW
+    elif star_args is not None:
+        opcode = tokens.CALL_FUNCTION_VAR
+    elif star_kwargs is not None:
+        opcode = tokens.CALL_FUNCTION_KW
+    else:
+        opcode = tokens.CALL_FUNCTION
+    emitter.emit(opcode, len(args) | (len(kwargs) << 8))
+
+
 class CALL_FUNCTION(_PyteOp):
     """
     CALL_FUNCTION.
 
     This function takes one or more indexes as arguments.
     """
+    __slots__ = ("fun", "_store_list", "_kwargs", "_star_args", "_star_kwargs")
 
-    def __init__(self, function, *args, store_return=None):
+    def __init__(self, function, *args, kwargs=None, star_args=None, star_kwargs=None,
+                 store_return=None):
+        """
+        :param function: The function to call, from names, or None if it is already on the \
+            stack.
+        :param args: The positional arguments.
+        :param kwargs: The keyword arguments, as a dict or (name, value) pairs.
+        :param star_args: An iterable to unpack into positional arguments, after ``args``.
+        :param star_kwargs: A mapping to unpack into keyword arguments, after ``kwargs``.
+        :param store_return: The varname to store the result in, or None to leave it on the stack.
+        """
         # Set the function
         self.fun = function if function else None
-        # TODO: Varargs.
-        self.args = list(util.flatten(args))
+        # Flattened lazily, when the call is emitted.
+        self.args = args
+        self._kwargs = _normalize_kwargs(kwargs)
+        self._star_args = star_args
+        self._star_kwargs = star_kwargs
 
         # Should we store on return?
         if store_return:
@@ -28,15 +172,7 @@ class CALL_FUNCTION(_PyteOp):
         else:
             self._store_list = False
 
-    def to_bytes(self, previous) -> bytes:
-        # Warning: Complex code ahead!
-        # A brief explaination:
-        # 1) We example self.args to check what we should load.
-        # 2) We generate LOAD_CONST or LOAD_FAST opcodes depending on the _name property.
-        # 3) Then we use LOAD_GLOBAL to load a function.
-        # 3) Then, we generate the CALL_FUNCTION opcode, using the right params.
-        arg_count = len(self.args)
-        bc = b""
+    def emit(self, emitter):
         # Add the load_global call to load the function
         if self.fun:
             if not isinstance(self.fun, _PyteAugmentedValidator):
@@ -45,42 +181,53 @@ class CALL_FUNCTION(_PyteOp):
             self.fun.validate()
             f_index = self.fun.index
             # Generate a LOAD_GLOBAL call
-            l_g = util.generate_load_global(f_index)
-            bc += l_g
+            emitter.emit(tokens.LOAD_GLOBAL, f_index)
         # assume it's on the stack already, otherwise
-        # Iterate over.
-        for arg in self.args:
-            try:
-                assert isinstance(arg, _PyteAugmentedValidator)
-            except AssertionError:
-                raise ValidationError("CALL_FUNCTION args must be validated") from None
-            # Validate the arg.
-            arg.validate()
-            # Check the list name.
-            if arg.list_name == "consts":
-                # Generate a LOAD_CONST call.
-                bc += util.generate_load_const(arg.index)
-            elif arg.list_name == "varnames":
-                # Generate a LOAD_FAST call.
-                bc += util.generate_load_fast(arg.index)
-            else:
-                raise ValidationError("Could not determine call to use with list type {}".format(arg.list_name))
-
-        # Generate the CALL_FUNCTION call.
-        bc += tokens.CALL_FUNCTION.to_bytes(1, byteorder="little")
-        # Set the low byte.
-        bc += arg_count.to_bytes(1, byteorder="little")
-        if not PY36:
-            # Set the high byte.
-            # In Python 3.6, this is handled with an EXTENDED_ARGS, I guess.
-            bc += b"\x00"
+
+        _emit_call(emitter, self.args, self._kwargs, self._star_args, self._star_kwargs)
 
         # Check if we should store the response.
-        if not self._store_list:
-            pass
-        else:
-            bc += util.generate_simple_call(tokens.STORE_FAST, self._store_list.index)
-        return bc
+        if self._store_list:
+            emitter.emit(tokens.STORE_FAST, self._store_list.index)
+
+
+class CALL_METHOD(_PyteOp):
+    """
+    Calls a method of an object, e.g ``obj.name(*args)``.
+
+    The method is loaded with LOAD_ATTR and called like a function. None of the supported
+    interpreters have LOAD_METHOD, which would skip creating the bound method.
+    """
+    __slots__ = ("obj", "name", "_store_list", "_kwargs", "_star_args", "_star_kwargs")
+
+    def __init__(self, obj, name, *args, kwargs=None, star_args=None, star_kwargs=None,
+                 store_return=None):
+        """
+        :param obj: The object, from any list.
+        :param name: The name of the method, from names.
+        :param args: The arguments; see :class:`CALL_FUNCTION`.
+        """
+        self.obj = obj
+        self.name = name
+        self.args = args
+        self._kwargs = _normalize_kwargs(kwargs)
+        self._star_args = star_args
+        self._star_kwargs = star_kwargs
+        self._store_list = store_return if store_return else False
+
+    def emit(self, emitter):
+        if not isinstance(self.obj, _PyteAugmentedValidator):
+            raise ValidationError("CALL_METHOD object must be validated")
+        if not isinstance(self.name, _PyteAugmentedValidator) or self.name.list_name != "names":
+            raise ValidationError("Method to call must be inside names")
+        self.obj.validate()
+        self.name.validate()
+        self.obj.emit(emitter)
+        emitter.emit(tokens.LOAD_ATTR, self.name.index)
+        _emit_call(emitter, self.args, self._kwargs, self._star_args, self._star_kwargs)
+
+        if self._store_list:
+            emitter.emit(tokens.STORE_FAST, self._store_list.index)
 
 
 class CALL_SIMPLE(_PyteOp):
@@ -89,21 +236,23 @@ class CALL_SIMPLE(_PyteOp):
 
     It doesn't load anything, rather, it just constructs the correct CALL_FUNCTION call.
     """
+    __slots__ = ("_args", "_kwargs")
 
     def __init__(self, arg_count: int, kwargcount: int=0):
         self._args = arg_count
         self._kwargs = kwargcount
 
-    def to_bytes(self, previous: bytes):
+    def emit(self, emitter):
         # Incredibly simple, compared to CALL_FUNCTION.
-        bc = b""
-        bc += tokens.CALL_FUNCTION.to_bytes(1, byteorder="little")
-
-        # Set the low byte.
-        bc += self._args.to_bytes(1, byteorder="little")
-        # Set the high byte.
-        if not PY36:
+        if PY36:
+            # Keywords need a tuple of names on the stack, which only CALL_FUNCTION can load.
+            if self._kwargs:
+                raise CompileError("CALL_SIMPLE can't pass keyword arguments on 3.6+; "
+                                   "use CALL_FUNCTION with kwargs")
             # no high byte, due to extended_args
-            bc += self._kwargs.to_bytes(1, byteorder="little")
-
-        return bc
+            emitter.emit(tokens.CALL_FUNCTION, self._args)
+        else:
+            # The low byte is the positional count, the high byte the keyword count.
+            if self._args > 255 or self._kwargs > 255:
+                raise ValidationError("Cannot call a function with more than 255 arguments")
+            emitter.emit(tokens.CALL_FUNCTION, self._args | (self._kwargs << 8))
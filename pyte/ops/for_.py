@@ -1,19 +1,24 @@
 from pyte import tokens, util
+from pyte.emitter import Label
+from pyte.exc import CompileError, ValidationError
 from pyte.superclasses import _PyteAugmentedValidator, _PyteOp
-from pyte.util import PY36
 
 
 class FOR_LOOP(_PyteOp):
     """
     Represents a for loop.
     """
+    __slots__ = ("iterator", "_body", "target")
 
-    def __init__(self, iterator: _PyteAugmentedValidator, body: list):
+    def __init__(self, iterator: _PyteAugmentedValidator, body: list,
+                 target: _PyteAugmentedValidator = None):
         """
         Represents a for operator.
 
         :param iterator: A :class:`.PyteAugmentedValidator` that represents the iterable.
         :param body: A list of instructions to execute on each loop.
+        :param target: A varname to store each item in. If this is None, the item is left on the \
+            stack at the start of the body, and the body has to pop it.
 
         Parameters:
 
@@ -21,72 +26,77 @@ class FOR_LOOP(_PyteOp):
                 This should be a saved value that is iterable, i.e a saved list or something.
 
             body: list
-                A list of instructions to execute, similarly to IF.
+                A list of instructions to execute, similarly to IF. :class:`BREAK` and
+                :class:`CONTINUE` can be used anywhere inside it.
         """
 
         self.iterator = iterator
-        self._body = list(util.flatten(body))
-
-    def to_bytes_35(self, previous: bytes):
-        """
-        A to-bytes specific to Python 3.5 and below.
-        """
-
-        # Calculations ahead.
-        bc = b""
-
-        # Calculate the length of the iterator.
-        it_bc = util.generate_bytecode_from_obb(self.iterator, previous)
-        bc += it_bc
-
-        # Push a get_iter on.
-        bc += util.generate_bytecode_from_obb(tokens.GET_ITER, b"")
-        prev_len = len(previous) + len(bc)
-        # Calculate the bytecode for the body.
-        body_bc = b""
-        for op in self._body:
-            # Add padding bytes to the bytecode to allow if blocks to work.
-            padded_bc = previous
-            # Add padding for SETUP_LOOP
-            padded_bc += b"\x00\x00\x00"
-            padded_bc += bc
-            # Add padding for FOR_ITER
-            padded_bc += b"\x00\x00\x00"
-            # Add previous body
-            padded_bc += body_bc
-            body_bc += util.generate_bytecode_from_obb(op, padded_bc)
-
-        # Add a JUMP_ABSOLUTE
-        body_bc += util.generate_simple_call(tokens.JUMP_ABSOLUTE, prev_len + 3)
-
-        # Add a POP_TOP
-        body_bc += util.generate_bytecode_from_obb(tokens.POP_BLOCK, b"")
-
-        # Calculate the right lengths.
-        # Add a FOR_ITER, using len(body_bc)
-        body_bc = util.generate_simple_call(tokens.FOR_ITER, len(body_bc) - 1) + body_bc
-        # Add the SETUP_LOOP call
-        bc = util.generate_simple_call(tokens.SETUP_LOOP, prev_len + len(body_bc) - 6) + bc + body_bc
-
-        return bc
-
-    def to_bytes_36(self, previous: bytes):
-        """
-        A to-bytes specific to Python 3.6 and above.
-        """
-        # Calculations ahead.
-        bc = b""
+        # Flattened lazily, when the loop is emitted.
+        self._body = body
+        self.target = target
+
+    def emit(self, emitter):
+        # The emitter takes care of the instruction encoding, so this is the same for wordcode.
+        if self.target is not None:
+            if not isinstance(self.target, _PyteAugmentedValidator) \
+                    or self.target.list_name != "varnames":
+                raise ValidationError("FOR_LOOP target must be inside varnames")
+            self.target.validate()
+
+        loop_start = Label("for_start")
+        loop_exhausted = Label("for_exhausted")
+        loop_end = Label("for_end")
+
+        # Add the SETUP_LOOP call, which points past the whole loop. BREAK_LOOP jumps there.
+        emitter.emit_jump(tokens.SETUP_LOOP, loop_end)
+
+        # Load the iterator, and push a GET_ITER on.
+        emitter.emit_obb(self.iterator)
+        emitter.emit(tokens.GET_ITER)
+
+        # Add a FOR_ITER, which jumps past the body when the iterator is exhausted.
+        emitter.mark(loop_start)
+        emitter.emit_jump(tokens.FOR_ITER, loop_exhausted)
+        if self.target is not None:
+            emitter.emit(tokens.STORE_FAST, self.target.index)
+
+        # Emit the body, in one pass.
+        emitter.loops.append(loop_start)
+        try:
+            for op in util.flatten(self._body):
+                emitter.emit_obb(op)
+        finally:
+            emitter.loops.pop()
+
+        # Add a JUMP_ABSOLUTE back to the FOR_ITER.
+        emitter.emit_jump(tokens.JUMP_ABSOLUTE, loop_start)
+
+        # Add a POP_BLOCK
+        emitter.mark(loop_exhausted)
+        emitter.emit(tokens.POP_BLOCK)
+        emitter.mark(loop_end)
+
+
+class BREAK(_PyteOp):
+    """
+    Leaves the innermost :class:`FOR_LOOP`.
+    """
+    __slots__ = ()
 
-        # Calculate the length of the iterator.
-        it_bc = util.generate_bytecode_from_obb(self.iterator, previous)
-        bc += it_bc
+    def emit(self, emitter):
+        if not emitter.loops:
+            raise CompileError("BREAK outside of a FOR_LOOP")
+        emitter.emit(tokens.BREAK_LOOP)
 
-        bc += util.ensure_instruction(tokens.GET_ITER)
 
-    def to_bytes(self, previous: bytes):
-        # Python 3.6 has slightly different behaviour
-        if PY36:
-            return self.to_bytes_36(previous)
-        else:
-            return self.to_bytes_35(previous)
+class CONTINUE(_PyteOp):
+    """
+    Skips to the next item of the innermost :class:`FOR_LOOP`.
+    """
+    __slots__ = ()
 
+    def emit(self, emitter):
+        if not emitter.loops:
+            raise CompileError("CONTINUE outside of a FOR_LOOP")
+        # Pyte has no try blocks, so a plain jump is enough; CONTINUE_LOOP is not needed.
+        emitter.emit_jump(tokens.JUMP_ABSOLUTE, emitter.loops[-1])
@@ -3,9 +3,9 @@ IF operands.
 This is horrible code, that detects jumps.
 You have been warned.
 """
-from pyte import compiler, exc, tokens
-from pyte.superclasses import _PyteOp
-from pyte.util import generate_simple_call
+from pyte import exc, tokens, util
+from pyte.emitter import Label
+from pyte.superclasses import _PyteOp, emit_condition_jump
 
 
 class IF(_PyteOp):
@@ -14,16 +14,21 @@ class IF(_PyteOp):
 
     This uses a slightly convoluted syntax to define the IF/ELSE, and set up the appropriate jumps.
     """
+    __slots__ = ("conditions", "body", "else_body")
 
-    def __init__(self, conditions: list, body: list, *args):
+    def __init__(self, conditions: list, body: list, *args, else_body: list = None):
         """
         Create a new IF operator.
 
         :param conditions: A list of conditions to check the IF statement for.
 
+            The first condition is the ``if``, and the rest are ``elif`` s. Only the body of the
+            first true condition is run.
+
             These can be wrapped in a
             :class:`pyte.superclasses.PyteOr`/:class:`pyte.superclasses.PyteAnd` if you wish to
-            have multiple conditions for one block.
+            have multiple conditions for one block, or a :class:`pyte.superclasses.PyteNot` to
+            invert one. These short-circuit, and never build a boolean.
 
             Conditions can be created using the standard truth operators (<, >, >=, <=, ==,
             !=). If there is only one condition to check (i.e a truthy check) that will be
@@ -32,11 +37,14 @@ class IF(_PyteOp):
         :param body: A list of lists, where each list matches an item in the condition list.
 
             Inner lists are standard lists of instructions.
+
+        :param else_body: A list of instructions to run if no condition is true.
         """
         self.conditions = conditions
         self.body = body
+        self.else_body = else_body
 
-    def to_bytes(self, previous: bytes):
+    def emit(self, emitter):
         """
         Complex code ahead. Comments have been added in as needed.
         """
@@ -44,34 +52,31 @@ class IF(_PyteOp):
         if len(self.conditions) != len(self.body):
             raise exc.CompileError("Conditions and body length mismatch!")
 
-        bc = b""
-
-        prev_len = len(previous)
+        # Every branch that is taken jumps here once its body is done.
+        end_of_if = Label("if_end")
+        last = len(self.conditions) - 1
 
         # Loop over the conditions and bodies
-        for condition, body in zip(self.conditions, self.body):
-            # Generate the conditional data.
-            cond_bytecode = condition.to_bytecode(previous)
-            bc += cond_bytecode
-            # Complex calculation. First, generate the bytecode for all tokens in the body. Then
-            # we calculate the len() of that. We create a POP_JUMP_IF_FALSE operation that jumps
-            # to the instructions after the body code + 3 for the pop call. This is done for all
-            # chained IF calls, as if it was an elif call. Else calls are not possible to be
-            # auto-generated, but it is possible to emulate them using an elif call that checks
-            # for the opposite of the above IF.
-
-            # Call the _compile_func method from compiler to compile the body.
-            body_bc = compiler.compile_bytecode(body)
-
-            bdyl = len(body_bc)
-            # Add together the lengths.
-            gen_len = prev_len + len(cond_bytecode) + bdyl + 1
-            # Generate the POP_JUMP_IF_FALSE instruction
-            bc += generate_simple_call(tokens.POP_JUMP_IF_FALSE, gen_len)
-            # Add the body_bc
-            bc += body_bc
-
-            # Update previous_len
-            prev_len = len(previous) + len(bc)
-
-        return bc
+        for index, (condition, body) in enumerate(zip(self.conditions, self.body)):
+            # Generate the conditional data, jumping to the next condition if it is false. AND/OR
+            # conditions short-circuit inside the chain. The emitter fills in the real offsets
+            # once everything has been emitted.
+            next_branch = Label("if_next")
+            emit_condition_jump(emitter, condition, False, next_branch)
+
+            for op in util.flatten(body):
+                emitter.emit_obb(op)
+
+            # Skip the other branches. The last branch falls through, unless there is an else.
+            # Bodies that end in a return, raise or jump never reach the jump, so it is left
+            # out; at the end of a function, it would jump past the last instruction.
+            if (index != last or self.else_body is not None) and emitter.falls_through():
+                emitter.emit_jump(tokens.JUMP_FORWARD, end_of_if)
+
+            emitter.mark(next_branch)
+
+        if self.else_body is not None:
+            for op in util.flatten(self.else_body):
+                emitter.emit_obb(op)
+
+        emitter.mark(end_of_if)
@@ -1,10 +1,20 @@
 """
 Load ops
 """
-from pyte import tokens, util
-from pyte.exc import ValidationError
+from pyte import tokens
+from pyte.exc import CompileError, ValidationError
 from pyte.superclasses import _PyteAugmentedValidator, _PyteOp
-from pyte.util import PY36
+
+
+# Maps opcodes to the loaders for them, used when unpickling.
+_LOADERS = {}
+
+
+def _rebuild_load(opcode: int, validator, override_opcode: int, override_list_restriction: str):
+    """
+    Recreates a LOAD_ operation after unpickling.
+    """
+    return _LOADERS[opcode]._fake_class(validator, override_opcode, override_list_restriction)
 
 
 class _LoadOPSuper(object):
@@ -18,6 +28,7 @@ class _LoadOPSuper(object):
             """
             Inner class, returned by __call__
             """
+            __slots__ = ("validator", "_opcode", "_list_restriction")
 
             def __init__(self, validator: object, __override_opcode: int = None,
                          __override_list_restriction: str = None):
@@ -34,10 +45,7 @@ class _LoadOPSuper(object):
                 else:
                     self._list_restriction = list_restriction
 
-            def to_bytes(self, previous) -> bytes:
-                byte_string = b""
-                # Add the opcode
-                byte_string += self._opcode.to_bytes(1, byteorder="little")
+            def emit(self, emitter):
                 if isinstance(self.validator, _PyteAugmentedValidator):
                     if self.validator.list_name != self._list_restriction:
                         raise ValidationError("LOAD_ call used with wrong list.")
@@ -50,13 +58,14 @@ class _LoadOPSuper(object):
                 else:
                     raise ValidationError("Could not turn `{}` into bytecode."
                                           .format(self.validator))
-                # Convert var into bytestring
-                b_var = var.to_bytes(1, byteorder="little")
-                byte_string += b_var
-                if not PY36:
-                    # Add a \x00 to the edge
-                    byte_string += b"\x00"
-                return byte_string
+                # Add the opcode, with the index as the argument.
+                emitter.emit(self._opcode, var)
+
+            def __reduce__(self):
+                # This class is created in a closure, so it has to be pickled through the
+                # module-level loader that made it.
+                return _rebuild_load, (opcode, self.validator, self._opcode,
+                                       self._list_restriction)
 
             def attr(self, attr: _PyteAugmentedValidator):
                 """
@@ -66,6 +75,7 @@ class _LoadOPSuper(object):
                 return _AttrLoader(self, attr)
 
         outer_self._fake_class = _FakeInnerOP
+        _LOADERS[opcode] = outer_self
 
     def __call__(self, arg):
         # Create a _FakeInnerOP.
@@ -78,6 +88,7 @@ class _AttrLoader(_PyteOp):
 
     Allows chained .attr calls.
     """
+    __slots__ = ("item", "_attrs")
 
     def __init__(self, item: _PyteAugmentedValidator, first_attr):
         # This should be the original item to LOAD_FAST/_NAME/_GLOBAL or whatever.
@@ -86,10 +97,9 @@ class _AttrLoader(_PyteOp):
         # Attrs.
         self._attrs = [first_attr]
 
-    def to_bytes(self, previous: bytes):
-        bc = b""
+    def emit(self, emitter):
         # Add the LOAD_ call.
-        bc += util.generate_bytecode_from_obb(self.item, b"")
+        emitter.emit_obb(self.item)
         # Add the attribute calls.
         for attr in self._attrs:
             try:
@@ -100,9 +110,7 @@ class _AttrLoader(_PyteOp):
 
             # Generate a LOAD_ATTR call
             attr.validate()
-            bc += util.generate_simple_call(tokens.LOAD_ATTR, attr.index)
-
-        return bc
+            emitter.emit(tokens.LOAD_ATTR, attr.index)
 
     def attr(self, item: _PyteAugmentedValidator):
         """
@@ -117,3 +125,44 @@ LOAD_FAST = _LoadOPSuper(tokens.LOAD_FAST, "varnames")
 LOAD_CONST = _LoadOPSuper(tokens.LOAD_CONST, "consts")
 LOAD_ATTR = _LoadOPSuper(tokens.LOAD_ATTR, "names")
 LOAD_GLOBAL = _LoadOPSuper(tokens.LOAD_GLOBAL, "names")
+
+
+class _DerefOP(_PyteOp):
+    """
+    Generic super class for operations on cells.
+
+    These take a validator from a list of cellvars or freevars.
+    """
+    __slots__ = ()
+
+    # The opcode to emit.
+    _opcode = None
+
+    def emit(self, emitter):
+        try:
+            cell = self.args[0]
+        except IndexError:
+            raise CompileError("No cell was passed to {}".format(type(self).__name__)) from None
+
+        if not isinstance(cell, _PyteAugmentedValidator) \
+                or cell.list_name not in ("cellvars", "freevars"):
+            raise ValidationError("{} must be used with cellvars or freevars"
+                                  .format(type(self).__name__))
+        cell.validate()
+        emitter.emit_deref(self._opcode, cell.index, free=cell.list_name == "freevars")
+
+
+class LOAD_DEREF(_DerefOP):
+    """
+    Loads the value inside a cell.
+    """
+    __slots__ = ()
+    _opcode = tokens.LOAD_DEREF
+
+
+class LOAD_CLOSURE(_DerefOP):
+    """
+    Loads a cell itself, to build the closure of a nested function.
+    """
+    __slots__ = ()
+    _opcode = tokens.LOAD_CLOSURE
@@ -1,8 +1,9 @@
 """
 Store operators.
 """
-from pyte import tokens, util
+from pyte import tokens
 from pyte.exc import CompileError, ValidationError
+from pyte.ops.load import _DerefOP
 from pyte.superclasses import _PyteAugmentedValidator, _PyteOp
 
 
@@ -10,8 +11,9 @@ class STORE_FAST(_PyteOp):
     """
     Represents a STORE_FAST operation.
     """
+    __slots__ = ()
 
-    def to_bytes(self, previous):
+    def emit(self, emitter):
         # Check the first arg.
         try:
             arg = self.args[0]
@@ -26,5 +28,12 @@ class STORE_FAST(_PyteOp):
         # Validate the arg.
         arg.validate()
         # Generate a STORE_FAST opcode
-        opp = util.generate_simple_call(tokens.STORE_FAST, arg.index)
-        return opp
\ No newline at end of file
+        emitter.emit(tokens.STORE_FAST, arg.index)
+
+
+class STORE_DEREF(_DerefOP):
+    """
+    Stores the value on top of the stack in a cell.
+    """
+    __slots__ = ()
+    _opcode = tokens.STORE_DEREF
@@ -0,0 +1,254 @@
+"""
+A peephole optimizer for assembled bytecode.
+"""
+from pyte import tokens
+from pyte.analysis import decode, jump_target
+from pyte.emitter import Emitter, Label
+from pyte.opcodes import HAVE_ARGUMENT
+
+_UNCONDITIONAL_JUMPS = frozenset((tokens.JUMP_ABSOLUTE, tokens.JUMP_FORWARD))
+
+# Jumps that can safely be pointed somewhere else. Block setup instructions and FOR_ITER are
+# relative, forward only, and are left alone.
+_THREADABLE_JUMPS = frozenset(
+    getattr(tokens, name) for name in ("JUMP_ABSOLUTE", "JUMP_FORWARD", "POP_JUMP_IF_TRUE",
+                                       "POP_JUMP_IF_FALSE", "JUMP_IF_TRUE_OR_POP",
+                                       "JUMP_IF_FALSE_OR_POP")
+    if hasattr(tokens, name)
+)
+
+_NO_FALLTHROUGH = frozenset(
+    getattr(tokens, name) for name in ("RETURN_VALUE", "RAISE_VARARGS", "BREAK_LOOP",
+                                       "JUMP_ABSOLUTE", "JUMP_FORWARD", "CONTINUE_LOOP")
+    if hasattr(tokens, name)
+)
+
+
+class OptimizationReport(object):
+    """
+    Describes what the optimizer changed.
+    """
+
+    def __init__(self, size_before: int):
+        #: The size of the bytecode before optimizing.
+        self.size_before = size_before
+        #: The size of the bytecode after optimizing.
+        self.size_after = size_before
+        #: STORE_FAST/LOAD_FAST pairs rewritten to DUP_TOP/STORE_FAST.
+        self.store_loads = 0
+        #: Unreachable instructions removed.
+        self.dead_instructions = 0
+        #: Jumps pointed past a chain of unconditional jumps.
+        self.threaded_jumps = 0
+        #: Jumps to the next instruction removed.
+        self.redundant_jumps = 0
+        #: NOPs removed.
+        self.nops = 0
+        #: Maps the offset of every original instruction to its offset in the optimized
+        #: bytecode. Removed instructions map to the next instruction that was kept. None if
+        #: nothing changed.
+        self.offsets = None
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.store_loads or self.dead_instructions or self.threaded_jumps
+                    or self.redundant_jumps or self.nops)
+
+    def __str__(self):
+        return ("{} -> {} bytes: {} store/load pairs, {} dead instructions, {} threaded jumps, "
+                "{} redundant jumps, {} nops".format(self.size_before, self.size_after,
+                                                     self.store_loads, self.dead_instructions,
+                                                     self.threaded_jumps, self.redundant_jumps,
+                                                     self.nops))
+
+    def __repr__(self):
+        return "<OptimizationReport {}>".format(self)
+
+
+class _Op(object):
+    """
+    A mutable instruction, with jumps pointing at other ops rather than offsets.
+    """
+    __slots__ = ("opcode", "arg", "target", "origin")
+
+    def __init__(self, opcode: int, arg: int, target=None, origin: int = None):
+        self.opcode = opcode
+        self.arg = arg
+        self.target = target
+        # The offset of the instruction in the original bytecode.
+        self.origin = origin
+
+
+def _remove(ops: list, removed: set) -> list:
+    """
+    Removes ops, pointing any jumps to a removed op at the next op that survives.
+    """
+    redirect = {}
+    following = None
+    for op in reversed(ops):
+        if id(op) in removed:
+            redirect[id(op)] = following
+        else:
+            following = op
+
+    survivors = [op for op in ops if id(op) not in removed]
+    for op in survivors:
+        if op.target is not None and id(op.target) in redirect:
+            op.target = redirect[id(op.target)]
+    return survivors
+
+
+def _remove_nops(ops: list, report: OptimizationReport) -> list:
+    # A NOP at the very end has nothing to redirect jumps to, so it stays.
+    removed = {id(op) for op in ops[:-1] if op.opcode == tokens.NOP}
+    report.nops += len(removed)
+    return _remove(ops, removed) if removed else ops
+
+
+def _remove_dead_code(ops: list, report: OptimizationReport) -> list:
+    index_of = {id(op): i for i, op in enumerate(ops)}
+    reachable = set()
+    stack = [0]
+    while stack:
+        i = stack.pop()
+        if i >= len(ops) or i in reachable:
+            continue
+        reachable.add(i)
+        op = ops[i]
+        if op.target is not None:
+            stack.append(index_of[id(op.target)])
+        if op.opcode not in _NO_FALLTHROUGH:
+            stack.append(i + 1)
+
+    if len(reachable) == len(ops):
+        return ops
+    report.dead_instructions += len(ops) - len(reachable)
+    # Every jump target of a reachable op is reachable, so nothing needs redirecting.
+    return [op for i, op in enumerate(ops) if i in reachable]
+
+
+def _thread_jumps(ops: list, report: OptimizationReport) -> list:
+    index_of = {id(op): i for i, op in enumerate(ops)}
+    for i, op in enumerate(ops):
+        if op.opcode not in _THREADABLE_JUMPS:
+            continue
+        target = op.target
+        seen = {id(op)}
+        while target.opcode in _UNCONDITIONAL_JUMPS and id(target) not in seen:
+            seen.add(id(target))
+            target = target.target
+        if target is op.target:
+            continue
+
+        # Relative jumps can only go forwards.
+        if op.opcode == tokens.JUMP_FORWARD and index_of[id(target)] <= i:
+            op.opcode = tokens.JUMP_ABSOLUTE
+        op.target = target
+        report.threaded_jumps += 1
+    return ops
+
+
+def _remove_redundant_jumps(ops: list, report: OptimizationReport) -> list:
+    removed = set()
+    for i, op in enumerate(ops[:-1]):
+        if op.opcode in _UNCONDITIONAL_JUMPS and op.target is ops[i + 1]:
+            removed.add(id(op))
+    report.redundant_jumps += len(removed)
+    return _remove(ops, removed) if removed else ops
+
+
+def _rewrite_store_loads(ops: list, report: OptimizationReport) -> list:
+    targets = {id(op.target) for op in ops if op.target is not None}
+    i = 0
+    while i < len(ops) - 1:
+        store, load = ops[i], ops[i + 1]
+        # The LOAD_FAST must not be a jump target, or the value would not be on the stack.
+        if store.opcode == tokens.STORE_FAST and load.opcode == tokens.LOAD_FAST \
+                and store.arg == load.arg and id(load) not in targets:
+            store.opcode, store.arg = tokens.DUP_TOP, None
+            load.opcode = tokens.STORE_FAST
+            report.store_loads += 1
+            i += 2
+        else:
+            i += 1
+    return ops
+
+
+def optimize(bc: bytes) -> tuple:
+    """
+    Optimizes assembled bytecode.
+
+    This:
+
+        - rewrites ``STORE_FAST x; LOAD_FAST x`` into ``DUP_TOP; STORE_FAST x``
+        - removes unreachable code, such as code after a RETURN_VALUE or an unconditional jump
+        - threads jumps to unconditional jumps straight to their final target
+        - removes jumps to the next instruction, and NOPs
+
+    If nothing can be optimized, the bytecode is returned unchanged.
+
+    :param bc: The bytecode to optimize.
+    :return: A tuple of (the optimized bytecode, an :class:`OptimizationReport`).
+    """
+    report = OptimizationReport(len(bc))
+
+    instructions = decode(bc)
+    ops = []
+    by_offset = {}
+    for instruction in instructions:
+        op = _Op(instruction.opcode, instruction.arg, origin=instruction.offset)
+        by_offset[instruction.offset] = op
+        ops.append(op)
+
+    for op, instruction in zip(ops, instructions):
+        target = jump_target(instruction)
+        if target is not None:
+            try:
+                op.target = by_offset[target]
+            except KeyError:
+                # A jump into the middle of an instruction; leave it for the validator.
+                return bc, OptimizationReport(len(bc))
+
+    if not ops:
+        return bc, report
+    original = ops
+
+    # Repeat until nothing changes, as each pass can open up new chances for the others.
+    while True:
+        before = len(ops), report.threaded_jumps
+        ops = _remove_nops(ops, report)
+        ops = _remove_dead_code(ops, report)
+        ops = _thread_jumps(ops, report)
+        ops = _remove_redundant_jumps(ops, report)
+        if (len(ops), report.threaded_jumps) == before:
+            break
+    ops = _rewrite_store_loads(ops, report)
+
+    if not report.changed:
+        return bc, report
+
+    # Re-emit the ops, letting the emitter work out the jump offsets. Every op gets a label, so
+    # its final offset is known afterwards.
+    labels = {id(op): Label() for op in ops}
+    emitter = Emitter()
+    for op in ops:
+        emitter.mark(labels[id(op)])
+        if op.target is not None:
+            emitter.emit_jump(op.opcode, labels[id(op.target)])
+        elif op.opcode >= HAVE_ARGUMENT:
+            emitter.emit(op.opcode, op.arg)
+        else:
+            emitter.emit(op.opcode)
+    optimized = emitter.assemble()
+
+    offsets = {len(bc): len(optimized)}
+    following = len(optimized)
+    for op in reversed(original):
+        label = labels.get(id(op))
+        if label is not None:
+            following = label.offset
+        offsets[op.origin] = following
+    report.offsets = offsets
+
+    report.size_after = len(optimized)
+    return optimized, report
@@ -0,0 +1,93 @@
+"""
+Pools that assign indexes to constants and names as they are used.
+"""
+from pyte.superclasses import PyteAugmentedArgList, _PyteAugmentedValidator
+
+
+def _pool_key(value):
+    """
+    Creates the dedup key of a value.
+
+    Values only share a key if they are equal and of the same type, so ``1``, ``1.0`` and
+    ``True`` stay separate. Floats and complexes are keyed by their repr, so that ``0.0`` and
+    ``-0.0`` stay separate too.
+
+    :raises TypeError: If the value can not be hashed.
+    """
+    cls = type(value)
+    if cls in (float, complex):
+        return cls, repr(value)
+    elif cls is tuple:
+        return cls, tuple(_pool_key(item) for item in value)
+    elif cls is frozenset:
+        return cls, frozenset(_pool_key(item) for item in value)
+    hash(value)
+    return cls, value
+
+
+class Pool(PyteAugmentedArgList):
+    """
+    A validated list that hands out indexes on demand.
+
+    Instead of building the list up front and tracking indexes by hand, call :meth:`add` with a
+    value to get its validator. Equal values of the same type share one slot. A pool can be
+    passed to :func:`pyte.compile` like any other validated list.
+    """
+
+    def __init__(self, *args, name: str = "consts"):
+        super().__init__(*args, name=name)
+        # Dedup key -> index. None when it needs rebuilding after the list was changed.
+        self._index = None
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._index = None
+
+    def _invalidate(self):
+        super()._invalidate()
+        self._index = None
+
+    def _build_index(self) -> dict:
+        index = {}
+        for i, value in enumerate(self):
+            try:
+                index.setdefault(_pool_key(value), i)
+            except TypeError:
+                continue
+        self._index = index
+        return index
+
+    def add(self, value) -> _PyteAugmentedValidator:
+        """
+        Adds a value to the pool, unless an equal value of the same type is already in it.
+
+        :param value: The value to add.
+        :return: The validator for the value's index.
+        """
+        index = self._index
+        if index is None:
+            index = self._build_index()
+
+        try:
+            key = _pool_key(value)
+        except TypeError:
+            # Unhashable values can't be deduplicated.
+            key = None
+        else:
+            try:
+                return self[index[key]]
+            except KeyError:
+                pass
+
+        # Append without invalidating, so the index and the validators are kept.
+        position = len(self)
+        list.append(self, value)
+        if key is not None:
+            index[key] = position
+        return self[position]
+
+    def freeze(self) -> tuple:
+        """
+        :return: The values in the pool, as the tuple the code object uses.
+        """
+        return tuple(self)
@@ -0,0 +1,89 @@
+"""
+Process-wide reporting of invalid opcodes in compiled functions.
+
+Unlike the safety wrapper, this adds nothing to each call. Code objects are registered when they
+are compiled, and the disassembly is only produced once a SystemError escapes.
+"""
+import contextlib
+import dis
+import io
+import sys
+import types
+import weakref
+
+# id(code object) -> weakref to it. Code objects hash their consts, which may be unhashable, so
+# they can't be kept in a WeakSet.
+_registered = {}
+_previous_hook = None
+
+
+def register(obb: types.CodeType):
+    """
+    Registers a code object, so that invalid opcode errors inside it are explained.
+
+    :param obb: The code object.
+    """
+    key = id(obb)
+    _registered[key] = weakref.ref(obb, lambda _: _registered.pop(key, None))
+
+
+def _is_registered(obb: types.CodeType) -> bool:
+    ref = _registered.get(id(obb))
+    return ref is not None and ref() is obb
+
+
+def _is_opcode_error(e: BaseException) -> bool:
+    return isinstance(e, SystemError) and 'opcode' in ' '.join(str(arg) for arg in e.args)
+
+
+def explain(e: BaseException) -> str:
+    """
+    Explains an invalid opcode error raised inside a registered function.
+
+    This can be used by code that catches the SystemError itself.
+
+    :param e: The exception.
+    :return: A message with the disassembly of the function, or None if the exception did not \
+        come from a registered function.
+    """
+    if not _is_opcode_error(e):
+        return None
+
+    # The innermost registered frame is the one that failed.
+    obb = None
+    tb = e.__traceback__
+    while tb is not None:
+        if _is_registered(tb.tb_frame.f_code):
+            obb = tb.tb_frame.f_code
+        tb = tb.tb_next
+
+    if obb is None:
+        return None
+
+    msg = "Bytecode exception!" \
+          "\nFunction {} returned an invalid opcode." \
+          "\nFunction dissection:\n\n".format(obb.co_name)
+    # dis sucks and always prints to stdout
+    # so we capture it
+    file = io.StringIO()
+    with contextlib.redirect_stdout(file):
+        dis.dis(obb)
+    return msg + file.getvalue()
+
+
+def _excepthook(exc_type, value, tb):
+    message = explain(value)
+    if message is not None:
+        print(message, file=sys.stderr)
+    _previous_hook(exc_type, value, tb)
+
+
+def install():
+    """
+    Installs the process-wide exception hook. This is idempotent.
+    """
+    global _previous_hook
+    if sys.excepthook is _excepthook:
+        return
+    _previous_hook = sys.excepthook
+    sys.excepthook = _excepthook
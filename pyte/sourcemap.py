@@ -0,0 +1,144 @@
+"""
+Maps the bytecode of compiled functions back to the Pyte objects it came from.
+
+Functions compiled with ``source_map=True`` get a line table where each line is one Pyte object,
+numbered from 1 in the order they were emitted, so profilers and tracebacks can tell the parts
+of a function apart. The :class:`SourceMap` of a function can be looked up with :func:`get`.
+"""
+import bisect
+import types
+import weakref
+
+from pyte.util import PY36
+
+# Line deltas are signed bytes on 3.6+, and unsigned before.
+_MIN_LINE_DELTA, _MAX_LINE_DELTA = (-128, 127) if PY36 else (0, 255)
+
+# id(code object) -> (weakref to it, SourceMap). Code objects hash their consts, which may be
+# unhashable, so they can't be weak dictionary keys.
+_maps = {}
+
+
+class SourceMap(object):
+    """
+    Maps bytecode offsets of a code object to the objects that emitted them.
+    """
+
+    def __init__(self, entries: list):
+        """
+        :param entries: A list of (offset, object) tuples, in the order the objects were \
+            emitted, or of (offset, object, line) tuples as recorded by an :class:`.Emitter`. \
+            Pairs are numbered from 1 in order. Objects that emitted nothing share an offset \
+            with the next object.
+        """
+        #: A list of (offset, line, object) tuples, sorted by offset.
+        self.entries = sorted(((entry[0], entry[2] if len(entry) > 2 else line, entry[1])
+                               for line, entry in enumerate(entries, start=1)),
+                              key=lambda entry: entry[0])
+        self._offsets = [entry[0] for entry in self.entries]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _entry_at(self, offset: int):
+        # The last object that starts at or before the offset; objects nested inside another
+        # start at the same offset as it, and are more specific.
+        index = bisect.bisect_right(self._offsets, offset) - 1
+        if index < 0:
+            return None
+        return self.entries[index]
+
+    def op_at(self, offset: int):
+        """
+        :param offset: A bytecode offset, such as ``frame.f_lasti``.
+        :return: The object that emitted the instruction at that offset, or None.
+        """
+        entry = self._entry_at(offset)
+        return entry[2] if entry is not None else None
+
+    def line_at(self, offset: int) -> int:
+        """
+        :param offset: A bytecode offset.
+        :return: The line number of the instruction at that offset, or None.
+        """
+        entry = self._entry_at(offset)
+        return entry[1] if entry is not None else None
+
+    def lnotab(self, firstlineno: int = 1) -> bytes:
+        """
+        Encodes the map as a ``co_lnotab``.
+
+        :param firstlineno: The ``co_firstlineno`` of the code object. Lines are numbered from it.
+        :return: The line table.
+        """
+        # Only the last object at each offset gets a line, to agree with :meth:`line_at`.
+        lines = {}
+        for offset, line, _ in self.entries:
+            lines[offset] = line + firstlineno - 1
+
+        table = bytearray()
+        last_offset, last_line = 0, firstlineno
+        for offset in sorted(lines):
+            byte_delta = offset - last_offset
+            line_delta = lines[offset] - last_line
+            # Before 3.6, the line table can't go back to an earlier line, e.g. for the end of a
+            # loop after its body. Those offsets keep the line before them.
+            if not line_delta or (line_delta < 0 and not PY36):
+                continue
+            while byte_delta > 255:
+                table += bytes((255, 0))
+                byte_delta -= 255
+            while not _MIN_LINE_DELTA <= line_delta <= _MAX_LINE_DELTA:
+                step = _MAX_LINE_DELTA if line_delta > 0 else _MIN_LINE_DELTA
+                table += bytes((byte_delta, step & 0xFF))
+                byte_delta = 0
+                line_delta -= step
+            table += bytes((byte_delta, line_delta & 0xFF))
+            last_offset, last_line = offset, lines[offset]
+        return bytes(table)
+
+
+def register(obb: types.CodeType, source_map: SourceMap):
+    """
+    Associates a source map with a code object.
+    """
+    key = id(obb)
+    _maps[key] = (weakref.ref(obb, lambda _: _maps.pop(key, None)), source_map)
+
+
+def _code_of(obb) -> types.CodeType:
+    if isinstance(obb, types.FrameType):
+        return obb.f_code
+    # Look through the safety wrapper.
+    obb = getattr(obb, "wrapped", obb)
+    return getattr(obb, "__code__", obb)
+
+
+def get(obb) -> SourceMap:
+    """
+    Gets the source map of a compiled function.
+
+    :param obb: A function, code object or frame.
+    :return: The :class:`SourceMap`, or None if the function was not compiled with a source map.
+    """
+    obb = _code_of(obb)
+    entry = _maps.get(id(obb))
+    if entry is None or entry[0]() is not obb:
+        return None
+    return entry[1]
+
+
+def op_at(obb, offset: int = None):
+    """
+    Finds the Pyte object that emitted an instruction.
+
+    :param obb: A function, code object or frame.
+    :param offset: The bytecode offset. Defaults to ``f_lasti`` if ``obb`` is a frame.
+    :return: The object, or None if it can't be found.
+    """
+    if offset is None:
+        offset = obb.f_lasti
+    source_map = get(obb)
+    if source_map is None:
+        return None
+    return source_map.op_at(offset)
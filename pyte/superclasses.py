@@ -5,11 +5,20 @@ import dis
 import functools
 
 from pyte import tokens, util
+from pyte.emitter import Emitter, Label
 from pyte.exc import ValidationError
-from pyte.util import PY36
 
 BIN_OP_MAP = {}
 
+# The opcode used to load an item from each kind of list.
+_LOAD_OPCODES = {
+    "consts": tokens.LOAD_CONST,
+    "varnames": tokens.LOAD_FAST,
+    "names": tokens.LOAD_GLOBAL,
+    "cellvars": tokens.LOAD_DEREF,
+    "freevars": tokens.LOAD_DEREF,
+}
+
 for num, val in enumerate(dis.cmp_op):
     BIN_OP_MAP[val] = num
 
@@ -17,7 +26,11 @@ for num, val in enumerate(dis.cmp_op):
 class _PyteOp(object):
     """
     This is a superclass for an opcode object, I.E an operation like `LOAD_FAST`.
+
+    Operators are created in large numbers, so they use ``__slots__``. Subclasses should declare
+    their own.
     """
+    __slots__ = ("args",)
 
     def __init__(self, *args):
         # Generic init
@@ -26,11 +39,47 @@ class _PyteOp(object):
     # How wide this operation is (in bytes)
     op_width = 0
 
+    def emit(self, emitter: Emitter):
+        """
+        Writes the bytecode of this operator into an :class:`.Emitter`.
+        """
+        # Operators that only implement the old `to_bytes` interface get the full prefix.
+        if type(self).to_bytes is _PyteOp.to_bytes:
+            raise NotImplementedError
+        emitter.write(self.to_bytes(emitter.getvalue()))
+
     def to_bytes(self, previous: bytes) -> bytes:
         """
         Produces a byte string representing the `co_code` of this operator.
+
+        This is kept for compatibility; new operators should implement :meth:`emit`.
         """
-        raise NotImplementedError
+        emitter = Emitter()
+        emitter.write(previous)
+        self.emit(emitter)
+        return emitter.assemble()[len(previous):]
+
+
+class _SelfHostedMethod(object):
+    """
+    A method that is itself written in Pyte.
+
+    The implementation is compiled the first time the method is used, and the function is shared
+    by every instance afterwards, so creating an instance costs nothing extra.
+    """
+
+    def __init__(self, factory):
+        """
+        :param factory: A function that compiles the implementation, and returns the function.
+        """
+        self._factory = factory
+        self._func = None
+
+    def __get__(self, instance, owner):
+        func = self._func
+        if func is None:
+            func = self._func = self._factory()
+        return func.__get__(instance, owner)
 
 
 class _PyteAugmentedComparator(object):
@@ -38,6 +87,7 @@ class _PyteAugmentedComparator(object):
     An augmented comparator is used for the IF statements, in order to generate the correct 
     bytecode.
     """
+    __slots__ = ("opcode", "first", "second")
 
     def __init__(self, opcode: int, first, second):
         self.opcode = opcode
@@ -48,28 +98,147 @@ class _PyteAugmentedComparator(object):
         return self.to_bytecode(previous)
 
     def to_bytecode(self, previous):
-        bc = b""
+        emitter = Emitter()
+        emitter.write(previous)
+        self.emit(emitter)
+        return emitter.assemble()[len(previous):]
+
+    def emit(self, emitter: Emitter):
         # Generate LOAD_
         for val in [self.first, self.second]:
-            if isinstance(val, _PyteOp):
-                # Mathematical ops
-                bc += val.to_bytes(previous + bc)
-                continue
-            if val.list_name == "consts":
-                bc += util.generate_load_const(val.index)
-            elif val.list_name == "names":
-                bc += util.generate_load_global(val.index)
-            elif val.list_name == "varnames":
-                bc += util.generate_load_fast(val.index)
-        # Add the CMP_OP
-        bc += tokens.COMPARE_OP.to_bytes(1, byteorder="little")
-        # Add the operator
-        # In Py 3.6+ the operator is only one byte.
-        if PY36:
-            bc += self.opcode.to_bytes(1, byteorder="little")
+            # Mathematical ops and validators both know how to load themselves.
+            val.emit(emitter)
+        # Add the COMPARE_OP, with the operator as the argument.
+        emitter.emit(tokens.COMPARE_OP, self.opcode)
+
+    # Condition combinators. `&` and `|` bind tighter than comparisons, so wrap each comparison
+    # in brackets: ``(a < b) & (b < c)``.
+
+    def __and__(self, other):
+        return PyteAnd(self, other)
+
+    def __or__(self, other):
+        return PyteOr(self, other)
+
+    def __invert__(self):
+        return PyteNot(self)
+
+
+def emit_condition_jump(emitter: Emitter, condition, jump_if: bool, label: Label):
+    """
+    Emits a condition, and a jump to a label that is taken if the condition is ``jump_if``.
+
+    Nothing is left on the stack either way. :class:`PyteAnd`, :class:`PyteOr` and
+    :class:`PyteNot` compile to chains of jumps, so no boolean is ever built; anything else is
+    emitted as a value, and tested with a POP_JUMP_IF_*.
+
+    :param emitter: The emitter to write into.
+    :param condition: The condition.
+    :param jump_if: Jump if the condition is true, or if it is false?
+    :param label: The :class:`.Label` to jump to.
+    """
+    if isinstance(condition, _PyteCondition):
+        condition.emit_jump(emitter, jump_if, label)
+    else:
+        emitter.emit_obb(condition)
+        emitter.emit_jump(tokens.POP_JUMP_IF_TRUE if jump_if else tokens.POP_JUMP_IF_FALSE,
+                          label)
+
+
+class _PyteCondition(_PyteOp):
+    """
+    A condition made out of other conditions.
+
+    Used as a value, these give the same result as the Python operator; used as the condition
+    of an IF, they short-circuit with jumps.
+    """
+    __slots__ = ()
+
+    def emit_jump(self, emitter: Emitter, jump_if: bool, label: Label):
+        """
+        See :func:`emit_condition_jump`.
+        """
+        raise NotImplementedError
+
+    def __and__(self, other):
+        return PyteAnd(self, other)
+
+    def __or__(self, other):
+        return PyteOr(self, other)
+
+    def __invert__(self):
+        return PyteNot(self)
+
+
+class _PyteShortCircuit(_PyteCondition):
+    """
+    The shared code of AND and OR.
+    """
+    __slots__ = ()
+
+    # Whether the first operand with this truth value decides the result.
+    _decides = None
+
+    def __init__(self, *conditions):
+        if len(conditions) < 2:
+            raise ValidationError("{} needs at least two conditions".format(type(self).__name__))
+        super().__init__(*conditions)
+
+    def emit(self, emitter: Emitter):
+        # Leave the deciding operand, or the last one, on the stack.
+        end = Label("short_circuit_end")
+        opcode = tokens.JUMP_IF_TRUE_OR_POP if self._decides else tokens.JUMP_IF_FALSE_OR_POP
+        for condition in self.args[:-1]:
+            emitter.emit_obb(condition)
+            emitter.emit_jump(opcode, end)
+        emitter.emit_obb(self.args[-1])
+        emitter.mark(end)
+
+    def emit_jump(self, emitter: Emitter, jump_if: bool, label: Label):
+        if jump_if is self._decides:
+            # The first deciding operand jumps.
+            for condition in self.args:
+                emit_condition_jump(emitter, condition, jump_if, label)
         else:
-            bc += self.opcode.to_bytes(2, byteorder="little")
-        return bc
+            # The first deciding operand skips the jump; only the last operand can take it.
+            skip = Label("short_circuit_skip")
+            for condition in self.args[:-1]:
+                emit_condition_jump(emitter, condition, self._decides, skip)
+            emit_condition_jump(emitter, self.args[-1], jump_if, label)
+            emitter.mark(skip)
+
+
+class PyteAnd(_PyteShortCircuit):
+    """
+    True if every condition is true. Conditions after the first false one are not evaluated.
+    """
+    __slots__ = ()
+    _decides = False
+
+
+class PyteOr(_PyteShortCircuit):
+    """
+    True if any condition is true. Conditions after the first true one are not evaluated.
+    """
+    __slots__ = ()
+    _decides = True
+
+
+class PyteNot(_PyteCondition):
+    """
+    Inverts a condition.
+    """
+    __slots__ = ()
+
+    def __init__(self, condition):
+        super().__init__(condition)
+
+    def emit(self, emitter: Emitter):
+        emitter.emit_obb(self.args[0])
+        emitter.emit(tokens.UNARY_NOT)
+
+    def emit_jump(self, emitter: Emitter, jump_if: bool, label: Label):
+        emit_condition_jump(emitter, self.args[0], not jump_if, label)
 
 
 class _FakeMathematicalOP(_PyteOp):
@@ -77,6 +246,7 @@ class _FakeMathematicalOP(_PyteOp):
     Represents a fake mathematical operation. These are returned from mathematical operations on 
     Pyte objects, and can be used to create bytes from them automatically.
     """
+    __slots__ = ("opcode",)
 
     def __init__(self, *args, opcode: int = None):
         super().__init__(*args)
@@ -85,22 +255,14 @@ class _FakeMathematicalOP(_PyteOp):
             raise ValidationError("This should never happen")
         self.opcode = opcode
 
-    def to_bytes(self, previous: bytes):
-        bc = b""
+    def emit(self, emitter: Emitter):
         # Add together all of the args.
         for index, arg in enumerate(self.args):
-            # Validate the arg.
-            arg.validate()
-            # Get the LOAD_ call.
-            bc += arg.to_load()
+            # Validate the arg, and add the LOAD_ call.
+            arg.emit(emitter)
             # Add a BINARY_* depending on if we are the first argument, or any more arguments.
             if index != 0:
-                size = 1
-                if PY36:
-                    # py36 change: binary operators are now 2 bytes wide
-                    size = 2
-                bc += self.opcode.to_bytes(size, byteorder="little")
-        return bc
+                emitter.emit(self.opcode)
 
     def __append_args(self, other):
         if other.__class__.__name__ == "_PyteAugmentedValidator":
@@ -143,11 +305,21 @@ class _PyteAugmentedValidator(object):
     compiled and ran,
     by validating the arguments.
     """
+    __slots__ = ("index", "partial", "_l_name", "_owner")
 
-    def __init__(self, index, get_partial, name):
+    def __init__(self, index, get_partial, name, owner: list = None):
         self.index = index
+        # Only used for validators that don't belong to a list.
         self.partial = get_partial
         self._l_name = name
+        # The list this validator came from, if any.
+        self._owner = owner
+
+    def __reduce__(self):
+        # The partial can't be pickled, so rebuild the validator from its list instead.
+        if self._owner is None:
+            raise TypeError("Cannot pickle a validator that does not belong to a list")
+        return _rebuild_validator, (self._owner, self.index)
 
     def to_load(self):
         if self._l_name == "consts":
@@ -157,15 +329,31 @@ class _PyteAugmentedValidator(object):
         elif self._l_name == "names":
             return util.generate_load_global(self.index)
 
+    def emit(self, emitter: Emitter):
+        self.validate()
+        if self._l_name in ("cellvars", "freevars"):
+            emitter.emit_deref(tokens.LOAD_DEREF, self.index, free=self._l_name == "freevars")
+        else:
+            emitter.emit(_LOAD_OPCODES[self._l_name], self.index)
+
     @property
     def list_name(self):
         return self._l_name
 
     def validate(self):
-        try:
-            return self.partial()
-        except IndexError:
+        owner = self._owner
+        if owner is None or type(self.index) is not int:
+            try:
+                return self.partial()
+            except IndexError:
+                raise ValidationError("Index `{}` does not exist at compile-time"
+                                      .format(self.index)) from None
+
+        # A plain bounds check, with the same rules as list indexing.
+        size = len(owner)
+        if not -size <= self.index < size:
             raise ValidationError("Index `{}` does not exist at compile-time".format(self.index))
+        return list.__getitem__(owner, self.index)
 
     def get(self):
         return self.validate()
@@ -238,11 +426,22 @@ class PyteAugmentedArgList(list):
     This is not actually subclassed, but used directly in an alias.
 
     Instead of providing items to use, it provides validators that are validated in `compile`.
+    Each index always gets the same validator, until the list is changed.
     """
 
     def __init__(self, *args, name: str = "consts"):
         super().__init__(*args)
         self.name = name
+        # Index -> the validator handed out for it.
+        self._validators = {}
+
+    def __getstate__(self):
+        # The validators are rebuilt on demand.
+        return {"name": self.name}
+
+    def __setstate__(self, state):
+        self.name = state["name"]
+        self._validators = {}
 
     def all(self):
         """
@@ -251,7 +450,76 @@ class PyteAugmentedArgList(list):
         return [x for x in self]
 
     def __getitem__(self, item):
-        # Create a partial to get the list item.
-        part = functools.partial(super().__getitem__, item)
-        # Return a new _PyteAugmentedValidator.
-        return _PyteAugmentedValidator(item, part, self.name)
+        try:
+            return self._validators[item]
+        except KeyError:
+            pass
+        except TypeError:
+            # Slices can't be cached.
+            return _PyteAugmentedValidator(item, functools.partial(super().__getitem__, item),
+                                           self.name, owner=self)
+
+        validator = self._validators[item] = _PyteAugmentedValidator(item, None, self.name,
+                                                                     owner=self)
+        return validator
+
+    def _invalidate(self):
+        """
+        Drops the cached validators, after the list is changed.
+        """
+        self._validators.clear()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._invalidate()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._invalidate()
+
+    def __iadd__(self, other):
+        self._invalidate()
+        return super().__iadd__(other)
+
+    def __imul__(self, other):
+        self._invalidate()
+        return super().__imul__(other)
+
+    def append(self, item):
+        super().append(item)
+        self._invalidate()
+
+    def extend(self, items):
+        super().extend(items)
+        self._invalidate()
+
+    def insert(self, index, item):
+        super().insert(index, item)
+        self._invalidate()
+
+    def pop(self, *args):
+        self._invalidate()
+        return super().pop(*args)
+
+    def remove(self, item):
+        super().remove(item)
+        self._invalidate()
+
+    def clear(self):
+        super().clear()
+        self._invalidate()
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._invalidate()
+
+    def reverse(self):
+        super().reverse()
+        self._invalidate()
+
+
+def _rebuild_validator(owner: PyteAugmentedArgList, index):
+    """
+    Recreates a validator after unpickling.
+    """
+    return owner[index]
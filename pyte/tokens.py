@@ -0,0 +1,9 @@
+"""
+Opcode numbers for the running interpreter, as module attributes (e.g. ``tokens.LOAD_CONST``).
+
+These are filled in from :data:`pyte.opcodes.OPMAP`, so only the opcodes the interpreter knows
+about exist.
+"""
+from pyte.opcodes import OPMAP
+
+globals().update(OPMAP)
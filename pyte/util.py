@@ -1,17 +1,52 @@
 """
 Miscellaneous utilities.
 """
-import collections
+import collections.abc
 import dis
+import struct
 import sys
 
 import pyte
+from pyte import opcodes
 from pyte.exc import ValidationError
 from . import tokens
 
 PY36 = sys.version_info[0:2] >= (3, 6)
 
 
+# The encoding is chosen once, here. Everything that emits bytecode goes through these tables,
+# so emitting an instruction with a small argument is a lookup.
+if PY36:
+    # Wordcode: every instruction is an opcode byte and an argument byte.
+    _ARG_BITS, _MAX_UNITS = 8, 4
+    _UNIT = struct.Struct("<BB")
+else:
+    # An opcode byte, followed by a 2 byte argument if the opcode takes one.
+    _ARG_BITS, _MAX_UNITS = 16, 2
+    _UNIT = struct.Struct("<BH")
+
+_ARG_MASK = (1 << _ARG_BITS) - 1
+
+#: The size of an instruction with an argument, without any EXTENDED_ARG prefixes.
+INSTRUCTION_SIZE = _UNIT.size
+
+#: Arguments below this are looked up in :data:`SMALL_ARG_ENCODINGS`.
+SMALL_ARG_LIMIT = 256
+
+#: The encoding of every opcode without an argument, indexed by opcode.
+NO_ARG_ENCODINGS = tuple(bytes((op, 0)) if PY36 else bytes((op,)) for op in range(256))
+
+#: For every known opcode that takes an argument, a tuple of its encodings with each small
+#: argument; None for the other opcodes.
+SMALL_ARG_ENCODINGS = tuple(
+    tuple(_UNIT.pack(op, arg) for arg in range(SMALL_ARG_LIMIT))
+    if info is not None and info.has_arg else None
+    for op, info in enumerate(opcodes.OPCODES)
+)
+
+_PACKED_VALUES = tuple(_UNIT.pack(0, arg)[1:] for arg in range(SMALL_ARG_LIMIT))
+
+
 def ensure_instruction(instruction: int) -> bytes:
     """
     Wraps an instruction to be Python 3.6+ compatible. This does nothing on Python 3.5 and below.
@@ -22,47 +57,87 @@ def ensure_instruction(instruction: int) -> bytes:
     :param instruction: The instruction integer to use.
     :return: A safe bytes object, if applicable.
     """
-    if PY36:
-        return instruction.to_bytes(2, byteorder="little")
-    else:
-        return instruction.to_bytes(1, byteorder="little")
+    return NO_ARG_ENCODINGS[instruction]
 
 
 def pack_value(index: int) -> bytes:
     """
     Small helper value to pack an index value into bytecode.
 
-    This is used for version compat between 3.5- and 3.6+
+    This is used for version compat between 3.5- and 3.6+. Only the argument of a single
+    instruction is packed; see :func:`encode_instruction` for wider arguments.
 
     :param index: The item to pack.
     :return: The packed item.
     """
-    if PY36:
-        return index.to_bytes(1, byteorder="little")
-    else:
-        return index.to_bytes(2, byteorder="little")
+    if 0 <= index < SMALL_ARG_LIMIT:
+        return _PACKED_VALUES[index]
+    return index.to_bytes(INSTRUCTION_SIZE - 1, byteorder="little")
+
+
+def arg_units(arg: int) -> int:
+    """
+    Gets how many instructions an argument needs; one, plus one per EXTENDED_ARG prefix.
+
+    :param arg: The argument.
+    :return: The number of instructions.
+    :raises OverflowError: If the argument is negative, or too wide for the interpreter.
+    """
+    if arg < 0:
+        raise OverflowError("Negative instruction argument: {}".format(arg))
+    units = 1
+    rest = arg >> _ARG_BITS
+    while rest:
+        units += 1
+        rest >>= _ARG_BITS
+    if units > _MAX_UNITS:
+        raise OverflowError("Instruction argument too wide: {}".format(arg))
+    return units
+
+
+def encode_instruction(opcode: int, arg: int, units: int = None) -> bytes:
+    """
+    Encodes an instruction, with as many EXTENDED_ARG prefixes as its argument needs.
+
+    :param opcode: The opcode.
+    :param arg: The argument.
+    :param units: Pad the instruction to this many instructions, with zero EXTENDED_ARG \
+        prefixes. This is used to keep jumps at a fixed width.
+    :return: The encoded instruction.
+    """
+    if (units is None or units == 1) and 0 <= arg < SMALL_ARG_LIMIT:
+        table = SMALL_ARG_ENCODINGS[opcode]
+        if table is not None:
+            return table[arg]
+
+    needed = arg_units(arg)
+    if units is None:
+        units = needed
+    elif needed > units:
+        raise OverflowError("Argument {} does not fit in {} instructions".format(arg, units))
+
+    pack = _UNIT.pack
+    bs = bytearray()
+    for shift in range(units - 1, 0, -1):
+        bs += pack(opcodes.EXTENDED_ARG, (arg >> (shift * _ARG_BITS)) & _ARG_MASK)
+    bs += pack(opcode, arg & _ARG_MASK)
+    return bytes(bs)
 
 
 def generate_simple_call(opcode: int, index: int):
     """
     Generates a simple call, with an index for something.
 
+    Indexes that don't fit in a single instruction get EXTENDED_ARG prefixes.
+
     :param opcode: The opcode to generate.
     :param index: The index to use as an argument.
     :return:
     """
-    bs = b""
-    # add the opcode
-    bs += opcode.to_bytes(1, byteorder="little")
-    # Add the index
     if isinstance(index, int):
-        if PY36:
-            bs += index.to_bytes(1, byteorder="little")
-        else:
-            bs += index.to_bytes(2, byteorder="little")
-    else:
-        bs += index
-    return bs
+        return encode_instruction(opcode, index)
+    # A pre-packed argument.
+    return opcode.to_bytes(1, byteorder="little") + index
 
 
 def generate_bytecode_from_obb(obb: object, previous: bytes) -> bytes:
@@ -74,18 +149,15 @@ def generate_bytecode_from_obb(obb: object, previous: bytes) -> bytes:
     :return: The generated bytecode.
     """
     # Generates bytecode from a specified object, be it a validator or an int or bytes even.
-    if isinstance(obb, pyte.superclasses._PyteOp):
-        return obb.to_bytes(previous)
-    elif isinstance(obb, (pyte.superclasses._PyteAugmentedComparator,
-                          pyte.superclasses._PyteAugmentedValidator._FakeMathematicalOP)):
-        return obb.to_bytes(previous)
-    elif isinstance(obb, pyte.superclasses._PyteAugmentedValidator):
-        obb.validate()
-        return obb.to_load()
-    elif isinstance(obb, int):
+    if isinstance(obb, int):
         return obb.to_bytes((obb.bit_length() + 7) // 8, byteorder="little") or b''
     elif isinstance(obb, bytes):
         return obb
+    elif hasattr(obb, "emit"):
+        emitter = pyte.emitter.Emitter()
+        emitter.write(previous)
+        obb.emit(emitter)
+        return emitter.assemble()[len(previous):]
     else:
         raise TypeError("`{}` was not a valid bytecode-encodable item".format(obb))
 
@@ -120,14 +192,45 @@ def generate_load_const(index: int) -> bytes:
     return generate_simple_call(tokens.LOAD_CONST, index)
 
 
-# https://stackoverflow.com/a/2158532
+def make_cell(value) -> "CellType":
+    """
+    Creates a new cell, for the closure of a function.
+
+    :param value: The value to put in the cell.
+    :return: The cell.
+    """
+    return (lambda: value).__closure__[0]
+
+
+#: The type of closure cells. :mod:`types` only has this from Python 3.8.
+CellType = type(make_cell(None))
+
+
+# Types that are never flattened, checked before the slower ABC check.
+_ATOMS = frozenset((int, str, bytes))
+
+
 def flatten(l):
-    for el in l:
-        if isinstance(el, collections.Iterable) and not isinstance(el, (str, bytes)):
-            for sub in flatten(el):
-                yield sub
-        else:
+    """
+    Lazily flattens nested iterables of instructions.
+
+    This uses an explicit stack, so it works with any nesting depth and never copies the input.
+    Strings and bytes are not flattened.
+
+    :param l: The iterable to flatten.
+    """
+    stack = [iter(l)]
+    while stack:
+        for el in stack[-1]:
+            cls = type(el)
+            if cls is list or cls is tuple or (cls not in _ATOMS and
+                                               isinstance(el, collections.abc.Iterable) and
+                                               not isinstance(el, (str, bytes))):
+                stack.append(iter(el))
+                break
             yield el
+        else:
+            stack.pop()
 
 
 # "fixed" functions
@@ -0,0 +1,81 @@
+"""
+Tests for the control flow analysis.
+"""
+import pytest
+
+import pyte
+from pyte import exc, tokens
+from pyte.analysis import ControlFlowGraph
+from pyte.emitter import Emitter, Label
+
+
+def _if_else(emitter: Emitter):
+    # if consts[0]: x = (1, 1, 1) else: x = (2, 2, 2)
+    orelse = Label()
+    end = Label()
+    emitter.emit(tokens.LOAD_CONST, 0)
+    emitter.emit_jump(tokens.POP_JUMP_IF_FALSE, orelse)
+    for _ in range(3):
+        emitter.emit(tokens.LOAD_CONST, 1)
+    emitter.emit(tokens.BUILD_TUPLE, 3)
+    emitter.emit_jump(tokens.JUMP_FORWARD, end)
+    emitter.mark(orelse)
+    for _ in range(3):
+        emitter.emit(tokens.LOAD_CONST, 2)
+    emitter.emit(tokens.BUILD_TUPLE, 3)
+    emitter.mark(end)
+    emitter.emit(tokens.RETURN_VALUE)
+
+
+def test_blocks():
+    emitter = Emitter()
+    _if_else(emitter)
+    cfg = ControlFlowGraph(emitter.assemble())
+
+    assert len(cfg.blocks) == 4
+    entry, body, orelse, end = cfg.blocks
+    assert {b for b, _ in entry.successors} == {body, orelse}
+    assert [b for b, _ in body.successors] == [end]
+    assert [b for b, _ in orelse.successors] == [end]
+
+
+def test_branches_do_not_over_reserve():
+    emitter = Emitter()
+    _if_else(emitter)
+    cfg = ControlFlowGraph(emitter.assemble())
+
+    # A linear walk would see 4 items on the stack in the else branch.
+    assert cfg.stack_depth() == 3
+    assert cfg.blocks[-1].entry_depth == 1
+
+
+def test_compiled_branches():
+    emitter = Emitter()
+    _if_else(emitter)
+    consts = pyte.create_consts(False, 1, 2)
+
+    func = pyte.compile([emitter.assemble()], consts, [], [], use_safety_wrapper=False)
+
+    assert func() == (2, 2, 2)
+    assert func.__code__.co_stacksize == 3
+
+
+def test_unreachable_code_is_ignored():
+    emitter = Emitter()
+    emitter.emit(tokens.LOAD_CONST, 0)
+    emitter.emit(tokens.RETURN_VALUE)
+    # Dead code, that would underflow the stack.
+    emitter.emit(tokens.POP_TOP)
+
+    cfg = ControlFlowGraph(emitter.assemble())
+    assert cfg.stack_depth() == 1
+    assert not cfg.blocks[1].reachable
+
+
+@pytest.mark.xfail(raises=exc.CompileError, strict=True)
+def test_stack_underflow():
+    emitter = Emitter()
+    emitter.emit(tokens.POP_TOP)
+    emitter.emit(tokens.RETURN_VALUE)
+
+    ControlFlowGraph(emitter.assemble()).stack_depth()
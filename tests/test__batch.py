@@ -0,0 +1,57 @@
+"""
+Tests for batch compilation.
+"""
+import pickle
+
+import pyte
+from pyte.batch import CompileJob
+
+
+def _double(x):
+    return x * 2
+
+
+def _jobs():
+    jobs = []
+    for value in range(4):
+        consts = pyte.create_consts(value)
+        names = pyte.create_names("_double")
+        varnames = pyte.create_varnames("x")
+        jobs.append(CompileJob(
+            [
+                pyte.ops.CALL_FUNCTION(names[0], consts[0], store_return=varnames[0]),
+                pyte.ops.LOAD_FAST(varnames[0]),
+                pyte.tokens.RETURN_VALUE
+            ],
+            consts, names, varnames, func_name="job_{}".format(value)
+        ))
+    return jobs
+
+
+def test_pickle_ir():
+    consts = pyte.create_consts(1, 2)
+    instructions = [
+        pyte.ops.LOAD_CONST(consts[0]).attr(pyte.create_names("real")[0]),
+        pyte.ops.SET(consts[0], consts[1]),
+        consts[0] + consts[1]
+    ]
+
+    restored = pickle.loads(pickle.dumps(instructions))
+
+    assert pyte.compiler.compile_bytecode(restored) == \
+        pyte.compiler.compile_bytecode(instructions)
+
+
+def test_compile_many_in_process():
+    funcs = pyte.compile_many(_jobs(), max_workers=1)
+
+    assert [f() for f in funcs] == [0, 2, 4, 6]
+    assert funcs[1].wrapped.__name__ == "job_1"
+
+
+def test_compile_many_process_pool():
+    funcs = pyte.compile_many(_jobs(), max_workers=2, chunksize=1, use_safety_wrapper=False)
+
+    assert [f() for f in funcs] == [0, 2, 4, 6]
+    # The functions are bound to this module's globals.
+    assert funcs[0].__globals__ is globals()
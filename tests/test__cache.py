@@ -0,0 +1,137 @@
+"""
+Tests for the compile cache.
+"""
+import pyte
+from pyte import cache as cache_module
+from pyte.cache import CompileCache, DiskCache, make_key
+
+
+def _instructions(consts):
+    return [pyte.ops.END_FUNCTION(consts[0])]
+
+
+def test_cache_hit():
+    cache = CompileCache()
+    consts = pyte.create_consts(5)
+
+    first = pyte.compile(_instructions(consts), consts, [], [], cache=cache)
+    second = pyte.compile(_instructions(consts), consts, [], [], cache=cache)
+
+    assert first() == second() == 5
+    assert first.wrapped is not second.wrapped
+    assert first.wrapped.__code__ is second.wrapped.__code__
+    assert cache.info()[0:2] == (1, 1)
+
+
+def test_cache_keeps_types_distinct():
+    cache = CompileCache()
+
+    for value in (1, 1.0, True, -0.0, 0.0):
+        consts = pyte.create_consts(value)
+        func = pyte.compile(_instructions(consts), consts, [], [], cache=cache,
+                            use_safety_wrapper=False)
+        assert repr(func()) == repr(value)
+
+    assert cache.hits == 0
+    assert len(cache) == 5
+
+
+def test_cache_eviction():
+    cache = CompileCache(maxsize=2)
+
+    for value in range(3):
+        consts = pyte.create_consts(value)
+        pyte.compile(_instructions(consts), consts, [], [], cache=cache)
+
+    assert len(cache) == 2
+    assert cache.evictions == 1
+
+    # The first entry was evicted.
+    consts = pyte.create_consts(0)
+    pyte.compile(_instructions(consts), consts, [], [], cache=cache)
+    assert cache.hits == 0
+
+
+def test_cache_keeps_profiles_distinct():
+    cache = CompileCache()
+    consts = pyte.create_consts(5)
+
+    pyte.compile(_instructions(consts), consts, [], [], cache=cache, profile="release")
+    pyte.compile(_instructions(consts), consts, [], [], cache=cache, profile="checked")
+
+    assert cache.hits == 0
+    assert len(cache) == 2
+
+
+def test_cache_invalidate():
+    cache = CompileCache()
+    consts = pyte.create_consts(5)
+
+    pyte.compile(_instructions(consts), consts, [], [], cache=cache)
+    key = make_key(_instructions(consts), consts, (), (), profile="debug")
+    assert key in cache
+
+    cache.invalidate(key)
+    assert key not in cache
+
+    pyte.compile(_instructions(consts), consts, [], [], cache=cache)
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_disk_cache(tmpdir):
+    cache = DiskCache(str(tmpdir))
+    consts = pyte.create_consts(5)
+
+    first = pyte.compile(_instructions(consts), consts, [], [], cache=cache)
+    assert cache.misses == 1
+    assert len(cache) == 1
+
+    # A new cache on the same directory, like a new process would have.
+    warm = DiskCache(str(tmpdir))
+    second = pyte.compile(_instructions(consts), consts, [], [], cache=warm)
+
+    assert warm.hits == 1
+    assert first() == second() == 5
+    assert first.wrapped.__code__ == second.wrapped.__code__
+
+
+def test_disk_cache_codegen_version(tmpdir, monkeypatch):
+    consts = pyte.create_consts(5)
+    # Written by a Pyte that generated different code.
+    monkeypatch.setattr(cache_module, "_HEADER", cache_module._HEADER[:-2] + b"\x00\x00")
+    pyte.compile(_instructions(consts), consts, [], [], cache=DiskCache(str(tmpdir)))
+    monkeypatch.undo()
+
+    cache = DiskCache(str(tmpdir))
+    pyte.compile(_instructions(consts), consts, [], [], cache=cache)
+    assert cache.hits == 0
+    assert cache.misses == 1
+
+
+def test_disk_cache_eviction(tmpdir):
+    cache = DiskCache(str(tmpdir), max_bytes=1)
+
+    for value in range(3):
+        consts = pyte.create_consts(value)
+        pyte.compile(_instructions(consts), consts, [], [], cache=cache)
+
+    assert len(cache) == 0
+    assert cache.evictions == 3
+
+
+def test_disk_cache_corrupt_entry(tmpdir):
+    cache = DiskCache(str(tmpdir))
+    consts = pyte.create_consts(5)
+
+    pyte.compile(_instructions(consts), consts, [], [], cache=cache)
+    key = make_key(_instructions(consts), consts, (), (), profile="debug")
+    with open(cache._path(key), "wb") as f:
+        f.write(b"garbage")
+
+    func = pyte.compile(_instructions(consts), consts, [], [], cache=cache)
+    assert func() == 5
+    assert cache.hits == 0
+
+    cache.invalidate()
+    assert len(cache) == 0
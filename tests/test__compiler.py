@@ -1,7 +1,6 @@
 """
 Test suite for Pyte.
 """
-import struct
 import sys
 import types
 
@@ -91,6 +90,98 @@ def test_call_function_with_args():
     assert func() == 19
 
 
+def _fake_global_with_kwargs(*args, **kwargs):
+    return args, kwargs
+
+
+def _kwargs_call(build):
+    # build(consts, name) returns the CALL_FUNCTION.
+    consts = pyte.create_consts(1, 2, 3, (4, 5), {"d": 6})
+    names = pyte.create_names("_fake_global_with_kwargs")
+    return pyte.compile([build(consts, names[0]), pyte.tokens.RETURN_VALUE], consts, names, [],
+                        use_safety_wrapper=False)
+
+
+def test_call_function_kwargs():
+    func = _kwargs_call(lambda consts, name: pyte.ops.CALL_FUNCTION(
+        name, consts[0], kwargs={"b": consts[1], "c": consts[2]}))
+    assert func() == ((1,), {"b": 2, "c": 3})
+    # The keyword names are added after the consts.
+    assert func.__code__.co_consts[5:] == ((("b", "c"),) if PY36 else ("b", "c"))
+
+
+def test_call_function_star_args():
+    func = _kwargs_call(lambda consts, name: pyte.ops.CALL_FUNCTION(
+        name, consts[0], star_args=consts[3]))
+    assert func() == ((1, 4, 5), {})
+
+    func = _kwargs_call(lambda consts, name: pyte.ops.CALL_FUNCTION(
+        name, star_args=consts[3], star_kwargs=consts[4]))
+    assert func() == ((4, 5), {"d": 6})
+
+    func = _kwargs_call(lambda consts, name: pyte.ops.CALL_FUNCTION(
+        name, consts[0], kwargs=[("b", consts[1])], star_args=consts[3], star_kwargs=consts[4]))
+    assert func() == ((1, 4, 5), {"b": 2, "d": 6})
+
+
+@pytest.mark.xfail(raises=exc.ValidationError, strict=True, reason="Keyword name not a string")
+def test_call_function_bad_kwargs():
+    _kwargs_call(lambda consts, name: pyte.ops.CALL_FUNCTION(name, kwargs={1: consts[0]}))
+
+
+def test_call_function_stream_kwargs():
+    consts = pyte.create_pool()
+    names = pyte.create_names("_fake_global_with_kwargs")
+    varnames = pyte.create_varnames("x", "y")
+
+    def generate():
+        yield pyte.ops.CALL_FUNCTION(names[0], kwargs={"a": consts.add(1)},
+                                     store_return=varnames[0])
+        # Added after the call, so the name tuple has to move.
+        yield pyte.ops.LOAD_CONST(consts.add(2))
+        yield pyte.ops.STORE_FAST(varnames[1])
+        yield pyte.ops.END_FUNCTION(varnames[0])
+
+    func = pyte.compile_stream(generate(), consts, names, varnames, profile="release")
+    assert func() == ((), {"a": 1})
+
+
+def test_call_method():
+    consts = pyte.create_consts([3, 1, 2], 2)
+    names = pyte.create_names("index")
+
+    instructions = [pyte.ops.CALL_METHOD(consts[0], names[0], consts[1]),
+                    pyte.tokens.RETURN_VALUE]
+    func = pyte.compile(instructions, consts, names, [])
+    assert func() == 2
+
+
+def test_call_method_kwargs():
+    consts = pyte.create_consts([3, 1, 2], True)
+    varnames = pyte.create_varnames("x", "result")
+    names = pyte.create_names("sort")
+
+    instructions = [pyte.ops.CALL_METHOD(varnames[0], names[0], kwargs={"reverse": consts[1]},
+                                         store_return=varnames[1]),
+                    pyte.ops.END_FUNCTION(varnames[0])]
+    func = pyte.compile(instructions, consts, names, varnames, arg_count=1)
+    assert func([3, 1, 2]) == [3, 2, 1]
+
+
+def test_compile_bytecode_added_consts():
+    consts = pyte.create_consts(1)
+    names = pyte.create_names("_fake_global_with_kwargs")
+
+    with pytest.raises(exc.CompileError):
+        pyte.compiler.compile_bytecode([pyte.ops.CALL_FUNCTION(names[0], kwargs={"k": consts[0]})])
+
+
+@pytest.mark.skipif(not PY36, reason="Keyword counts are encoded in the opcode before 3.6")
+def test_call_simple_kwargs():
+    with pytest.raises(exc.CompileError):
+        pyte.compiler.compile_bytecode([pyte.ops.CALL_SIMPLE(1, 1)])
+
+
 def test_comparator():
     # Test a comparator function
     consts = pyte.create_consts(1, 2)
@@ -140,6 +231,123 @@ def test_if():
     assert func() == 2
 
 
+def _branches(conditions, *extra_consts, else_body=False):
+    # result = "none"; if ...: result = "a" elif ...: result = "b" [else: result = "c"]
+    # The extra consts start at index 4.
+    consts = pyte.create_consts("none", "a", "b", "c", *extra_consts)
+    varnames = pyte.create_varnames("x", "result")
+    conditions = conditions(varnames[0], consts)
+    bodies = [[pyte.ops.LOAD_CONST(consts[i + 1]), pyte.ops.STORE_FAST(varnames[1])]
+              for i in range(len(conditions))]
+    if else_body:
+        else_body = [pyte.ops.LOAD_CONST(consts[3]), pyte.ops.STORE_FAST(varnames[1])]
+    else:
+        else_body = None
+
+    instructions = [
+        pyte.ops.LOAD_CONST(consts[0]),
+        pyte.ops.STORE_FAST(varnames[1]),
+        pyte.ops.IF(conditions, bodies, else_body=else_body),
+        pyte.ops.END_FUNCTION(varnames[1])
+    ]
+    return pyte.compile(instructions, consts, pyte.create_names("_record_call"), varnames,
+                        arg_count=1)
+
+
+@pytest.mark.parametrize("optimize", [True, False])
+def test_if_else_return(optimize):
+    # if x: return "a" else: return "b", as the last statement.
+    consts = pyte.create_consts("a", "b")
+    varnames = pyte.create_varnames("x")
+    instructions = [
+        pyte.ops.IF([varnames[0]], [[pyte.ops.END_FUNCTION(consts[0])]],
+                    else_body=[pyte.ops.END_FUNCTION(consts[1])])
+    ]
+    func = pyte.compile(instructions, consts, [], varnames, arg_count=1, optimize=optimize)
+
+    assert func(True) == "a"
+    assert func(False) == "b"
+
+
+def test_if_elif_else():
+    func = _branches(lambda x, consts: [x < consts[4], x < consts[5]], 1, 2, else_body=True)
+
+    assert func(0) == "a"
+    # Only the first true branch runs.
+    assert func(1) == "b"
+    assert func(2) == "c"
+
+
+def test_if_elif_no_else():
+    func = _branches(lambda x, consts: [x < consts[4], x < consts[5]], 1, 2)
+
+    assert func(0) == "a"
+    assert func(1) == "b"
+    assert func(2) == "none"
+
+
+_calls = []
+
+
+def _record_call():
+    _calls.append(True)
+    return True
+
+
+@pytest.mark.parametrize("combinator, x, expected, calls", [
+    (pyte.ops.AND, 0, "none", 0),
+    (pyte.ops.AND, 1, "a", 1),
+    (pyte.ops.OR, 1, "a", 0),
+    (pyte.ops.OR, 0, "a", 1),
+])
+def test_if_short_circuit(combinator, x, expected, calls):
+    names = pyte.create_names("_record_call")
+    func = _branches(lambda x, consts: [combinator(x, pyte.ops.CALL_FUNCTION(names[0]))])
+
+    del _calls[:]
+    assert func(x) == expected
+    assert len(_calls) == calls
+
+
+def test_if_not():
+    func = _branches(lambda x, consts: [~(x == x)], else_body=True)
+
+    assert func(1) == "c"
+    # NaN is not equal to itself.
+    assert func(float("nan")) == "a"
+
+
+def test_if_nested_combinators():
+    # (0 < x < 10) or not x
+    func = _branches(lambda x, consts: [pyte.ops.OR((consts[4] < x) & (x < consts[5]),
+                                                    pyte.ops.NOT(x))], 0, 10)
+
+    assert func(5) == "a"
+    assert func(0) == "a"
+    assert func(10) == "none"
+    assert func(-1) == "none"
+    # One COMPARE_OP per comparison, and no boolean is built.
+    code = func.wrapped.__code__.co_code
+    ops = [instruction.opcode for instruction in pyte.analysis.decode(code)]
+    assert ops.count(tokens.COMPARE_OP) == 2
+    assert tokens.UNARY_NOT not in ops
+
+
+def test_combinator_values():
+    consts = pyte.create_consts(0, "", 3)
+
+    func = pyte.compile([pyte.ops.OR(consts[0], consts[1], consts[2]), tokens.RETURN_VALUE],
+                        consts, [], [])
+    assert func() == 3
+
+    func = pyte.compile([pyte.ops.AND(consts[2], consts[1], consts[0]), tokens.RETURN_VALUE],
+                        consts, [], [])
+    assert func() == ""
+
+    func = pyte.compile([pyte.ops.NOT(consts[0]), tokens.RETURN_VALUE], consts, [], [])
+    assert func() is True
+
+
 @pytest.mark.xfail(strict=True)
 def test_bad_if():
     consts = pyte.create_consts(1, 2)
@@ -397,8 +605,9 @@ def test_for_loop():
                 pyte.ops.STORE_FAST(varnames[1]),
                 pyte.ops.LOAD_FAST(varnames[0]).attr(names[0]),
                 pyte.ops.LOAD_FAST(varnames[1]),
-                pyte.tokens.CALL_FUNCTION, struct.pack("<H", 1),  # Manual call function, non-validated.
-                pyte.tokens.POP_TOP,
+                # Manual call function, non-validated.
+                pyte.util.generate_simple_call(pyte.tokens.CALL_FUNCTION, 1),
+                pyte.util.ensure_instruction(pyte.tokens.POP_TOP),
             ]
         ),
         pyte.ops.END_FUNCTION(varnames[0])
@@ -416,18 +625,21 @@ def test_for_with_if():
         pyte.ops.FOR_LOOP(
             iterator=pyte.ops.LIST(consts[0]),
             body=[
+                # The item is not used.
+                pyte.util.ensure_instruction(pyte.tokens.POP_TOP),
                 pyte.ops.IF(
                     conditions=[consts[1] < consts[2]],
                     body=[
                         [
                             pyte.ops.LOAD_CONST(consts[1]),
-                            pyte.tokens.RETURN_VALUE
+                            pyte.util.ensure_instruction(pyte.tokens.RETURN_VALUE)
                         ]
                     ]
                 )
             ]
         ),
-        pyte.tokens.RETURN_VALUE
+        # Never reached, but the stack has to be valid.
+        pyte.ops.END_FUNCTION(consts[0])
     ]
 
     func = pyte.compile(instructions, consts, names=[], varnames=[])
@@ -435,6 +647,72 @@ def test_for_with_if():
     assert func() == 2
 
 
+def _summing_loop(consts, varnames, body):
+    # total = 0; for x in (1, 2, 3): <body>; total = total + x; return total
+    return [
+        pyte.ops.LOAD_CONST(consts[0]),
+        pyte.ops.STORE_FAST(varnames[0]),
+        pyte.ops.FOR_LOOP(
+            iterator=pyte.ops.TUPLE(consts[1], consts[2], consts[3]),
+            target=varnames[1],
+            body=body + [
+                varnames[0] + varnames[1],
+                pyte.ops.STORE_FAST(varnames[0]),
+            ]
+        ),
+        pyte.ops.END_FUNCTION(varnames[0])
+    ]
+
+
+def test_for_loop_target():
+    consts = pyte.create_consts(0, 1, 2, 3)
+    varnames = pyte.create_varnames("total", "x")
+
+    func = pyte.compile(_summing_loop(consts, varnames, []), consts, [], varnames)
+
+    assert func() == 6
+
+
+def test_for_loop_break():
+    consts = pyte.create_consts(0, 1, 2, 3)
+    varnames = pyte.create_varnames("total", "x")
+
+    body = [pyte.ops.IF([varnames[1] == consts[2]], [[pyte.ops.BREAK()]])]
+    func = pyte.compile(_summing_loop(consts, varnames, body), consts, [], varnames)
+
+    assert func() == 1
+
+
+def test_for_loop_continue():
+    consts = pyte.create_consts(0, 1, 2, 3)
+    varnames = pyte.create_varnames("total", "x")
+
+    body = [pyte.ops.IF([varnames[1] == consts[2]], [[pyte.ops.CONTINUE()]])]
+    func = pyte.compile(_summing_loop(consts, varnames, body), consts, [], varnames)
+
+    assert func() == 4
+
+
+@pytest.mark.parametrize("op", [pyte.ops.BREAK, pyte.ops.CONTINUE])
+def test_loop_control_outside_loop(op):
+    consts = pyte.create_consts(None)
+
+    with pytest.raises(exc.CompileError):
+        pyte.compile([op(), pyte.ops.END_FUNCTION(consts[0])], consts, [], [])
+
+
+def test_for_loop_large_body():
+    # The jumps around the body need EXTENDED_ARG.
+    consts = pyte.create_consts(0, 1, 2, 3)
+    varnames = pyte.create_varnames("total", "x")
+
+    body = [[varnames[1], pyte.util.ensure_instruction(tokens.POP_TOP)]] * 5000
+    func = pyte.compile(_summing_loop(consts, varnames, body), consts, [], varnames,
+                        profile="release")
+
+    assert func() == 6
+
+
 def test_modulo():
     consts = pyte.create_consts(4, 2)
 
@@ -498,3 +776,202 @@ def test_built_set():
     func = pyte.compile(instructions, consts, [], [])
 
     assert func() == {0, 1, 2}
+
+
+@pytest.mark.parametrize("profile", ["debug", "checked", "release"])
+def test_profiles(profile):
+    consts = pyte.create_consts(1, 2)
+
+    instructions = [
+        consts[0] + consts[1],
+        pyte.tokens.RETURN_VALUE
+    ]
+
+    func = pyte.compile(instructions, consts, [], [], profile=profile)
+
+    assert func() == 3
+    assert func.wrapped.__code__.co_stacksize == 2
+
+
+def test_release_profile_is_quiet(capsys):
+    consts = pyte.create_consts(None)
+    pyte.compile([pyte.ops.END_FUNCTION(consts[0])], consts, [], [], profile="release")
+
+    assert capsys.readouterr().out == ""
+
+
+def test_default_profile(capsys):
+    consts = pyte.create_consts(None)
+    pyte.set_default_profile("release")
+    try:
+        pyte.compile([pyte.ops.END_FUNCTION(consts[0])], consts, [], [])
+    finally:
+        pyte.set_default_profile("debug")
+
+    assert capsys.readouterr().out == ""
+
+
+@pytest.mark.xfail(raises=exc.ValidationError, strict=True)
+def test_release_bad_index():
+    consts = pyte.create_consts()
+    instructions = [
+        pyte.tokens.LOAD_CONST, 0,
+        pyte.tokens.RETURN_VALUE, 0
+    ] if PY36 else [
+        pyte.tokens.LOAD_CONST, 0, 0,
+        pyte.tokens.RETURN_VALUE
+    ]
+
+    pyte.compile(instructions, consts, [], [], profile="release")
+
+
+@pytest.mark.xfail(raises=exc.CompileError, strict=True)
+def test_release_bad_stack():
+    pyte.compile([pyte.tokens.RETURN_VALUE], [], [], [], profile="release")
+
+
+def test_nested_if():
+    consts = pyte.create_consts(1, 2, "inner", "outer", "after")
+
+    instructions = [
+        pyte.ops.IF(
+            conditions=[consts[0] < consts[1]],
+            body=[
+                [
+                    pyte.ops.IF(
+                        conditions=[consts[1] < consts[0]],
+                        body=[[pyte.ops.END_FUNCTION(consts[2])]]
+                    ),
+                    pyte.ops.END_FUNCTION(consts[3])
+                ]
+            ]
+        ),
+        pyte.ops.END_FUNCTION(consts[4])
+    ]
+
+    func = pyte.compile(instructions, consts, [], [])
+
+    assert func() == "outer"
+
+
+def test_flatten_is_not_recursive():
+    from pyte.util import flatten
+
+    nested = [1]
+    for _ in range(sys.getrecursionlimit() * 2):
+        nested = [nested, (2,)]
+    flat = list(flatten(nested))
+    assert flat[0] == 1 and len(flat) == sys.getrecursionlimit() * 2 + 1
+    assert list(flatten([b"ab", "cd", (x for x in [3, [4]])])) == [b"ab", "cd", 3, 4]
+
+
+def test_compile_stream():
+    consts = pyte.create_pool()
+    varnames = pyte.create_varnames("x")
+
+    def generate():
+        # The pool is filled in while the instructions are generated.
+        yield pyte.ops.LIST(*[consts.add(i) for i in range(3)], store=varnames[0])
+        for i in range(100):
+            yield [pyte.ops.LOAD_CONST(consts.add(i)), pyte.ops.STORE_FAST(varnames[0])]
+        yield pyte.ops.END_FUNCTION(varnames[0])
+
+    func = pyte.compile_stream(generate(), consts, [], varnames, profile="release")
+    assert func() == 99
+    assert len(consts) == 100
+
+
+def test_set_template_is_shared():
+    consts = pyte.create_consts(1, 2)
+    first, second = pyte.ops.SET(consts[0]), pyte.ops.SET(consts[1])
+    assert first.emit.__func__ is second.emit.__func__
+    assert not hasattr(first, "__dict__")
+    # An internal helper, which must not install the process-wide hook.
+    assert not pyte.safety._is_registered(first.emit.__func__.__code__)
+
+
+def _counter(**kwargs):
+    # count += 1; return count
+    consts = pyte.create_consts(1)
+    freevars = pyte.create_freevars("count")
+    instructions = [
+        freevars[0] + consts[0],
+        pyte.ops.STORE_DEREF(freevars[0]),
+        pyte.ops.LOAD_DEREF(freevars[0]),
+        pyte.tokens.RETURN_VALUE
+    ]
+    return pyte.compile(instructions, consts, [], [], freevars=freevars, **kwargs)
+
+
+def test_closure():
+    func = _counter(closure=[0])
+
+    assert func() == 1
+    assert func() == 2
+    assert func.wrapped.__code__.co_freevars == ("count",)
+
+
+def test_closure_shared_cell():
+    cell = pyte.util.make_cell(10)
+    first = _counter(closure=[cell])
+    second = _counter(closure=[cell])
+
+    assert first() == 11
+    assert second() == 12
+    assert cell.cell_contents == 12
+
+
+def test_with_closure():
+    func = _counter(closure=[0], cache=True)
+    other = pyte.with_closure(func, [100])
+
+    assert other() == 101
+    assert func() == 1
+    assert other.wrapped.__code__ is func.wrapped.__code__
+    assert _counter(closure=[5], cache=True).wrapped.__code__ is func.wrapped.__code__
+
+
+def test_closure_mismatch():
+    with pytest.raises(exc.CompileError):
+        _counter()
+    with pytest.raises(exc.CompileError):
+        _counter(closure=[1, 2])
+
+
+def test_cellvars_and_freevars():
+    # A cellvar that is also the argument, and a freevar numbered after it.
+    varnames = pyte.create_varnames("a")
+    cellvars = pyte.create_cellvars("a")
+    freevars = pyte.create_freevars("b")
+
+    def instructions():
+        return [cellvars[0] + freevars[0], pyte.tokens.RETURN_VALUE]
+
+    func = pyte.compile(instructions(), [], [], varnames, arg_count=1, cellvars=cellvars,
+                        freevars=freevars, closure=[2])
+    assert func(1) == 3
+
+    stream = pyte.InstructionStream(instructions())
+    func = pyte.compile(stream, [], [], varnames, arg_count=1, cellvars=cellvars,
+                        freevars=freevars, closure=[5])
+    assert func(1) == 6
+
+
+def test_load_closure():
+    varnames = pyte.create_varnames("a")
+    cellvars = pyte.create_cellvars("a")
+
+    func = pyte.compile([pyte.ops.LOAD_CLOSURE(cellvars[0]), pyte.tokens.RETURN_VALUE], [], [],
+                        varnames, arg_count=1, cellvars=cellvars)
+    cell = func(7)
+
+    assert type(cell) is pyte.util.CellType
+    assert cell.cell_contents == 7
+
+
+def test_bad_deref():
+    varnames = pyte.create_varnames("a")
+
+    with pytest.raises(exc.ValidationError):
+        pyte.compile([pyte.ops.LOAD_DEREF(varnames[0]), pyte.tokens.RETURN_VALUE], [], [],
+                     varnames)
@@ -0,0 +1,198 @@
+"""
+Tests for the bytecode emitter.
+"""
+import pytest
+
+import pyte
+from pyte import exc, tokens
+from pyte.emitter import Emitter, InstructionStream, Label
+from pyte.superclasses import _PyteOp
+from pyte.util import ensure_instruction, generate_simple_call
+
+
+def test_emitter_offset():
+    emitter = Emitter()
+    assert emitter.offset == 0
+
+    emitter.emit(tokens.LOAD_CONST, 0)
+    emitter.emit(tokens.RETURN_VALUE)
+
+    expected = generate_simple_call(tokens.LOAD_CONST, 0) + ensure_instruction(tokens.RETURN_VALUE)
+    assert emitter.offset == len(expected)
+    assert emitter.getvalue() == expected
+
+
+def test_legacy_to_bytes_op():
+    # Operators that only implement to_bytes(previous) still compile.
+    class _LegacyReturn(_PyteOp):
+        def to_bytes(self, previous):
+            return ensure_instruction(tokens.RETURN_VALUE)
+
+    consts = pyte.create_consts(7)
+
+    instructions = [
+        pyte.ops.LOAD_CONST(consts[0]),
+        _LegacyReturn()
+    ]
+
+    func = pyte.compile(instructions, consts, [], [])
+
+    assert func() == 7
+
+
+def test_to_bytes_compat():
+    consts = pyte.create_consts(None)
+    op = pyte.ops.LOAD_CONST(consts[0])
+
+    assert op.to_bytes(b"") == generate_simple_call(tokens.LOAD_CONST, 0)
+
+
+def test_labels():
+    emitter = Emitter()
+    start = Label("start")
+    end = Label("end")
+
+    emitter.mark(start)
+    emitter.emit_jump(tokens.JUMP_FORWARD, end)
+    emitter.emit_jump(tokens.JUMP_ABSOLUTE, start)
+    emitter.mark(end)
+
+    width = len(generate_simple_call(tokens.JUMP_FORWARD, 0))
+    assert emitter.assemble() == generate_simple_call(tokens.JUMP_FORWARD, width) + \
+        generate_simple_call(tokens.JUMP_ABSOLUTE, 0)
+
+
+@pytest.mark.xfail(raises=exc.CompileError, strict=True)
+def test_unmarked_label():
+    emitter = Emitter()
+    emitter.emit_jump(tokens.JUMP_ABSOLUTE, Label())
+    emitter.assemble()
+
+
+def _if_program():
+    consts = pyte.create_consts(None, 1, 2)
+    varnames = pyte.create_varnames("x")
+    code = [
+        pyte.ops.IF(conditions=[consts[1] < consts[2]],
+                    body=[[pyte.ops.LOAD_CONST(consts[2]), pyte.ops.STORE_FAST(varnames[0])]]),
+        pyte.ops.END_FUNCTION(consts[0]),
+    ]
+    return code, consts, varnames
+
+
+def test_stream_matches_list():
+    code, consts, varnames = _if_program()
+    stream = InstructionStream(code)
+
+    emitter = Emitter()
+    for op in code:
+        emitter.emit_obb(op)
+    assert stream.assemble() == emitter.assemble()
+    # Replaying uses fresh labels, so a stream can be assembled again.
+    assert stream.assemble() == stream.assemble()
+
+    func = pyte.compile(stream, consts, [], varnames, profile="release")
+    assert func() is None
+
+
+def test_stream_wide_args_and_raw_bytes():
+    stream = InstructionStream()
+    stream.emit(tokens.LOAD_CONST, 0x12345)
+    stream.write(b"\x01\x02")
+
+    assert len(stream) == 2
+    # Replaying into another stream keeps the full argument.
+    copy = InstructionStream([stream])
+    assert copy._wide == {0: 0x12345}
+    assert copy._raw == [b"\x01\x02"]
+
+
+def test_stream_pickle_and_cache_key():
+    import pickle
+    from pyte.cache import make_key
+
+    code, consts, varnames = _if_program()
+    stream = InstructionStream(code)
+    copy = pickle.loads(pickle.dumps(stream))
+    assert copy.assemble() == stream.assemble()
+
+    assert make_key(stream, consts, (), varnames) == make_key(InstructionStream(code), consts,
+                                                              (), varnames)
+
+
+def test_ops_have_no_dict():
+    consts = pyte.create_consts(1)
+    for op in (pyte.ops.LOAD_CONST(consts[0]), pyte.ops.LIST(consts[0]),
+               pyte.ops.CALL_SIMPLE(0), consts[0], consts[0] + consts[0], consts[0] < consts[0]):
+        assert not hasattr(op, "__dict__")
+
+
+def test_encode_instruction_extended_arg():
+    from pyte.analysis import decode
+    from pyte.util import encode_instruction
+
+    bc = encode_instruction(tokens.LOAD_CONST, 0x10203)
+    (instruction,) = decode(bc)
+    assert instruction.arg == 0x10203
+    assert instruction.size == len(bc)
+
+    # Padded to a fixed width.
+    assert len(encode_instruction(tokens.LOAD_CONST, 1, 3)) == 3 * len(encode_instruction(
+        tokens.LOAD_CONST, 1))
+    with pytest.raises(OverflowError):
+        encode_instruction(tokens.LOAD_CONST, -1)
+
+
+def test_large_pools():
+    consts = pyte.create_pool()
+    varnames = pyte.create_varnames("x")
+    code = [pyte.ops.LIST(*[consts.add(i) for i in range(1000)], store=varnames[0]),
+            pyte.ops.END_FUNCTION(varnames[0])]
+    func = pyte.compile(code, consts, [], varnames, profile="release")
+    assert func() == list(range(1000))
+
+
+def test_jump_relaxation():
+    from pyte.analysis import ControlFlowGraph, decode, jump_target
+
+    # Forward jumps over bodies too long for a single instruction's argument.
+    consts = pyte.create_consts(None, True, False)
+    varnames = pyte.create_varnames("x")
+    body = [[pyte.ops.LOAD_CONST(consts[1]), pyte.ops.STORE_FAST(varnames[0])] * 300]
+    code = [pyte.ops.LOAD_CONST(consts[0]), pyte.ops.STORE_FAST(varnames[0]),
+            pyte.ops.IF(conditions=[consts[2]], body=body),
+            pyte.ops.IF(conditions=[consts[1]], body=[[pyte.ops.LOAD_CONST(consts[2]),
+                                                       pyte.ops.STORE_FAST(varnames[0])]]),
+            pyte.ops.END_FUNCTION(varnames[0])]
+
+    emitter = Emitter()
+    for op in code:
+        emitter.emit_obb(op)
+    bc = emitter.assemble()
+    offsets = {i.offset for i in decode(bc)}
+    for instruction in decode(bc):
+        target = jump_target(instruction)
+        assert target is None or target in offsets
+    ControlFlowGraph(bc).stack_depth()
+
+    func = pyte.compile(code, consts, [], varnames, profile="release", optimize=False)
+    assert func() is False
+    func = pyte.compile(code, consts, [], varnames, profile="release")
+    assert func() is False
+
+
+def test_encoding_tables_match_slow_path():
+    from pyte import util
+
+    for op, table in enumerate(util.SMALL_ARG_ENCODINGS):
+        if table is None:
+            continue
+        for arg in (0, 1, 200, util.SMALL_ARG_LIMIT - 1):
+            expected = bytes([op]) + arg.to_bytes(util.INSTRUCTION_SIZE - 1, "little")
+            assert table[arg] == util.generate_simple_call(op, arg) == expected
+
+    emitter = Emitter()
+    emitter.emit(tokens.LOAD_CONST, 300)
+    emitter.emit(tokens.RETURN_VALUE)
+    assert emitter.getvalue() == util.encode_instruction(tokens.LOAD_CONST, 300) + \
+        util.ensure_instruction(tokens.RETURN_VALUE)
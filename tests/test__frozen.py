@@ -0,0 +1,101 @@
+"""
+Tests for frozen globals.
+"""
+import pytest
+
+import pyte
+from pyte import exc, frozen, safety, tokens
+from pyte.analysis import decode
+
+
+def _helper():
+    return 1
+
+
+def _other_helper():
+    return 2
+
+
+def _make(freeze=("_helper",), **kwargs):
+    names = pyte.create_names("_helper")
+    return pyte.compile([pyte.ops.CALL_FUNCTION(names[0]), tokens.RETURN_VALUE], [], names, [],
+                        freeze=freeze, **kwargs)
+
+
+def _opcodes(func) -> list:
+    return [instruction.opcode for instruction in decode(func.wrapped.__code__.co_code)]
+
+
+def test_freeze_loads_const():
+    func = _make()
+
+    assert func() == 1
+    assert tokens.LOAD_GLOBAL not in _opcodes(func)
+    assert frozen.values(func) == {"_helper": _helper}
+
+
+def test_freeze_off_is_unchanged():
+    func = _make(freeze=None)
+
+    assert tokens.LOAD_GLOBAL in _opcodes(func)
+    assert frozen.values(func) == {}
+    assert frozen.stale(func) == []
+
+
+def test_freeze_builtin():
+    names = pyte.create_names("len")
+    consts = pyte.create_consts("abc")
+    func = pyte.compile([pyte.ops.CALL_FUNCTION(names[0], consts[0]), tokens.RETURN_VALUE],
+                        consts, names, [], freeze=["len"])
+
+    assert func() == 3
+    assert frozen.values(func) == {"len": len}
+
+
+def test_freeze_missing_name():
+    with pytest.raises(exc.CompileError):
+        _make(freeze=["_does_not_exist"])
+
+
+def test_freeze_guard():
+    global _helper
+    func = _make()
+    original = _helper
+
+    try:
+        _helper = _other_helper
+        # Still the frozen value.
+        assert func() == 1
+        assert frozen.stale(func) == ["_helper"]
+
+        assert frozen.refresh(func)
+        assert func() == 2
+        assert frozen.stale(func) == []
+        assert not frozen.refresh(func)
+    finally:
+        _helper = original
+
+
+def test_freeze_refresh_keeps_hook():
+    global _helper
+    func = _make(use_safety_wrapper="hook")
+    original = _helper
+    assert safety._is_registered(func.__code__)
+
+    try:
+        _helper = _other_helper
+        assert frozen.refresh(func)
+        assert func() == 2
+        assert safety._is_registered(func.__code__)
+    finally:
+        _helper = original
+
+
+def test_freeze_stored_name():
+    names = pyte.create_names("_helper")
+    consts = pyte.create_consts(None)
+    code = [consts[0], pyte.util.generate_simple_call(tokens.STORE_GLOBAL, 0),
+            pyte.ops.END_FUNCTION(consts[0])]
+
+    with pytest.raises(exc.CompileError):
+        pyte.compile(code, consts, names, [], freeze=["_helper"])
@@ -0,0 +1,52 @@
+"""
+Tests for IF.
+"""
+import pytest
+
+import pyte
+from pyte.ops import END_FUNCTION, IF
+
+
+def _nested(optimize: bool, **kwargs):
+    # if a: (if b: return "inner") else: return "else"; return "after"
+    consts = pyte.create_consts("inner", "else", "after")
+    varnames = pyte.create_varnames("a", "b")
+    instructions = [
+        IF([varnames[0]], [[IF([varnames[1]], [[END_FUNCTION(consts[0])]])]],
+           else_body=[END_FUNCTION(consts[1])]),
+        END_FUNCTION(consts[2])
+    ]
+    return pyte.compile(instructions, consts, [], varnames, arg_count=2, optimize=optimize,
+                        **kwargs)
+
+
+@pytest.mark.parametrize("optimize", [True, False])
+def test_nested_if_return_falls_through(optimize):
+    # The inner IF ends in a return, but its end label is jumped to, so the outer branch still
+    # has to skip the else.
+    func = _nested(optimize)
+
+    assert func(1, 1) == "inner"
+    assert func(1, 0) == "after"
+    assert func(0, 0) == "else"
+
+
+def test_nested_if_return_source_map():
+    # Position tracking marks labels too, which must not look like jump targets.
+    func = _nested(True, source_map=True)
+
+    assert func(1, 0) == "after"
+    assert func(0, 1) == "else"
+
+
+def test_nested_if_return_stream():
+    consts = pyte.create_consts("inner", "else", "after")
+    varnames = pyte.create_varnames("a", "b")
+    stream = pyte.InstructionStream([
+        IF([varnames[0]], [[IF([varnames[1]], [[END_FUNCTION(consts[0])]])]],
+           else_body=[END_FUNCTION(consts[1])]),
+        END_FUNCTION(consts[2])
+    ])
+    func = pyte.compile(stream, consts, [], varnames, arg_count=2)
+
+    assert func(1, 0) == "after"
@@ -0,0 +1,68 @@
+"""
+Tests for instrumented functions.
+"""
+import pyte
+from pyte import metrics, sourcemap, tokens
+from pyte.util import ensure_instruction
+
+RETURN_VALUE = ensure_instruction(tokens.RETURN_VALUE)
+
+
+def _identity_code():
+    varnames = pyte.create_varnames("x")
+    return [pyte.ops.LOAD_FAST(varnames[0]), RETURN_VALUE], varnames
+
+
+def test_instrument_counts_calls():
+    code, varnames = _identity_code()
+    func = pyte.compile(code, [], [], varnames, func_name="test_identity", arg_count=1,
+                        instrument=True)
+    metrics.reset("test_identity")
+
+    for i in range(10):
+        assert func(i) == i
+
+    stats = metrics.snapshot()["test_identity"]
+    assert stats.calls == 10
+    assert stats.total_time > 0
+
+    metrics.reset()
+    assert metrics.snapshot()["test_identity"] == (0, 0.0)
+    func(1)
+    assert metrics.snapshot()["test_identity"].calls == 1
+
+
+def test_instrument_off_is_unchanged():
+    code, varnames = _identity_code()
+    plain = pyte.compile(code, [], [], varnames, arg_count=1)
+    off = pyte.compile(code, [], [], varnames, arg_count=1, instrument=False)
+
+    assert plain.__code__.co_code == off.__code__.co_code
+    assert plain.__code__.co_consts == off.__code__.co_consts
+    assert plain.__code__.co_varnames == off.__code__.co_varnames
+
+
+def test_instrument_every_return():
+    # if x: return 1, else: return None; both returns count.
+    consts = pyte.create_consts(None, 1)
+    varnames = pyte.create_varnames("x")
+    code = [pyte.ops.IF([varnames[0]], [[consts[1], RETURN_VALUE]]), consts[0], RETURN_VALUE]
+    func = pyte.compile(code, consts, [], varnames, arg_count=1, instrument="test_branches",
+                        source_map=True)
+    metrics.reset("test_branches")
+
+    assert func(True) == 1
+    assert func(False) is None
+    assert metrics.snapshot()["test_branches"].calls == 2
+    assert sourcemap.get(func) is not None
+
+
+def test_instrument_shared_name():
+    code, varnames = _identity_code()
+    first = pyte.compile(code, [], [], varnames, arg_count=1, instrument="test_shared")
+    second = pyte.compile(code, [], [], varnames, arg_count=1, instrument="test_shared")
+    metrics.reset("test_shared")
+
+    first(1)
+    second(2)
+    assert metrics.snapshot()["test_shared"].calls == 2
@@ -0,0 +1,56 @@
+"""
+Tests for the opcode metadata table.
+"""
+import dis
+
+import pytest
+
+import pyte
+from pyte import opcodes, tokens
+
+
+def test_table_matches_dis():
+    for name, op in dis.opmap.items():
+        info = opcodes.OPCODES[op]
+        assert info.name == name and getattr(tokens, name) == op
+        assert info.has_arg == (op >= dis.HAVE_ARGUMENT)
+        assert (info.jump == "relative") == (op in dis.hasjrel)
+        assert (info.jump == "absolute") == (op in dis.hasjabs)
+
+
+@pytest.mark.skipif(not hasattr(dis, "stack_effect"), reason="No dis.stack_effect")
+def test_stack_effects_match_dis():
+    for info in opcodes.OPCODES:
+        if info is None or info.name in ("NOP", "EXTENDED_ARG"):
+            continue
+        for arg in ((None,) if not info.has_arg else (0, 1, 2, 7, 260)):
+            try:
+                expected = dis.stack_effect(info.opcode, *(() if arg is None else (arg,)))
+            except ValueError:
+                continue
+            assert opcodes.stack_effect(info.opcode, arg) == expected
+
+
+@pytest.mark.skipif(not hasattr(dis, "stack_effect"), reason="No dis.stack_effect")
+def test_compile_does_not_call_dis(monkeypatch):
+    consts = pyte.create_consts(None, 1)
+    varnames = pyte.create_varnames("x")
+    code = [[pyte.ops.LOAD_CONST(consts[1]), pyte.ops.STORE_FAST(varnames[0])] * 100,
+            pyte.ops.LIST(consts[1], consts[1], store=varnames[0]),
+            pyte.ops.END_FUNCTION(consts[0])]
+    # Warm the cache for the argument-dependent BUILD_LIST.
+    pyte.compile(code, consts, [], varnames, profile="release")
+
+    def _fail(*args):
+        raise AssertionError("dis.stack_effect called")
+
+    monkeypatch.setattr(dis, "stack_effect", _fail)
+    pyte.compile(code, consts, [], varnames, profile="release")
+
+
+def test_opname():
+    assert opcodes.opname(tokens.LOAD_CONST) == "LOAD_CONST"
+    unused = opcodes.OPCODES.index(None)
+    assert opcodes.opname(unused) == "<{}>".format(unused)
+    with pytest.raises(ValueError):
+        opcodes.stack_effect(unused)
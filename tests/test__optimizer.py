@@ -0,0 +1,104 @@
+"""
+Tests for the peephole optimizer.
+"""
+import pyte
+from pyte import tokens
+from pyte.analysis import decode
+from pyte.emitter import Emitter, Label
+from pyte.optimizer import optimize
+
+
+def _opcodes(bc: bytes) -> list:
+    return [i.opcode for i in decode(bc)]
+
+
+def test_store_load():
+    emitter = Emitter()
+    emitter.emit(tokens.LOAD_CONST, 0)
+    emitter.emit(tokens.STORE_FAST, 0)
+    emitter.emit(tokens.LOAD_FAST, 0)
+    emitter.emit(tokens.RETURN_VALUE)
+
+    bc, report = optimize(emitter.assemble())
+
+    assert report.store_loads == 1
+    assert _opcodes(bc) == [tokens.LOAD_CONST, tokens.DUP_TOP, tokens.STORE_FAST,
+                            tokens.RETURN_VALUE]
+
+
+def test_dead_code_and_nops():
+    emitter = Emitter()
+    emitter.emit(tokens.NOP)
+    emitter.emit(tokens.LOAD_CONST, 0)
+    emitter.emit(tokens.RETURN_VALUE)
+    emitter.emit(tokens.LOAD_CONST, 0)
+    emitter.emit(tokens.RETURN_VALUE)
+
+    bc, report = optimize(emitter.assemble())
+
+    assert report.nops == 1
+    assert report.dead_instructions == 2
+    assert report.size_after < report.size_before
+    assert _opcodes(bc) == [tokens.LOAD_CONST, tokens.RETURN_VALUE]
+
+
+def test_thread_jumps():
+    emitter = Emitter()
+    first, second, end = Label(), Label(), Label()
+    emitter.emit(tokens.LOAD_CONST, 0)
+    emitter.emit_jump(tokens.POP_JUMP_IF_FALSE, first)
+    emitter.emit(tokens.LOAD_CONST, 1)
+    emitter.emit(tokens.RETURN_VALUE)
+    emitter.mark(first)
+    emitter.emit_jump(tokens.JUMP_ABSOLUTE, second)
+    emitter.mark(second)
+    emitter.emit_jump(tokens.JUMP_ABSOLUTE, end)
+    emitter.emit(tokens.NOP)
+    emitter.mark(end)
+    emitter.emit(tokens.LOAD_CONST, 2)
+    emitter.emit(tokens.RETURN_VALUE)
+
+    bc, report = optimize(emitter.assemble())
+
+    assert report.threaded_jumps >= 1
+    # The POP_JUMP_IF_FALSE now goes straight to the final LOAD_CONST.
+    instructions = decode(bc)
+    assert instructions[1].opcode == tokens.POP_JUMP_IF_FALSE
+    assert instructions[1].arg == instructions[4].offset
+    assert tokens.JUMP_ABSOLUTE not in _opcodes(bc)
+
+    consts = pyte.create_consts(False, "body", "end")
+    func = pyte.compile([bc], consts, [], [])
+    assert func() == "end"
+
+
+def test_unchanged():
+    emitter = Emitter()
+    emitter.emit(tokens.LOAD_CONST, 0)
+    emitter.emit(tokens.RETURN_VALUE)
+    original = emitter.assemble()
+
+    bc, report = optimize(original)
+
+    assert bc is original
+    assert not report.changed
+
+
+def test_compile_without_optimizing():
+    consts = pyte.create_consts(2)
+    varnames = pyte.create_varnames("x")
+
+    instructions = [
+        pyte.ops.LOAD_CONST(consts[0]),
+        pyte.ops.STORE_FAST(varnames[0]),
+        pyte.ops.LOAD_FAST(varnames[0]),
+        pyte.tokens.RETURN_VALUE
+    ]
+
+    optimized = pyte.compile(instructions, consts, [], varnames, use_safety_wrapper=False)
+    plain = pyte.compile(instructions, consts, [], varnames, use_safety_wrapper=False,
+                         optimize=False)
+
+    assert optimized() == plain() == 2
+    assert tokens.DUP_TOP in _opcodes(optimized.__code__.co_code)
+    assert tokens.DUP_TOP not in _opcodes(plain.__code__.co_code)
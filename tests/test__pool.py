@@ -0,0 +1,56 @@
+"""
+Tests for auto-indexing pools.
+"""
+import math
+import pickle
+
+import pyte
+from pyte.util import ensure_instruction
+
+
+def test_pool_dedup():
+    consts = pyte.create_pool()
+    first = consts.add("a")
+    assert consts.add("a") is first
+    assert consts.add("b").index == 1
+    assert consts.freeze() == ("a", "b")
+
+
+def test_pool_keeps_types_apart():
+    consts = pyte.create_pool()
+    indexes = [consts.add(value).index for value in (1, 1.0, True, 0.0, -0.0, (1,), (True,))]
+    assert indexes == list(range(7))
+    assert consts.add(1.0).index == 1
+    assert consts.add((True,)).index == 6
+
+
+def test_pool_unhashable_and_nan():
+    consts = pyte.create_pool()
+    assert consts.add([]).index != consts.add([]).index
+    nan = consts.add(float("nan"))
+    assert consts.add(float("nan")) is nan
+    assert math.isnan(consts.freeze()[nan.index])
+
+
+def test_pool_mutation_rebuilds_index():
+    names = pyte.create_pool("x", name="names")
+    names.insert(0, "y")
+    assert names.add("x").index == 1
+    assert names.add("y").index == 0
+
+
+def test_pool_compiles():
+    consts = pyte.create_pool()
+    names = pyte.create_pool(name="names")
+    code = [pyte.ops.CALL_FUNCTION(names.add("len"), consts.add("abc")),
+            pyte.ops.CALL_FUNCTION(names.add("len"), consts.add("abc")),
+            ensure_instruction(pyte.tokens.BINARY_ADD), pyte.tokens.RETURN_VALUE]
+    func = pyte.compile(code, consts, names, [])
+    assert func() == 6
+    assert len(consts) == 1 and len(names) == 1
+
+
+def test_pool_pickle():
+    consts = pyte.create_pool(1, 2)
+    copied = pickle.loads(pickle.dumps(consts))
+    assert copied.add(2).index == 1
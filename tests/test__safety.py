@@ -0,0 +1,55 @@
+"""
+Tests for the process-wide safety hook.
+"""
+import sys
+import types
+
+import pytest
+
+import pyte
+from pyte import safety
+
+
+def _broken_function():
+    # A code object containing opcode 0, which does not exist.
+    obb = types.CodeType(0, 0, 0, 1, 67, b"\x00\x00" if pyte.util.PY36 else b"\x00", (), (), (),
+                         "<broken>", "broken", 1, b"", (), ())
+    safety.register(obb)
+    return types.FunctionType(obb, {})
+
+
+def test_hook_mode_is_unwrapped():
+    consts = pyte.create_consts(3)
+    func = pyte.compile([pyte.ops.END_FUNCTION(consts[0])], consts, [], [],
+                        use_safety_wrapper="hook")
+
+    assert isinstance(func, types.FunctionType)
+    assert not hasattr(func, "wrapped")
+    assert func() == 3
+    assert sys.excepthook is safety._excepthook
+
+
+def test_hook_mode_unhashable_const():
+    # Code objects with a list const can't be hashed.
+    consts = pyte.create_consts([1, 2])
+    func = pyte.compile([pyte.ops.END_FUNCTION(consts[0])], consts, [], [],
+                        use_safety_wrapper="hook")
+
+    assert func() == [1, 2]
+    assert safety._is_registered(func.__code__)
+
+
+def test_explain():
+    func = _broken_function()
+
+    with pytest.raises(SystemError) as e:
+        func()
+
+    message = safety.explain(e.value)
+    assert "Bytecode exception!" in message
+    assert "broken" in message
+
+
+def test_explain_ignores_other_errors():
+    assert safety.explain(SystemError("something else")) is None
+    assert safety.explain(ValueError("opcode")) is None
@@ -0,0 +1,115 @@
+"""
+Tests for source maps of compiled functions.
+"""
+import dis
+import sys
+
+import pyte
+from pyte import sourcemap, tokens
+from pyte.analysis import decode
+from pyte.ops import CALL_FUNCTION, FOR_LOOP, STORE_FAST
+from pyte.util import ensure_instruction
+
+RETURN_VALUE = ensure_instruction(tokens.RETURN_VALUE)
+
+
+def _current_op():
+    # The op that called this function, in the frame that called it.
+    return sourcemap.op_at(sys._getframe(1))
+
+
+def _compile(code, consts, names=(), **kwargs):
+    return pyte.compile(code, consts, names, [], source_map=True, use_safety_wrapper=False,
+                        **kwargs)
+
+
+def test_source_map_lines():
+    consts = pyte.create_consts(None, 1)
+    code = [consts[1], ensure_instruction(tokens.POP_TOP), consts[0], RETURN_VALUE]
+    func = _compile(code, consts, optimize=False)
+
+    assert func() is None
+    assert func.__code__.co_filename == "<pyte:{}>".format(func.__name__)
+
+    source_map = sourcemap.get(func)
+    assert len(source_map) == 4
+    lines = [line for _, line in dis.findlinestarts(func.__code__)]
+    assert lines == [1, 2, 3, 4]
+    for offset, line, obb in source_map.entries:
+        assert source_map.line_at(offset) == line
+        assert source_map.op_at(offset) is obb
+
+
+def test_source_map_call_site():
+    consts = pyte.create_consts()
+    names = pyte.create_names("_current_op")
+    call = CALL_FUNCTION(names[0])
+    func = _compile([call, RETURN_VALUE], consts, names)
+
+    assert func() is call
+
+
+def test_source_map_loop_end():
+    consts = pyte.create_consts(None, (1, 2))
+    varnames = pyte.create_varnames("x")
+    store = STORE_FAST(varnames[0])
+    loop = FOR_LOOP(consts[1], [consts[0], store], target=varnames[0])
+    func = pyte.compile([loop, consts[0], RETURN_VALUE], consts, [], varnames, source_map=True,
+                        use_safety_wrapper=False, optimize=False)
+
+    assert func() is None
+    source_map = sourcemap.get(func)
+    # The last instruction with each opcode.
+    ops = {instruction.opcode: instruction.offset
+           for instruction in decode(func.__code__.co_code)}
+    # The jump back and the end of the loop come after the body, but belong to the loop.
+    assert source_map.op_at(ops[tokens.STORE_FAST]) is store
+    assert source_map.op_at(ops[tokens.JUMP_ABSOLUTE]) is loop
+    assert source_map.op_at(ops[tokens.POP_BLOCK]) is loop
+    assert source_map.line_at(ops[tokens.POP_BLOCK]) == source_map.line_at(0)
+
+
+def test_source_map_after_optimization():
+    consts = pyte.create_consts(None)
+    ret = RETURN_VALUE
+    # The NOPs are removed by the optimizer, which moves the return.
+    code = [ensure_instruction(tokens.NOP)] * 3 + [consts[0], ret]
+    func = _compile(code, consts, optimize=True)
+
+    assert func() is None
+    offset = len(func.__code__.co_code) - len(RETURN_VALUE)
+    assert func.__code__.co_code[offset] == tokens.RETURN_VALUE
+    assert sourcemap.op_at(func, offset) is ret
+
+
+def test_source_map_unhashable_const():
+    consts = pyte.create_consts([1, 2])
+    func = _compile([consts[0], RETURN_VALUE], consts)
+
+    assert func() == [1, 2]
+    assert sourcemap.op_at(func, 0) is consts[0]
+
+
+def test_source_map_not_requested():
+    consts = pyte.create_consts(None)
+    func = pyte.compile([consts[0], RETURN_VALUE], consts, [], [])
+
+    assert sourcemap.get(func) is None
+    assert sourcemap.op_at(func, 0) is None
+
+
+def test_lnotab_long_gaps():
+    # Jumps of more than 255 bytes, or more than 127 lines, are split.
+    entries = [(0, "a")] + [(300, str(i)) for i in range(200)] + [(301, "b")]
+    source_map = sourcemap.SourceMap(entries)
+    table = source_map.lnotab()
+
+    offset, line = 0, 1
+    starts = {}
+    for i in range(0, len(table), 2):
+        offset += table[i]
+        delta = table[i + 1]
+        line += delta - 256 if pyte.util.PY36 and delta >= 128 else delta
+        starts[offset] = line
+    assert starts[300] == 201
+    assert starts[301] == 202
@@ -0,0 +1,43 @@
+"""
+Tests for the validated lists.
+"""
+import pickle
+
+import pytest
+
+import pyte
+from pyte.exc import ValidationError
+
+
+def test_validators_are_interned():
+    consts = pyte.create_consts(1, 2)
+    assert consts[0] is consts[0]
+    assert consts[0] is not consts[1]
+
+
+def test_mutation_invalidates_validators():
+    consts = pyte.create_consts(1, 2)
+    first = consts[1]
+    consts.append(3)
+    assert consts[1] is not first
+    assert consts[2].validate() == 3
+
+    # Old validators are still checked against the current contents.
+    del consts[1:]
+    with pytest.raises(ValidationError):
+        first.validate()
+
+
+def test_validate_is_a_bounds_check():
+    names = pyte.create_names("a", "b")
+    assert names[1].validate() == "b"
+    assert names[-1].validate() == "b"
+    with pytest.raises(ValidationError):
+        names[2].validate()
+
+
+def test_pickle_keeps_interning():
+    consts = pyte.create_consts(1, 2)
+    validator, copied = pickle.loads(pickle.dumps((consts[1], consts)))
+    assert validator is copied[1]
+    assert copied.name == "consts"